@@ -1,17 +1,19 @@
 # backend/app/api.py
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
-import io
 import datetime
 
 from ocr import extract_certificate_info, validate_certificate_fuzzy
-from forgery import detect_forgery
-
-import pandas as pd
+from registry_snapshot import get_registry, start_registry_watcher
+from bounded_executor import ExecutorOverloaded, UploadTooLarge, get_api_executor, read_upload
+from forgery_detection import detect_forgery_image
+from utils import decode_image_bytes, ocr_view
 
 app = FastAPI()
 
+# Keep the in-memory registry snapshot in step with the certificates table
+start_registry_watcher()
+
 # CORS for local frontend
 app.add_middleware(
     CORSMiddleware,
@@ -20,51 +22,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load DB
-DB_PATH = "/Users/jigyasaverma/Desktop/backend/Edu_cred_verify/EduCred-Verify/datasets/ocr_dataset.csv"
-db = pd.read_csv(DB_PATH)
+def verify_certificate_contents(contents):
+    """Blocking part of /api/verify-certificate, runs on the bounded executor"""
+    # 1️⃣ Decode the uploaded image once
+    cert_img = decode_image_bytes(contents)
+    if cert_img is None:
+        return {"success": False, "error": "Invalid image file"}
 
-@app.post("/api/verify-certificate")
-async def verify_certificate(file: UploadFile = File(...)):
-    try:
-        # 1️⃣ Read uploaded image
-        contents = await file.read()
-        img = Image.open(io.BytesIO(contents))
+    # 2️⃣ OCR extraction
+    extracted_info = extract_certificate_info(ocr_view(cert_img))
+    extracted_info["processing_timestamp"] = datetime.datetime.now().isoformat()
 
-        # 2️⃣ OCR extraction
-        extracted_info = extract_certificate_info(img)
-        extracted_info["processing_timestamp"] = datetime.datetime.now().isoformat()
+    # 3️⃣ OCR / DB fuzzy validation
+    registry = get_registry()
+    valid_ocr, matched_record = validate_certificate_fuzzy(extracted_info, registry['db'], index=registry['index'])
 
-        # 3️⃣ OCR / DB fuzzy validation
-        valid_ocr, matched_record = validate_certificate_fuzzy(extracted_info, db)
+    ocr_result = {
+        "is_valid": valid_ocr,
+        "status": "VERIFIED" if valid_ocr else "INVALID",
+        "confidence_scores": {},  # optional: you can expand per-field scores
+        "matched_record": matched_record,
+    }
 
-        ocr_result = {
-            "is_valid": valid_ocr,
-            "status": "VERIFIED" if valid_ocr else "INVALID",
-            "confidence_scores": {},  # optional: you can expand per-field scores
-            "matched_record": matched_record,
-        }
+    # 4️⃣ Forgery detection on the same decoded image
+    forgery_result = detect_forgery_image(cert_img, extracted_info, debug=False)
 
-        # 4️⃣ Forgery detection
-        # Save temp file for OpenCV
-        temp_path = f"/tmp/{file.filename}"
-        with open(temp_path, "wb") as f:
-            f.write(contents)
+    # 5️⃣ Combine results
+    return {
+        "success": True,
+        "extracted_info": extracted_info,
+        "ocr_validation": ocr_result,
+        "forgery_validation": forgery_result,
+        "validation": {
+            "is_valid": valid_ocr and forgery_result['overall_authentic'],
+            "status": "VERIFIED" if valid_ocr and forgery_result['overall_authentic'] else "INVALID",
+            "overall_confidence": None,  # you can calculate combined %
+        }
+    }
 
-        forgery_result = detect_forgery(temp_path, extracted_info, debug=False)
 
-        # 5️⃣ Combine results
-        return {
-            "success": True,
-            "extracted_info": extracted_info,
-            "ocr_validation": ocr_result,
-            "forgery_validation": forgery_result,
-            "validation": {
-                "is_valid": valid_ocr and forgery_result['overall_authentic'],
-                "status": "VERIFIED" if valid_ocr and forgery_result['overall_authentic'] else "INVALID",
-                "overall_confidence": None,  # you can calculate combined %
-            }
-        }
+@app.post("/api/verify-certificate")
+async def verify_certificate(file: UploadFile = File(...)):
+    try:
+        # Read the upload in chunks, then keep OCR and matching off the event loop
+        contents = await read_upload(file)
+        return await get_api_executor().run(verify_certificate_contents, contents)
 
+    except ExecutorOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -1,27 +1,59 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import pandas as pd
-from PIL import Image
-import pytesseract
 import re
-from fuzzywuzzy import fuzz
 import cv2
 import numpy as np
-import os
+import math
+import multiprocessing
+import time
+import zipfile
 from datetime import datetime
-import tempfile
-from forgery_detection import detect_forgery
+from config import (BATCH, DEADLINES, FIELD_OCR, INSTITUTION_CONFIG, JOB_QUEUE, PERCEPTUAL_HASH, PIPELINE, QR_BULK, REGISTRY,
+                    VERIFICATION_MODE)
+from batch_verification import (ArchiveTooLarge, is_certificate_image, iter_archive_items, iter_spooled_items,
+                                spool_archive, spool_uploads, stream_batch, timed)
+from forgery_detection import (check_seal, check_signature, clear_reference_cache, forgery_report,
+                               get_institution_code_from_ocr, preload_reference_assets, reference_fingerprint)
+from ocr_backend import image_to_string, ocr_health
+from utils import decode_image_bytes, ocr_view
+from field_ocr import (CODE_TO_INSTITUTION_NAME, detect_institution_code, extract_fields, institution_fields, ocr_field,
+                       parse_certificate_no, parse_certificate_no_field)
+from fuzzy_matching import canonical_cert_no, normalize_block, best_matches, match_registry
+from verification_pipeline import deadline_scope, run_pipeline, stage
+from certificate_repository import cert_id_key, count_certificates, hash_matches, init_registry
+from registry_snapshot import (check_certificate_hash_filtered, find_certificates_filtered, get_registry,
+                               refresh_registry, registry_info, start_registry_watcher)
+from registry_import import detect_format, import_file, import_records, iter_records, text_stream
+from job_queue import get_job, queue_stats, start_job_workers, submit_job
+from result_cache import cache_health, config_version, content_key, get_result_cache
+from perceptual_hash import dhash, duplicate_index_health, get_duplicate_index
+from signed_qr import is_signed_payload, verify_signed_payload
+from qr_engine import decode_qr_regions
 
 app = Flask(__name__)
 CORS(app)
 
-# Load the database
-db = pd.read_csv("C:\Juhi laptop backup\JUHI\CODING RELATED (Projects and Documents)\SIH\EduCred_verify\EduCred-Verify\datasets\ocr_dataset.csv")
+# Load the registry from the certificates table; QR lookups query the table directly, fuzzy
+# matching works on an in-memory snapshot and its index that the registry watcher keeps current
+init_registry()
+if REGISTRY['seed_csv'] and count_certificates() == 0:
+    print(f"Seeding the registry from {REGISTRY['seed_csv']}: {import_file(REGISTRY['seed_csv'])}")
+get_registry()
 
+# Decode reference seals/signatures once instead of on every request
+preload_reference_assets()
 
-def normalize(text):
-    """Normalize text for fuzzy matching"""
-    return re.sub(r'\s+', ' ', text).strip().upper()
+
+def near_duplicate_config_warning():
+    """Why PERCEPTUAL_HASH['reject_mismatch'] can't take effect, None when it can"""
+    if PERCEPTUAL_HASH['reject_mismatch'] and not FIELD_OCR['enabled']:
+        return ("NEAR_DUPLICATE_REJECT_MISMATCH needs FIELD_OCR=true: without the certificate number field "
+                "no near-duplicate is rejected")
+    return None
+
+
+if near_duplicate_config_warning():
+    print(f"Warning: {near_duplicate_config_warning()}")
 
 
 def clean_name(name):
@@ -46,28 +78,49 @@ def extract_year(text, cert_no=None):
     return None
 
 
-def extract_certificate_info(img):
-    """Extract certificate info including year"""
-    text = pytesseract.image_to_string(img)
-    info = {}
+def extract_certificate_info_from_fields(img, institution_code):
+    """OCR only the institution's configured field ROIs, None if that doesn't yield a certificate number"""
+    fields = extract_fields(img, institution_code)
+    if not fields:
+        return None
 
-    # Certificate ID - Multiple patterns
-    patterns = [
-        r'(JH[-_ ]?UNI[-_ ]?\d{4}[-_ ]?\d+)',
-        r'Cert(?:ificate)?\s*No[:\-\s]*([A-Z0-9\-]+)'
-    ]
+    info = {"institution": CODE_TO_INSTITUTION_NAME.get(institution_code, "")}
+
+    info["certificate_no"] = parse_certificate_no_field(fields.get("certificate_no", ""))
+    if info["certificate_no"] is None:
+        return None
+
+    name = clean_name(re.sub(r'\s+', ' ', fields.get("name", "")))
+    if name:
+        info["name"] = name
+
+    year = extract_year(fields.get("year", ""))
+    if year:
+        info["year"] = year
+
+    info["raw_text"] = "\n".join(fields.values())
+    return info
 
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            if 'JH' in pattern:
-                info["certificate_no"] = re.sub(r'[\s\-_]+', '-', match.group(1)).upper()
-            else:
-                info["certificate_no"] = match.group(1).strip()
-            break
 
-    if "certificate_no" not in info:
-        info["certificate_no"] = "-"
+def extract_certificate_info(img, institution_code=None, detect_institution=True):
+    """Extract certificate info including year.
+
+    Without an ``institution_code`` it is read from the header ROIs first,
+    unless ``detect_institution`` is False (the caller already tried).
+    """
+    # Field ROIs are far cheaper than full-page OCR, use them when the layout is known
+    if institution_code is None and detect_institution:
+        institution_code = detect_institution_code(img)
+    if institution_code:
+        info = extract_certificate_info_from_fields(img, institution_code)
+        if info:
+            return info
+
+    text = image_to_string(img)
+    info = {}
+
+    # Certificate ID - Multiple patterns
+    info["certificate_no"] = parse_certificate_no(text)
 
     # Institution
     institutions = [
@@ -110,71 +163,66 @@ def extract_certificate_info(img):
     return info
 
 
-def validate_certificate_fuzzy(info, db, threshold=85):
+def validate_certificate_fuzzy(info, db, threshold=85, index=None):
     """Validate certificate using fuzzy matching"""
-    best_match = None
-    best_scores = {}
-
-    for _, row in db.iterrows():
-        scores = {}
-        scores['cert'] = fuzz.ratio(normalize(info.get("certificate_no", "")), normalize(str(row["certificate_no"])))
-        scores['name'] = fuzz.ratio(normalize(info.get("name", "")), normalize(str(row["name"])))
-        scores['inst'] = fuzz.ratio(normalize(info.get("institution", "")), normalize(str(row["institution"])))
-        scores['year'] = 100 if info.get("year", "") == str(row["year"]) else 0
-
-        # Calculate overall score
-        overall_score = (scores['cert'] * 0.4 + scores['name'] * 0.3 + scores['inst'] * 0.2 + scores['year'] * 0.1)
-
-        # Check if this is a good match
-        if (scores['cert'] > threshold and scores['name'] > threshold and
-                scores['inst'] > threshold and scores['year'] > 50):
+    return validate_certificates_batch([info], db, threshold, index)[0]
 
-            if best_match is None or overall_score > best_scores.get('overall', 0):
-                best_match = row.to_dict()
-                best_scores = scores
-                best_scores['overall'] = overall_score
 
-    return best_match is not None, best_match, best_scores
-
-
-def parse_qr_data(qr_data):
-    """Extract certificate ID and hash from QR data"""
-    print(f"DEBUG: Raw QR data received: '{qr_data}'")
-    print(f"DEBUG: QR data type: {type(qr_data)}")
-    print(f"DEBUG: QR data length: {len(qr_data)}")
+def validate_certificates_batch(infos, db, threshold=85, index=None):
+    """Validate many extracted infos in one scoring pass"""
+    if index is not None and index['size'] == len(db):
+        matches = match_registry(index, infos, threshold)
+    else:
+        matches = best_matches(infos, normalize_block(db), threshold)
+
+    results = []
+    for position, scores in matches:
+        if position is None:
+            results.append((False, None, {}))
+        else:
+            results.append((True, db.iloc[position].to_dict(), scores))
+    return results
+
+
+def parse_qr_data(qr_data, debug=True):
+    """Extract certificate ID and hash from QR data, ``debug`` prints every parsing step"""
+    log = print if debug else lambda *args: None
+    log(f"DEBUG: Raw QR data received: '{qr_data}'")
+    log(f"DEBUG: QR data type: {type(qr_data)}")
+    log(f"DEBUG: QR data length: {len(qr_data)}")
     
     lines = qr_data.strip().split('\n')
-    print(f"DEBUG: Split into {len(lines)} lines: {lines}")
+    log(f"DEBUG: Split into {len(lines)} lines: {lines}")
     
     cert_id = None
     digital_hash = None
     
     for i, line in enumerate(lines):
         line = line.strip()
-        print(f"DEBUG: Processing line {i}: '{line}'")
+        log(f"DEBUG: Processing line {i}: '{line}'")
         
         # Look for certificate ID patterns
         if 'Certificate ID:' in line:
             cert_id = line.replace('Certificate ID:', '').strip()
-            print(f"DEBUG: Found cert_id with 'Certificate ID:' pattern: '{cert_id}'")
+            log(f"DEBUG: Found cert_id with 'Certificate ID:' pattern: '{cert_id}'")
         elif 'Cert ID:' in line:
             cert_id = line.replace('Cert ID:', '').strip()
-            print(f"DEBUG: Found cert_id with 'Cert ID:' pattern: '{cert_id}'")
+            log(f"DEBUG: Found cert_id with 'Cert ID:' pattern: '{cert_id}'")
         elif 'ID:' in line:
             cert_id = line.replace('ID:', '').strip()
-            print(f"DEBUG: Found cert_id with 'ID:' pattern: '{cert_id}'")
+            log(f"DEBUG: Found cert_id with 'ID:' pattern: '{cert_id}'")
             
         # Look for digital hash
         elif 'Digital Hash:' in line:
             digital_hash = line.replace('Digital Hash:', '').strip()
-            print(f"DEBUG: Found hash with 'Digital Hash:' pattern: '{digital_hash}'")
+            log(f"DEBUG: Found hash with 'Digital Hash:' pattern: '{digital_hash}'")
         elif 'Hash:' in line:
             digital_hash = line.replace('Hash:', '').strip()
-            print(f"DEBUG: Found hash with 'Hash:' pattern: '{digital_hash}'")
+            log(f"DEBUG: Found hash with 'Hash:' pattern: '{digital_hash}'")
     
     # If still no cert_id found, try to extract from the raw data using regex
     if not cert_id:
-        print("DEBUG: No cert_id found with labels, trying regex patterns...")
+        log("DEBUG: No cert_id found with labels, trying regex patterns...")
         cert_patterns = [
             r'(JH[-_]?UNI[-_]?\d{4}[-_]?\d+)',
             r'(RTI[-_]?\d{4}[-_]?\d+)',
@@ -186,60 +234,445 @@ def parse_qr_data(qr_data):
             match = re.search(pattern, qr_data, re.IGNORECASE)
             if match:
                 cert_id = match.group(1)
-                print(f"DEBUG: Found cert_id with regex pattern '{pattern}': '{cert_id}'")
+                log(f"DEBUG: Found cert_id with regex pattern '{pattern}': '{cert_id}'")
                 break
     
     # If no hash found in labeled format, check if any line looks like a hash
     if not digital_hash:
-        print("DEBUG: No hash found with labels, checking for hash-like strings...")
+        log("DEBUG: No hash found with labels, checking for hash-like strings...")
         for line in lines:
             line = line.strip()
             # Look for alphanumeric strings that could be hashes (at least 10 chars)
             if len(line) >= 10 and re.match(r'^[a-zA-Z0-9]+$', line) and line != cert_id:
                 digital_hash = line
-                print(f"DEBUG: Found potential hash: '{digital_hash}'")
+                log(f"DEBUG: Found potential hash: '{digital_hash}'")
                 break
     
-    print(f"DEBUG: Final results - cert_id: '{cert_id}', digital_hash: '{digital_hash}'")
+    log(f"DEBUG: Final results - cert_id: '{cert_id}', digital_hash: '{digital_hash}'")
     return cert_id, digital_hash
 
 
 def verify_qr_authenticity(cert_id, digital_hash):
     """Verify if both certificate ID and hash match database records"""
-    # Search in the actual CSV database
-    matching_records = db[db['certificate_no'].str.contains(cert_id, case=False, na=False)]
-    
-    if matching_records.empty:
-        return None  # Certificate ID not found
-    
-    # Get the first matching record
-    record = matching_records.iloc[0]
-    
-    # Check if the record has a digital_hash column and if it matches
-    if 'digital_hash' in record.index:
-        stored_hash = str(record['digital_hash']).strip()
-        if stored_hash == digital_hash:
-            return record.to_dict()
-    else:
-        # If your CSV doesn't have a digital_hash column yet, you can use this fallback
-        # For demonstration, let's create a simple hash verification
-        print(f"Warning: digital_hash column not found in database")
-        
-        # Fallback: Create expected hashes for known certificates
-        expected_hashes = {
-            'JH-UNI-2018-201': 'abc123hash456def',
-            'RTI-2019-305': 'xyz789hash123abc',
-            # Add more certificates as needed
+    record, _ = check_certificate_hash_filtered(cert_id, digital_hash)
+    return record
+
+
+# Which QR result speaks for a certificate carrying several codes: a forged one wins
+QR_STATUS_PRIORITY = ('FORGED', 'VERIFIED', 'NOT_FOUND', 'UNVERIFIED', 'UNREADABLE')
+
+
+def check_qr_payload(data):
+    """Check one decoded QR payload against its signature or the registry"""
+    # A signed payload carries its own proof, no registry lookup
+    if is_signed_payload(data):
+        return verify_signed_payload(data)
+
+    cert_id, digital_hash = parse_qr_data(data)
+    if not cert_id or not digital_hash:
+        return {'status': 'UNREADABLE', 'qr_data': data}
+
+    matching_record, cert_exists = check_certificate_hash_filtered(cert_id, digital_hash)
+    if matching_record:
+        return {'status': 'VERIFIED', 'cert_id': cert_id, 'record': matching_record}
+    return {'status': 'FORGED' if cert_exists else 'NOT_FOUND', 'cert_id': cert_id}
+
+
+def check_qr_payloads(payloads, chunk_size=None):
+    """check_qr_payload for many payloads with one registry query per chunk of IDs"""
+    results, pending = [], []
+    for data in payloads:
+        if not isinstance(data, str) or not data.strip():
+            results.append({'status': 'UNREADABLE'})
+        elif is_signed_payload(data):
+            results.append(verify_signed_payload(data))
+        else:
+            cert_id, digital_hash = parse_qr_data(data, debug=False)
+            if not cert_id or not digital_hash:
+                results.append({'status': 'UNREADABLE'})
+                continue
+            results.append({'cert_id': cert_id})
+            pending.append((results[-1], digital_hash))
+
+    records = find_certificates_filtered([result['cert_id'] for result, _ in pending],
+                                         chunk_size or QR_BULK['chunk_size'])
+    for result, digital_hash in pending:
+        record = records.get(cert_id_key(result['cert_id']))
+        if record is None:
+            result['status'] = 'NOT_FOUND'
+        elif hash_matches(record, digital_hash):
+            result.update(status='VERIFIED', record=record)
+        else:
+            result['status'] = 'FORGED'
+    return results
+
+
+def scan_certificate_qr(cert_img, institution_code=None):
+    """Decode and check every QR code of a certificate, status NO_QR when it has none"""
+    results = [check_qr_payload(data) for data in decode_qr_regions(cert_img, institution_code)]
+    if not results:
+        return {'status': 'NO_QR'}
+    qr_result = min(results, key=lambda result: QR_STATUS_PRIORITY.index(result['status']))
+    if len(results) > 1:
+        qr_result = dict(qr_result, qr_count=len(results))
+    return qr_result
+
+
+def forgery_fallback(institution_name, error):
+    """Forgery result reported when the seal/signature checks could not run"""
+    return {
+        'institution': institution_name,
+        'institution_code': 'UNKNOWN',
+        'seal_match_score': 0.0,
+        'signature_match_score': 0.0,
+        'seal_authentic': False,
+        'signature_authentic': False,
+        'overall_authentic': False,
+        'error': str(error),
+        'thresholds': {
+            'seal': 0.25,
+            'signature': 0.05
         }
-        
-        expected_hash = expected_hashes.get(cert_id)
-        if expected_hash and expected_hash == digital_hash:
-            return record.to_dict()
-        
+    }
+
+
+def build_verification_response(extracted_info, is_valid, matched_record, confidence_scores, forgery_results):
+    """Response body of /api/verify-certificate"""
+    return {
+        'success': True,
+        'extracted_info': {
+            'certificate_no': matched_record['certificate_no'] if matched_record else extracted_info.get(
+                'certificate_no', 'Not found'),
+            'name': matched_record['name'] if matched_record else extracted_info.get('name', 'Not found'),
+            'institution': matched_record['institution'] if matched_record else extracted_info.get(
+                'institution', 'Not found'),
+            'course': matched_record.get('course', '') if matched_record else extracted_info.get('course',
+                                                                                                 'Not found'),
+            'year': str(matched_record['year']) if matched_record else extracted_info.get('year', 'Not found'),
+            'raw_text': extracted_info.get('raw_text', ''),
+            'processing_timestamp': datetime.now().isoformat()
+        },
+        'validation': {
+            'is_valid': is_valid,
+            'status': 'VERIFIED' if is_valid else 'INVALID',
+            'overall_confidence': int(confidence_scores.get('overall', 0)) if confidence_scores else 0,
+            'confidence_scores': {
+                'ocr_quality': 98 if extracted_info.get('raw_text') else 0,  # You can calculate this based on OCR confidence
+                'name_match': confidence_scores.get('name', 0) if confidence_scores else 0,
+                'institution_match': confidence_scores.get('inst', 0) if confidence_scores else 0,
+                'certificate_format': confidence_scores.get('cert', 0) if confidence_scores else 0,
+                'seal_authentic': forgery_results['seal_authentic'],
+                'signature_authentic': forgery_results['signature_authentic']
+            },
+            'matched_record': matched_record if is_valid else None
+        },
+        'forgery_detection': forgery_results
+    }
+
+
+def verify_certificate_qr_first(cert_img, institution_code=None, deadline=None):
+    """Tiered verification: a QR whose ID and hash match the registry replaces OCR and fuzzy matching.
+
+    Returns ``(response, qr_result, qr_run)``: the response is None when the
+    QR is missing, unreadable or doesn't match and the full pipeline has to
+    run; ``qr_run`` is the run_pipeline result of the QR stage.
+    """
+    qr_run = run_pipeline({'qr': stage(lambda inputs: scan_certificate_qr(cert_img, institution_code))},
+                          deadline=deadline, budgets=DEADLINES['stage_budgets'])
+    qr_result = qr_run['results'].get('qr') or {
+        'status': 'SKIPPED', 'reason': qr_run['skipped'].get('qr') or qr_run['errors'].get('qr')}
+    if qr_result['status'] != 'VERIFIED':
+        return None, qr_result, qr_run
+
+    record = qr_result['record']
+    code = qr_result.get('institution_code') or get_institution_code_from_ocr(str(record.get('institution', '')))
+
+    # Only the cheap visual checks remain
+    run = run_pipeline({
+        'seal': stage(lambda inputs: check_seal(cert_img, code)),
+        'signature': stage(lambda inputs: check_signature(cert_img, code))
+    }, deadline=deadline, budgets=DEADLINES['stage_budgets']) if code else {
+        'results': {}, 'errors': {}, 'skipped': {}, 'degraded': {}, 'timed_out': [], 'verdict': None}
+    results = run['results']
+
+    try:
+        if not code:
+            raise ValueError(f"Could not determine institution code from: {record.get('institution')}")
+        for name in ('seal', 'signature'):
+            if name not in results:
+                raise ValueError(run['errors'].get(name) or f"{name} check did not run")
+        forgery_results = forgery_report(record['institution'], code, *results['seal'], *results['signature'])
+    except Exception as forgery_error:
+        print(f"Forgery detection error: {forgery_error}")
+        forgery_results = forgery_fallback(record.get('institution', ''), forgery_error)
+
+    confidence_scores = {'cert': 100, 'name': 100, 'inst': 100, 'year': 100, 'overall': 100}
+    response_data = build_verification_response({}, True, record, confidence_scores, forgery_results)
+    response_data['validation']['verification_method'] = ('Signed QR Code' if qr_result.get('signed')
+                                                          else 'QR Code + Database Hash Match')
+    response_data['qr_verification'] = {key: value for key, value in qr_result.items() if key != 'record'}
+    run = merge_runs(qr_run, run)
+    response_data['pipeline'] = {
+        'mode': 'tiered',
+        'verdict': None,
+        'stage_errors': run['errors'],
+        'skipped_stages': {'ocr': 'QR verified', 'fuzzy': 'QR verified', **run['skipped']},
+        'degraded_stages': run['degraded'],
+        'timed_out_stages': run['timed_out']
+    }
+    return response_data, qr_result, qr_run
+
+
+def merge_runs(*runs):
+    """Errors, skips, fallbacks and timeouts of the run_pipeline runs of one request, for its pipeline block"""
+    return {
+        'verdict': next((run['verdict'] for run in runs if run['verdict']), None),
+        'errors': {name: error for run in runs for name, error in run['errors'].items()},
+        'skipped': {name: reason for run in runs for name, reason in run['skipped'].items()},
+        'degraded': {name: reason for run in runs for name, reason in run['degraded'].items()},
+        'timed_out': [name for run in runs for name in run['timed_out']]
+    }
+
+
+def find_near_duplicate(cert_img):
+    """Closest recently verified image by perceptual hash: ``(image_hash, (distance, record) or None)``"""
+    index = get_duplicate_index()
+    if index is None:
+        return None, None
+
+    image_hash = dhash(cert_img)
+    found = index.nearest(image_hash)
+    # ROIs or thresholds changed since, the earlier verification isn't comparable anymore
+    if found is None or found[1]['config_version'] != config_version():
+        return image_hash, None
+    return image_hash, found
+
+
+def near_duplicate_report(found, certificate_no):
+    """What the response says about a hash neighbour.
+
+    Informational only: different certificates printed from one template hash
+    a few bits apart, so nothing of the neighbour's result is reused.
+    """
+    distance, record = found
+    same = certificate_no is not None and canonical_cert_no(certificate_no) == canonical_cert_no(
+        record['certificate_no'])
+    get_duplicate_index().count('same_number' if same else 'mismatches')
+    return {
+        'distance': distance,
+        'certificate_no': certificate_no,
+        'previous_certificate_no': record['certificate_no'],
+        'certificate_no_mismatch': certificate_no is not None and not same
+    }
+
+
+def read_certificate_no_field(ocr_img, institution_code):
+    """Certificate number from the institution's number ROI alone, None without a readable one"""
+    field_config = institution_fields(institution_code).get('certificate_no')
+    if not field_config:
         return None
-    
-    # Certificate ID exists but hash doesn't match
-    return None
+    return parse_certificate_no_field(ocr_field(ocr_img, field_config))
+
+
+def near_duplicate_mismatch_response(report, record, mode):
+    """Response for a near-duplicate of a verified certificate carrying another certificate number"""
+    extracted_info = {'certificate_no': report['certificate_no'],
+                      'institution': CODE_TO_INSTITUTION_NAME.get(record['institution_code'], '')}
+    forgery_results = forgery_fallback(extracted_info['institution'],
+                                       'Near-duplicate of a verified certificate with a different certificate number')
+    response_data = build_verification_response(extracted_info, False, None, {}, forgery_results)
+    response_data['validation']['status'] = 'SUSPECTED_FORGERY'
+    response_data['near_duplicate'] = report
+    response_data['qr_verification'] = {'status': 'SKIPPED'}
+    response_data['pipeline'] = {
+        'mode': mode or VERIFICATION_MODE,
+        'verdict': 'NEAR_DUPLICATE_MISMATCH',
+        'stage_errors': {},
+        'skipped_stages': {name: 'near-duplicate with a different certificate number'
+                           for name in ('ocr', 'fuzzy', 'seal', 'signature', 'qr')},
+        'degraded_stages': {},
+        'timed_out_stages': []
+    }
+    return response_data
+
+
+def request_deadline(seconds=None):
+    """time.monotonic() deadline for a request allowed ``seconds``.
+
+    None, zero or negative ``seconds`` mean DEADLINES['default']; NaN and
+    infinity raise ValueError, they would make every stage limit meaningless.
+    """
+    if seconds is not None and not math.isfinite(seconds):
+        raise ValueError(f"Deadline must be a finite number of seconds, got {seconds}")
+    if seconds is None or seconds <= 0:
+        seconds = DEADLINES['default']
+    if not seconds or seconds <= 0:
+        return None
+    return time.monotonic() + min(seconds, DEADLINES['max'])
+
+
+def degraded_ocr(ocr_img, institution_code):
+    """Cheaper OCR pass on a downscaled copy, for when full-resolution OCR overruns its budget.
+
+    Header detection already ran on the full-resolution image, it isn't repeated on the copy.
+    """
+    scale = DEADLINES['degraded_ocr_scale']
+    small = cv2.resize(ocr_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    info = extract_certificate_info(small, institution_code, detect_institution=False)
+    info['degraded'] = f'OCR at {scale:g}x resolution'
+    return info
+
+
+def verify_certificate_image(cert_img, institution_code=None, mode=None, registry=None, deadline=None):
+    """Run OCR, registry validation, forgery and QR checks on one decoded BGR certificate image.
+
+    ``deadline`` (time.monotonic() value) and the DEADLINES stage budgets bound
+    the stages; the response lists the ones skipped or degraded for time.
+    """
+    # One snapshot for the whole request, a registry refresh mid-pipeline doesn't change it
+    registry = registry or get_registry()
+    qr_result = qr_run = None
+    if (mode or VERIFICATION_MODE) == 'tiered':
+        response_data, qr_result, qr_run = verify_certificate_qr_first(cert_img, institution_code, deadline)
+        if response_data:
+            return response_data
+
+    ocr_img = ocr_view(cert_img)
+
+    image_hash, found = find_near_duplicate(cert_img)
+    if found and PERCEPTUAL_HASH['reject_mismatch']:
+        # Opt-in shortcut: a different number on a near-identical image is answered without the pipeline
+        report = near_duplicate_report(found, read_certificate_no_field(ocr_img, found[1]['institution_code']))
+        if report['certificate_no_mismatch']:
+            return near_duplicate_mismatch_response(report, found[1], mode)
+
+    # Seal, signature and QR only need the image and an institution code. Read the code from the
+    # header ROIs up front so they can run alongside full OCR; if that fails they wait for OCR.
+    if institution_code is None:
+        try:
+            with deadline_scope(deadline):
+                institution_code = detect_institution_code(ocr_img)
+        except TimeoutError:
+            # Out of time for the header OCR, the forgery checks wait for full OCR instead
+            institution_code = None
+
+    def forgery_code(results):
+        if institution_code:
+            return institution_code
+        institution_name = results.get('ocr', {}).get('institution', '')
+        code = get_institution_code_from_ocr(institution_name)
+        if not code:
+            raise ValueError(f"Could not determine institution code from: {institution_name}")
+        return code
+
+    forgery_deps = () if institution_code else ('ocr',)
+    stages = {
+        # Header detection already ran above, don't repeat it inside extract_certificate_info
+        'ocr': stage(lambda inputs: extract_certificate_info(ocr_img, institution_code, detect_institution=False),
+                     fallback=lambda inputs: degraded_ocr(ocr_img, institution_code)),
+        'fuzzy': stage(lambda inputs: validate_certificate_fuzzy(inputs['ocr'], registry['db'],
+                                                                     index=registry['index']), 'ocr'),
+        'seal': stage(lambda inputs: check_seal(cert_img, forgery_code(inputs)), *forgery_deps),
+        'signature': stage(lambda inputs: check_signature(cert_img, forgery_code(inputs)), *forgery_deps),
+        # The tiered mode already looked for the QR code, don't decode it twice
+        'qr': stage(lambda inputs: qr_result if qr_result is not None else scan_certificate_qr(cert_img, institution_code))
+    }
+
+    def decide(results):
+        """A forged QR or a failed seal/signature check settles the verdict whatever OCR says"""
+        if not PIPELINE['cancel_on_verdict']:
+            return None
+        if results.get('qr', {}).get('status') == 'FORGED':
+            return 'FORGED'
+        try:
+            config = INSTITUTION_CONFIG[forgery_code(results)]
+        except (KeyError, ValueError):
+            return None
+        if 'seal' in results and results['seal'][0] < config['seal'].get('threshold', 0.25):
+            return 'FORGED'
+        if 'signature' in results and results['signature'][0] < config['signature'].get('threshold', 0.05):
+            return 'FORGED'
+        return None
+
+    run = run_pipeline(stages, decide, deadline=deadline, budgets=DEADLINES['stage_budgets'],
+                       fallback_budgets=DEADLINES['fallback_budgets'])
+    results = run['results']
+
+    extracted_info = results.get('ocr', {})
+    is_valid, matched_record, confidence_scores = results.get('fuzzy', (False, None, {}))
+
+    # Combine seal and signature scores like detect_forgery does
+    try:
+        for name in ('seal', 'signature'):
+            if name not in results:
+                raise ValueError(run['errors'].get(name) or f"{name} check {run['skipped'].get(name, 'did not run')}")
+        code = forgery_code(results)
+        forgery_results = forgery_report(extracted_info.get('institution') or CODE_TO_INSTITUTION_NAME.get(code, ''),
+                                         code, *results['seal'], *results['signature'])
+    except Exception as forgery_error:
+        print(f"Forgery detection error: {forgery_error}")
+        forgery_results = forgery_fallback(extracted_info.get('institution', ''), forgery_error)
+
+    if qr_run is not None:
+        # The tiered pass ran the QR stage, a timeout or error there keeps the result out of the caches too
+        run = merge_runs(qr_run, run)
+
+    response_data = build_verification_response(extracted_info, is_valid, matched_record, confidence_scores,
+                                                forgery_results)
+    response_data['qr_verification'] = results.get('qr', {'status': 'SKIPPED'})
+    certificate_no = extracted_info.get('certificate_no')
+    response_data['near_duplicate'] = near_duplicate_report(
+        found, certificate_no if certificate_no not in (None, '-') else None) if found else None
+    response_data['pipeline'] = {
+        'mode': mode or VERIFICATION_MODE,
+        'verdict': run['verdict'],
+        'stage_errors': run['errors'],
+        'skipped_stages': run['skipped'],
+        'degraded_stages': run['degraded'],
+        'timed_out_stages': run['timed_out']
+    }
+
+    # Remember fully verified certificates so later near-duplicates can be compared with them
+    duplicate_index = get_duplicate_index()
+    if (duplicate_index is not None and not run['errors'] and not run['verdict']
+            and not run['degraded'] and not run['timed_out']
+            and 'error' not in forgery_results and extracted_info.get('certificate_no', '-') != '-'):
+        duplicate_index.add(image_hash, {
+            'certificate_no': extracted_info['certificate_no'],
+            'institution_code': forgery_results['institution_code'],
+            'config_version': config_version()
+        })
+    return response_data
+
+
+def verify_certificate_bytes(data, institution_code=None, mode=None, deadline=None):
+    """Verify an uploaded image, identical uploads are answered from the result cache.
+
+    ``deadline`` is the time allowed in seconds, see request_deadline.
+    Returns None when the bytes aren't a decodable image.
+    """
+    deadline = request_deadline(deadline)
+    registry = get_registry()
+    cache = get_result_cache()
+    if cache is not None:
+        key = content_key(data, institution_code, mode)
+        version = f"{registry['version']}-{config_version()}"
+        cached = cache.get(key, version)
+        if cached is not None:
+            cached['cached'] = True
+            return cached
+
+    cert_img = decode_image_bytes(data)
+    if cert_img is None:
+        return None
+    response_data = verify_certificate_image(cert_img, institution_code, mode, registry, deadline)
+
+    # Don't pin a result that a failed or timed out stage (OCR timeout, unreadable asset) may have degraded
+    pipeline = response_data['pipeline']
+    if (cache is not None and response_data.get('success') and not pipeline['stage_errors']
+            and not pipeline['degraded_stages'] and not pipeline['timed_out_stages']):
+        cache.put(key, version, response_data)
+    return response_data
 
 
 @app.route('/api/verify-certificate', methods=['POST'])
@@ -258,85 +691,258 @@ def verify_certificate():
         if file_extension not in allowed_extensions:
             return jsonify({'success': False, 'error': 'Invalid file type'}), 400
 
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_extension}') as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
+        # Optional "deadline": seconds this request may take, stages past it are skipped or degraded
+        deadline = request.form.get('deadline', type=float)
+        if deadline is not None and not math.isfinite(deadline):
+            return jsonify({'success': False, 'error': 'deadline must be a finite number of seconds'}), 400
+
+        # Decode the upload once in memory, every stage works on views of this array
+        response_data = verify_certificate_bytes(file.read(), request.form.get('institution_code'),
+                                                 request.form.get('mode'), deadline)
+        if response_data is None:
+            return jsonify({'success': False, 'error': 'Invalid image file'}), 400
+
+        return jsonify(response_data)
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
+
+def verify_batch_item(filename, data, institution_code=None, mode=None):
+    """Verify one certificate of a batch inside a pool worker, returns (response, elapsed_ms)"""
+    def verify():
         try:
-            # Load and process image
-            img = Image.open(temp_path)
-
-            # Extract information using OCR
-            extracted_info = extract_certificate_info(img)
-
-            # Validate against database
-            is_valid, matched_record, confidence_scores = validate_certificate_fuzzy(extracted_info, db)
-
-            # Perform REAL forgery detection using your actual implementation
-            try:
-                forgery_results = detect_forgery(temp_path, extracted_info, debug=False)
-            except Exception as forgery_error:
-                print(f"Forgery detection error: {forgery_error}")
-                # Fallback if forgery detection fails
-                forgery_results = {
-                    'institution': extracted_info.get('institution', ''),
-                    'institution_code': 'UNKNOWN',
-                    'seal_match_score': 0.0,
-                    'signature_match_score': 0.0,
-                    'seal_authentic': False,
-                    'signature_authentic': False,
-                    'overall_authentic': False,
-                    'error': str(forgery_error),
-                    'thresholds': {
-                        'seal': 0.25,
-                        'signature': 0.05
-                    }
-                }
-
-            # Prepare response
-            response_data = {
-                'success': True,
-                'extracted_info': {
-                    'certificate_no': matched_record['certificate_no'] if matched_record else extracted_info.get(
-                        'certificate_no', 'Not found'),
-                    'name': matched_record['name'] if matched_record else extracted_info.get('name', 'Not found'),
-                    'institution': matched_record['institution'] if matched_record else extracted_info.get(
-                        'institution', 'Not found'),
-                    'course': matched_record.get('course', '') if matched_record else extracted_info.get('course',
-                                                                                                         'Not found'),
-                    'year': str(matched_record['year']) if matched_record else extracted_info.get('year', 'Not found'),
-                    'raw_text': extracted_info.get('raw_text', ''),
-                    'processing_timestamp': datetime.now().isoformat()
-                },
-                'validation': {
-                    'is_valid': is_valid,
-                    'status': 'VERIFIED' if is_valid else 'INVALID',
-                    'overall_confidence': int(confidence_scores.get('overall', 0)) if confidence_scores else 0,
-                    'confidence_scores': {
-                        'ocr_quality': 98,  # You can calculate this based on OCR confidence
-                        'name_match': confidence_scores.get('name', 0) if confidence_scores else 0,
-                        'institution_match': confidence_scores.get('inst', 0) if confidence_scores else 0,
-                        'certificate_format': confidence_scores.get('cert', 0) if confidence_scores else 0,
-                        'seal_authentic': forgery_results['seal_authentic'],
-                        'signature_authentic': forgery_results['signature_authentic']
-                    },
-                    'matched_record': matched_record if is_valid else None
-                },
-                'forgery_detection': forgery_results
-            }
-
-            return jsonify(response_data)
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            response_data = verify_certificate_bytes(data, institution_code, mode)
+            if response_data is None:
+                return {'success': False, 'error': 'Invalid image file'}
+            return response_data
+        except Exception as e:
+            print(f"Batch item '{filename}' failed: {e}")
+            return {'success': False, 'error': str(e)}
+
+    return timed(verify)
 
+
+@app.route('/api/verify-batch', methods=['POST'])
+def verify_batch():
+    """Verify many certificates (a ZIP archive or several files) and stream one NDJSON line per certificate"""
+    try:
+        if 'archive' in request.files:
+            zf, members = spool_archive(request.files['archive'].stream)
+            total = len(members)
+        else:
+            files = [file for file in request.files.getlist('files') if is_certificate_image(file.filename)]
+            total = len(files)
+
+        if total == 0 or total > BATCH['max_items']:
+            if 'archive' in request.files:
+                zf.fp.close()
+            if total == 0:
+                return jsonify({'success': False, 'error': 'No certificate images uploaded'}), 400
+            return jsonify({'success': False, 'error': f"Batch too large, at most {BATCH['max_items']} certificates"}), 400
+
+        if 'archive' in request.files:
+            items = iter_archive_items(zf, members)
+        else:
+            items = iter_spooled_items(*spool_uploads(files))
+
+        worker_args = (request.form.get('institution_code'), request.form.get('mode'))
+        return Response(stream_with_context(stream_batch(items, total, verify_batch_item, worker_args)),
+                        mimetype='application/x-ndjson')
+
+    except zipfile.BadZipFile:
+        return jsonify({'success': False, 'error': 'Invalid ZIP archive'}), 400
+    except ArchiveTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def run_verification_job(job):
+    """Job queue handler: verify the stored upload of a job"""
+    response_data = verify_certificate_bytes(job['payload'], job['institution_code'], job['mode'])
+    if response_data is None:
+        raise ValueError('Invalid image file')
+    return response_data
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_verification_job():
+    """Queue a certificate for verification and return its job id right away"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'error': 'No file selected'}), 400
+        if not is_certificate_image(file.filename):
+            return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+
+        try:
+            priority = int(request.form.get('priority', 0))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'priority must be an integer'}), 400
+
+        job_id = submit_job(file.read(), file.filename, priority,
+                            request.form.get('institution_code'), request.form.get('mode'))
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}',
+            'result_url': f'/api/jobs/{job_id}/result'
+        }), 202
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def verification_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'Job "{job_id}" not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def verification_job_result(job_id):
+    job = get_job(job_id, with_result=True)
+    if job is None:
+        return jsonify({'success': False, 'error': f'Job "{job_id}" not found'}), 404
+    if job['status'] in ('queued', 'running'):
+        return jsonify({'success': False, 'status': job['status'], 'error': 'Job not finished yet'}), 202
+    if job['status'] == 'failed':
+        return jsonify({'success': False, 'status': 'failed', 'error': job['error']}), 500
+    return jsonify(job['result'])
+
+
+@app.route('/api/registry/import', methods=['POST'])
+def import_registry():
+    """Stream a CSV or JSONL export into the certificates table and report throughput and rejected rows"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+
+        file = request.files['file']
+        fmt = request.form.get('format') or detect_format(file.filename)
+        if fmt not in ('csv', 'jsonl'):
+            return jsonify({'success': False, 'error': 'format must be csv or jsonl'}), 400
+        # Dropping the lookup indexes would slow every lookup served meanwhile, so it is opt-in here
+        # (the registry_import CLI defers them by default)
+        defer_indexes = request.form.get('defer_indexes', 'false').lower() == 'true'
+
+        report = import_records(iter_records(text_stream(file.stream), fmt), defer_indexes=defer_indexes)
+        # Apply the imported rows now instead of waiting for the watcher's next poll
+        refresh_registry()
+        info = registry_info()
+        return jsonify({'success': True, 'registry_size': info['size'], 'registry_version': info['version'],
+                        **report})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def signed_qr_response(data, qr_result):
+    """/api/scan-qr body and status code for a signed QR payload"""
+    if qr_result['status'] != 'VERIFIED':
+        errors = {
+            'FORGED': 'QR signature does not match the issuing institution\'s key. This QR code may be forged.',
+            'UNVERIFIED': qr_result.get('reason'),
+            'UNREADABLE': 'Malformed signed QR payload'
+        }
+        return {'success': False, 'error': errors[qr_result['status']], 'qr_data': data,
+                'cert_id': qr_result.get('cert_id'), 'status': qr_result['status']}, 400
+
+    record = qr_result['record']
+    return {
+        'success': True,
+        'data': {
+            'documentType': 'Digital Certificate',
+            'name': record['name'],
+            'certificateId': record['certificate_no'],
+            'institution': record['institution'],
+            'course': record['course'],
+            'year': str(record['year']),
+            'status': 'Valid',
+            'qr_raw_data': data,
+            'institution_code': qr_result['institution_code'],
+            'verification_method': 'Signed QR Code'
+        }
+    }, 200
+
+
+def qr_payload_response(data):
+    """/api/scan-qr body and status code for one decoded QR payload"""
+    # Signed payloads are checked against the institution's key, the registry isn't queried
+    if is_signed_payload(data):
+        return signed_qr_response(data, verify_signed_payload(data))
+
+    # Parse QR data to extract certificate ID and hash
+    cert_id, digital_hash = parse_qr_data(data)
+
+    if not cert_id:
+        return {
+            'success': False,
+            'error': f'Could not extract certificate ID from QR code. QR contains: "{data}"',
+            'qr_data': data
+        }, 400
+
+    if not digital_hash:
+        return {
+            'success': False,
+            'error': f'Could not extract digital hash from QR code. Found cert_id: {cert_id}',
+            'qr_data': data,
+            'cert_id': cert_id
+        }, 400
+
+    print(f"DEBUG: Extracted cert_id: '{cert_id}', hash: '{digital_hash}'")
+
+    # Verify against database, one lookup tells a hash mismatch from an unknown certificate ID
+    matching_record, cert_exists = check_certificate_hash_filtered(cert_id, digital_hash)
+
+    if not matching_record:
+        if cert_exists:
+            return {
+                'success': False,
+                'error': 'Certificate ID found but digital hash does not match. This QR code may be forged.',
+                'qr_data': data,
+                'cert_id': cert_id,
+                'hash_provided': digital_hash,
+                'status': 'FORGED'
+            }, 400
+        else:
+            return {
+                'success': False,
+                'error': f'Certificate ID "{cert_id}" not found in database',
+                'qr_data': data,
+                'cert_id': cert_id,
+                'status': 'NOT_FOUND'
+            }, 404
+
+    return {
+        'success': True,
+        'data': {
+            'documentType': 'Digital Certificate',
+            'name': matching_record['name'],
+            'certificateId': matching_record['certificate_no'],
+            'institution': matching_record['institution'],
+            'course': matching_record.get('course', ''),
+            'year': str(matching_record['year']),
+            'status': 'Valid',
+            'qr_raw_data': data,
+            'digital_hash': digital_hash,
+            'verification_method': 'QR Code + Database Hash Match'
+        }
+    }, 200
+
+
+def qr_response_status(body, status):
+    """QR_STATUS_PRIORITY status of a qr_payload_response"""
+    return 'VERIFIED' if status == 200 else body.get('status', 'UNREADABLE')
+
+
 @app.route('/api/scan-qr', methods=['POST'])
 def scan_qr():
     try:
@@ -347,99 +953,96 @@ def scan_qr():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'No file selected'}), 400
 
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
+        # Decode the upload in memory
+        img = decode_image_bytes(file.read())
+        if img is None:
+            return jsonify({'success': False, 'error': 'Invalid image file'}), 400
 
-        try:
-            # Load image
-            img = cv2.imread(temp_path)
-            if img is None:
-                return jsonify({'success': False, 'error': 'Invalid image file'}), 400
-
-            # Decode QR code
-            detector = cv2.QRCodeDetector()
-            data, vertices_array, binary_qr = detector.detectAndDecode(img)
-            
-            print(f"DEBUG: QR detection result - data: '{data}', vertices found: {vertices_array is not None}")
-            
-            if not data:
-                return jsonify({'success': False, 'error': 'No QR code detected in image'}), 400
+        # Decode every QR code on the page (and inside the institution's qr.roi when one is given)
+        payloads = decode_qr_regions(img, request.form.get('institution_code'))
 
-            # Parse QR data to extract certificate ID and hash
-            cert_id, digital_hash = parse_qr_data(data)
-            
-            if not cert_id:
-                return jsonify({
-                    'success': False, 
-                    'error': f'Could not extract certificate ID from QR code. QR contains: "{data}"',
-                    'qr_data': data
-                }), 400
-
-            if not digital_hash:
-                return jsonify({
-                    'success': False, 
-                    'error': f'Could not extract digital hash from QR code. Found cert_id: {cert_id}',
-                    'qr_data': data,
-                    'cert_id': cert_id
-                }), 400
-
-            print(f"DEBUG: Extracted cert_id: '{cert_id}', hash: '{digital_hash}'")
-
-            # Verify against database
-            matching_record = verify_qr_authenticity(cert_id, digital_hash)
-            
-            if not matching_record:
-                # Check if cert_id exists but hash doesn't match
-                cert_exists = db[db['certificate_no'].str.contains(cert_id, case=False, na=False)]
-                if not cert_exists.empty:
-                    return jsonify({
-                        'success': False, 
-                        'error': 'Certificate ID found but digital hash does not match. This QR code may be forged.',
-                        'qr_data': data,
-                        'cert_id': cert_id,
-                        'hash_provided': digital_hash,
-                        'status': 'FORGED'
-                    }), 400
-                else:
-                    return jsonify({
-                        'success': False, 
-                        'error': f'Certificate ID "{cert_id}" not found in database',
-                        'qr_data': data,
-                        'cert_id': cert_id,
-                        'status': 'NOT_FOUND'
-                    }), 404
-
-            return jsonify({
-                'success': True,
-                'data': {
-                    'documentType': 'Digital Certificate',
-                    'name': matching_record['name'],
-                    'certificateId': matching_record['certificate_no'],
-                    'institution': matching_record['institution'],
-                    'course': matching_record.get('course', ''),
-                    'year': str(matching_record['year']),
-                    'status': 'Valid',
-                    'qr_raw_data': data,
-                    'digital_hash': digital_hash,
-                    'verification_method': 'QR Code + Database Hash Match'
-                }
-            })
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        print(f"DEBUG: QR detection result - {len(payloads)} code(s): {payloads}")
+
+        if not payloads:
+            return jsonify({'success': False, 'error': 'No QR code detected in image'}), 400
+
+        responses = [qr_payload_response(data) for data in payloads]
+        # Same precedence as scan_certificate_qr: a forged code answers the request even next to a
+        # verified one; a sheet with several codes lists them all
+        body, status = min(responses, key=lambda response: QR_STATUS_PRIORITY.index(qr_response_status(*response)))
+        if len(responses) > 1:
+            body = dict(body, qr_codes=[response for response, _ in responses])
+        return jsonify(body), status
 
     except Exception as e:
         print(f"ERROR in scan_qr: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/verify-qr-batch', methods=['POST'])
+def verify_qr_batch():
+    """Verify raw QR payloads decoded by the client: ``{"payloads": ["...", ...]}``, one verdict per payload"""
+    try:
+        body = request.get_json(silent=True)
+        payloads = body.get('payloads') if isinstance(body, dict) else None
+        if not isinstance(payloads, list) or not payloads:
+            return jsonify({'success': False, 'error': 'payloads must be a non-empty list of QR strings'}), 400
+        if len(payloads) > QR_BULK['max_payloads']:
+            return jsonify({'success': False,
+                            'error': f"At most {QR_BULK['max_payloads']} payloads per request"}), 413
+
+        started = time.perf_counter()
+        results = check_qr_payloads(payloads)
+        elapsed = time.perf_counter() - started
+
+        summary = {}
+        for index, result in enumerate(results):
+            result['index'] = index
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        return jsonify({
+            'success': True,
+            'total': len(results),
+            'summary': summary,
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'microseconds_per_payload': round(elapsed * 1e6 / len(results), 2),
+            'results': results
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/registry', methods=['GET'])
+def registry_status():
+    """Version, size and refresh state of the in-memory registry snapshot"""
+    return jsonify(registry_info())
+
+
+@app.route('/api/reference-assets/reload', methods=['POST'])
+def reload_reference_assets():
+    """Reload this process's reference seals and signatures, after the institutions table points at new files"""
+    clear_reference_cache(request.form.get('institution_code') or None)
+    preload_reference_assets()
+    return jsonify({'success': True, 'reference_assets': reference_fingerprint()})
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'message': 'Certificate verification API is running'})
+    return jsonify({'status': 'healthy', 'message': 'Certificate verification API is running', 'ocr': ocr_health(),
+                    'jobs': queue_stats(), 'result_cache': cache_health(),
+                    'near_duplicates': duplicate_index_health(), 'registry': registry_info()})
+
+
+# Job workers run in the server process only, not in batch pool processes importing this module
+if JOB_QUEUE['workers'] > 0 and multiprocessing.parent_process() is None:
+    try:
+        start_job_workers(run_verification_job)
+    except Exception as e:
+        print(f"Verification job workers not started: {e}")
+
+# Likewise the registry watcher, pool processes keep the snapshot they were started with
+if multiprocessing.parent_process() is None:
+    start_registry_watcher()
 
 
 if __name__ == '__main__':
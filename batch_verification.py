@@ -0,0 +1,185 @@
+# batch_verification.py
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from config import BATCH
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'tiff'}
+
+
+class ArchiveTooLarge(ValueError):
+    pass
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """Process pool for batch items, one worker per core unless BATCH['workers'] says otherwise"""
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(max_workers=BATCH['workers'])
+    return _process_pool
+
+
+def is_certificate_image(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def spool_archive(stream):
+    """Copy an uploaded ZIP to a temporary file owned by the batch.
+
+    The request's own upload streams are closed when the view returns, before
+    the streamed response has been produced. Returns ``(zf, members)`` with
+    the certificate image members of the archive. Raises ArchiveTooLarge when
+    the members add up to more than BATCH['max_archive_bytes'] uncompressed.
+    """
+    spool = tempfile.TemporaryFile()
+    shutil.copyfileobj(stream, spool)
+    spool.seek(0)
+    try:
+        zf = zipfile.ZipFile(spool)
+    except zipfile.BadZipFile:
+        spool.close()
+        raise
+    members = [member for member in zf.infolist()
+               if not member.is_dir() and not member.filename.startswith('__MACOSX/')
+               and is_certificate_image(member.filename)]
+    size = sum(member.file_size for member in members)
+    if size > BATCH['max_archive_bytes']:
+        zf.close()
+        spool.close()
+        raise ArchiveTooLarge(f"Archive expands to {size} bytes, at most {BATCH['max_archive_bytes']} allowed")
+    return zf, members
+
+
+def read_member(zf, member, max_bytes):
+    """Contents of an archive member, never decompressing more than ``max_bytes``"""
+    if member.file_size > max_bytes:
+        raise ArchiveTooLarge(f"{member.filename} expands to {member.file_size} bytes, at most {max_bytes} allowed")
+    with zf.open(member) as file:
+        data = file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ArchiveTooLarge(f"{member.filename} expands to more than {max_bytes} bytes")
+    return data
+
+
+def iter_archive_items(zf, members):
+    """(filename, bytes) for each archive member, read one member at a time.
+
+    A member over BATCH['max_member_bytes'] or failing its CRC check comes
+    as (filename, exception).
+    """
+    try:
+        for member in members:
+            try:
+                yield member.filename, read_member(zf, member, BATCH['max_member_bytes'])
+            except (ArchiveTooLarge, zipfile.BadZipFile) as e:
+                yield member.filename, e
+    finally:
+        zf.fp.close()
+        zf.close()
+
+
+def spool_uploads(files):
+    """Copy multipart uploads into one temporary file, returns ``(spool, [(filename, offset, size)])``"""
+    spool = tempfile.TemporaryFile()
+    entries = []
+    for file in files:
+        offset = spool.tell()
+        shutil.copyfileobj(file.stream, spool)
+        entries.append((file.filename, offset, spool.tell() - offset))
+    return spool, entries
+
+
+def iter_spooled_items(spool, entries):
+    """(filename, bytes) for each spooled upload, read one upload at a time"""
+    try:
+        for filename, offset, size in entries:
+            spool.seek(offset)
+            yield filename, spool.read(size)
+    finally:
+        spool.close()
+
+
+def ndjson_line(obj):
+    # NumPy scalars that slipped into a result are written as plain numbers/bools
+    return json.dumps(obj, default=lambda value: value.item() if hasattr(value, 'item') else str(value)) + "\n"
+
+
+def stream_batch(items, total, worker, worker_args=(), executor=None):
+    """Run ``worker(filename, data, *worker_args)`` for every item and yield NDJSON lines as they finish.
+
+    Only a bounded number of items is read and submitted ahead of the
+    workers, so large archives aren't held in memory all at once.
+    """
+    executor = executor or get_process_pool()
+    max_in_flight = max(1, BATCH['workers'] * BATCH['max_in_flight_per_worker'])
+    started = time.monotonic()
+    completed = failed = 0
+
+    yield ndjson_line({'type': 'start', 'total': total, 'workers': BATCH['workers']})
+
+    items = enumerate(items)
+    in_flight = {}
+    exhausted = False
+    while in_flight or not exhausted:
+        while not exhausted and len(in_flight) < max_in_flight:
+            try:
+                index, (filename, data) = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            if isinstance(data, Exception):
+                # Rejected while reading (an oversized or corrupt archive member), reported like a failed item
+                future = Future()
+                future.set_exception(data)
+            else:
+                future = executor.submit(worker, filename, data, *worker_args)
+            in_flight[future] = (index, filename)
+
+        if not in_flight:
+            break
+
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in finished:
+            index, filename = in_flight.pop(future)
+            try:
+                result, elapsed_ms = future.result()
+            except Exception as e:
+                result, elapsed_ms = {'success': False, 'error': str(e)}, None
+
+            completed += 1
+            if not result.get('success'):
+                failed += 1
+            yield ndjson_line({
+                'type': 'result',
+                'index': index,
+                'filename': filename,
+                'elapsed_ms': elapsed_ms,
+                'progress': {'completed': completed, 'failed': failed, 'total': total},
+                'result': result
+            })
+
+    yield ndjson_line({
+        'type': 'summary',
+        'total': total,
+        'completed': completed,
+        'failed': failed,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+    })
+
+
+def timed(func, *args):
+    """Call func and return (result, elapsed milliseconds)"""
+    started = time.monotonic()
+    result = func(*args)
+    return result, round((time.monotonic() - started) * 1000, 1)
@@ -0,0 +1,69 @@
+# bloom_filter.py
+import hashlib
+import math
+
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+
+
+def _hash_pair(key):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    # Odd second hash, so the k probes of a key never collapse onto one bit
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class BloomFilter:
+    """Compact set of strings with no false negatives and about ``error_rate`` false positives.
+
+    Sized for ``capacity`` keys; past that the false positive rate climbs, so
+    owners rebuild a larger filter instead of adding more.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, key):
+        h1, h2 = _hash_pair(key)
+        return [((h1 + i * h2) & MASK64) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, keys, chunk_size=100000):
+        """Add many keys, hashing in Python but setting bits with NumPy"""
+        keys = list(keys)
+        probes = np.arange(self.num_hashes, dtype=np.uint64)
+        for start in range(0, len(keys), chunk_size):
+            pairs = np.array([_hash_pair(key) for key in keys[start:start + chunk_size]], dtype=np.uint64)
+            if not len(pairs):
+                continue
+            # uint64 arithmetic wraps like the & MASK64 in _positions
+            positions = ((pairs[:, :1] + probes * pairs[:, 1:]) % np.uint64(self.num_bits)).ravel()
+            np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                             np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+        self.count += len(keys)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def false_positive_rate(self):
+        """Expected false positive rate for the keys added so far"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def info(self):
+        return {
+            'keys': self.count,
+            'capacity': self.capacity,
+            'size_bytes': int(self.bits.nbytes),
+            'hash_functions': self.num_hashes,
+            'target_false_positive_rate': self.error_rate,
+            'false_positive_rate': round(self.false_positive_rate(), 6)
+        }
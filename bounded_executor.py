@@ -0,0 +1,125 @@
+# bounded_executor.py
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import API_EXECUTOR
+
+
+class ExecutorOverloaded(Exception):
+    """Every worker is busy and the wait queue is full; retry after ``retry_after`` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server busy, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool for blocking work called from async handlers, with a bounded backlog.
+
+    At most ``workers`` calls run and ``queue_size`` more wait; beyond that
+    ``run`` raises ExecutorOverloaded at once instead of queueing, so the
+    latency of accepted requests stays bounded under overload.
+    """
+
+    def __init__(self, workers, queue_size, name='api'):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+        self._avg_seconds = None
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise ExecutorOverloaded(self.retry_after())
+            self._in_flight += 1
+
+    def _done(self, started):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            # Moving average of call duration, for the Retry-After estimate
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained, at least API_EXECUTOR['retry_after']"""
+        if self._avg_seconds is None:
+            return API_EXECUTOR['retry_after']
+        return max(API_EXECUTOR['retry_after'], math.ceil(self._avg_seconds * self._in_flight / self.workers))
+
+    async def run(self, func, *args):
+        """Run ``func(*args)`` on the pool and await its result without blocking the event loop"""
+        self._admit()
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._done(started)
+            raise
+        # The slot is held until the call really ends, even if the client disconnects first
+        future.add_done_callback(lambda _: self._done(started))
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_seconds': round(self._avg_seconds, 3) if self._avg_seconds is not None else None
+            }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Pool threads don't survive fork(), a child builds its own executor"""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_api_executor():
+    """This process's executor for CPU-bound request stages (OCR, decoding, seal/signature matching)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BoundedExecutor(API_EXECUTOR['workers'], API_EXECUTOR['queue_size'])
+    return _executor
+
+
+async def read_upload(file, max_bytes=None, chunk_size=None):
+    """Read a Starlette/FastAPI UploadFile in chunks, raising UploadTooLarge past ``max_bytes``"""
+    max_bytes = max_bytes or API_EXECUTOR['max_upload_bytes']
+    chunk_size = chunk_size or API_EXECUTOR['upload_chunk_size']
+    chunks, size = [], 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"Upload larger than {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,308 @@
+# certificate_repository.py
+import pandas as pd
+
+from database import get_db_connection
+from fuzzy_matching import normalize
+
+# Column order of registry records and of the DataFrame snapshot used for fuzzy matching
+REGISTRY_COLUMNS = ['certificate_no', 'name', 'institution', 'course', 'year', 'digital_hash']
+
+SELECT_RECORD = """
+SELECT cert_id AS certificate_no, name, institution, course, year, digital_hash FROM certificates
+"""
+FIND_BY_CERT_ID_SQL = SELECT_RECORD + "WHERE cert_id = ? COLLATE NOCASE LIMIT 1"
+# Followed by "(?, ?, ...)", one placeholder per ID of the chunk
+FIND_BY_CERT_IDS_SQL = SELECT_RECORD + "WHERE cert_id COLLATE NOCASE IN "
+FIND_BY_INSTITUTION_YEAR_SQL = SELECT_RECORD + "WHERE institution = ? AND year = ? ORDER BY id"
+FIND_BY_NAME_SQL = SELECT_RECORD + "WHERE name_normalized = ? ORDER BY id"
+# Unix time in SQL with millisecond resolution, the updated_at watermark of the registry watcher
+NOW_EPOCH = "((julianday('now') - 2440587.5) * 86400.0)"
+UPSERT_SQL = f"""
+INSERT INTO certificates (cert_id, name, name_normalized, institution, course, year, digital_hash, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, {NOW_EPOCH})
+ON CONFLICT (cert_id) DO UPDATE SET
+    name = excluded.name, name_normalized = excluded.name_normalized, institution = excluded.institution,
+    course = excluded.course, year = excluded.year, digital_hash = excluded.digital_hash,
+    updated_at = excluded.updated_at
+"""
+# cert_id is unique regardless of case, so "jh-uni-2018-201" updates the row of "JH-UNI-2018-201"
+CERTIFICATES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cert_id TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    name TEXT NOT NULL,
+    name_normalized TEXT,
+    institution TEXT NOT NULL,
+    course TEXT,
+    year INTEGER,
+    digital_hash TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at REAL
+);
+"""
+RECENT_CERT_IDS_SQL = "SELECT cert_id FROM certificates WHERE updated_at >= ?"
+CHANGES_SQL = """
+SELECT id, updated_at, cert_id AS certificate_no, name, institution, course, year, digital_hash FROM certificates
+WHERE updated_at >= ? ORDER BY updated_at, id
+"""
+
+
+# Lookup indexes; the bulk importer drops them during a load and builds them once at the end. Lookups by
+# cert_id use the table's UNIQUE index.
+REGISTRY_INDEXES = {
+    'idx_certificates_institution_year': "ON certificates (institution, year)",
+    'idx_certificates_name_normalized': "ON certificates (name_normalized)",
+    'idx_certificates_updated_at': "ON certificates (updated_at)",
+}
+
+
+def _connection():
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Certificate registry database unavailable")
+    return conn
+
+
+def _record(row):
+    return dict(row) if row is not None else None
+
+
+def init_registry():
+    """Create or migrate the certificates table and its lookup indexes"""
+    conn = _connection()
+    try:
+        with conn:
+            conn.execute(CERTIFICATES_TABLE_SQL.format(table='certificates'))
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(certificates)")}
+            if 'name_normalized' not in columns:
+                conn.execute("ALTER TABLE certificates ADD COLUMN name_normalized TEXT")
+            if 'updated_at' not in columns:
+                conn.execute("ALTER TABLE certificates ADD COLUMN updated_at REAL")
+            if not _cert_id_unique_nocase(conn):
+                _rebuild_with_nocase_cert_id(conn)
+
+            # Writes that don't go through UPSERT_SQL (init_database, manual edits) still move the watermark
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS certificates_insert_updated_at AFTER INSERT ON certificates
+            WHEN NEW.updated_at IS NULL
+            BEGIN
+                UPDATE certificates SET updated_at = {NOW_EPOCH} WHERE id = NEW.id;
+            END;
+            """)
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS certificates_update_updated_at AFTER UPDATE ON certificates
+            WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE certificates SET updated_at = {NOW_EPOCH} WHERE id = NEW.id;
+            END;
+            """)
+            conn.execute(f"UPDATE certificates SET updated_at = {NOW_EPOCH} WHERE updated_at IS NULL")
+
+            # Rows written outside this module (init_database samples, older databases) lack the normalized name
+            rows = conn.execute("SELECT id, name FROM certificates WHERE name_normalized IS NULL").fetchall()
+            conn.executemany("UPDATE certificates SET name_normalized = ? WHERE id = ?",
+                             [(normalize(row['name']), row['id']) for row in rows])
+
+            create_registry_indexes(conn)
+    finally:
+        conn.close()
+
+
+def _cert_id_unique_nocase(conn):
+    """Whether the certificates table's UNIQUE constraint on cert_id ignores case"""
+    for index in conn.execute("PRAGMA index_list(certificates)").fetchall():
+        if not index['unique']:
+            continue
+        columns = conn.execute(f"PRAGMA index_xinfo({index['name']})").fetchall()
+        keys = [column for column in columns if column['key']]
+        if len(keys) == 1 and keys[0]['name'] == 'cert_id':
+            return keys[0]['coll'].upper() == 'NOCASE'
+    return False
+
+
+def _rebuild_with_nocase_cert_id(conn):
+    """Migrate a table created with a case-sensitive UNIQUE cert_id.
+
+    SQLite can't change a column's collation in place, so the rows are copied
+    into a new table. Of numbers differing only in case, the most recently
+    written row is kept, as an upsert would have done.
+    """
+    columns = "id, cert_id, name, name_normalized, institution, course, year, digital_hash, created_at, updated_at"
+    conn.execute("DROP TABLE IF EXISTS certificates_nocase")
+    conn.execute(CERTIFICATES_TABLE_SQL.format(table='certificates_nocase'))
+    conn.execute(f"INSERT OR REPLACE INTO certificates_nocase ({columns}) "
+                 f"SELECT {columns} FROM certificates ORDER BY updated_at, id")
+    dropped = conn.execute("SELECT COUNT(*) FROM certificates").fetchone()[0] - \
+        conn.execute("SELECT COUNT(*) FROM certificates_nocase").fetchone()[0]
+    conn.execute("DROP TABLE certificates")
+    conn.execute("ALTER TABLE certificates_nocase RENAME TO certificates")
+    print(f"Certificates table migrated to case-insensitive cert_id, {dropped} duplicate rows dropped")
+
+
+def create_registry_indexes(conn):
+    for name, definition in REGISTRY_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+
+def drop_registry_indexes(conn):
+    for name in REGISTRY_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def find_certificate(cert_id):
+    """Registry record for a certificate number (case-insensitive), None if there is none"""
+    if not cert_id:
+        return None
+    conn = _connection()
+    try:
+        return _record(conn.execute(FIND_BY_CERT_ID_SQL, (cert_id.strip(),)).fetchone())
+    finally:
+        conn.close()
+
+
+def cert_id_key(cert_id):
+    """Certificate number as FIND_BY_CERT_ID_SQL compares it (trimmed, case-insensitive)"""
+    return str(cert_id).strip().upper()
+
+
+def find_certificates(cert_ids, chunk_size=500):
+    """Registry records for many certificate numbers, ``{cert_id_key(cert_id): record}`` for those found.
+
+    One ``IN (...)`` query per ``chunk_size`` IDs instead of a query per ID.
+    """
+    keys = list(dict.fromkeys(cert_id_key(cert_id) for cert_id in cert_ids if cert_id))
+    records = {}
+    conn = _connection()
+    try:
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            sql = FIND_BY_CERT_IDS_SQL + "(" + ",".join("?" * len(chunk)) + ")"
+            for row in conn.execute(sql, chunk):
+                records.setdefault(cert_id_key(row['certificate_no']), dict(row))
+    finally:
+        conn.close()
+    return records
+
+
+def hash_matches(record, digital_hash):
+    return str(record['digital_hash'] or '').strip() == str(digital_hash or '').strip()
+
+
+def check_certificate_hash(cert_id, digital_hash):
+    """One index probe for a QR code: ``(record, exists)``.
+
+    ``record`` is set when the certificate exists and its digital hash
+    matches, ``exists`` tells a forged hash (True) from an unknown ID.
+    """
+    record = find_certificate(cert_id)
+    if record is None:
+        return None, False
+    if hash_matches(record, digital_hash):
+        return record, True
+    return None, True
+
+
+def find_by_institution_year(institution, year):
+    conn = _connection()
+    try:
+        return [dict(row) for row in conn.execute(FIND_BY_INSTITUTION_YEAR_SQL, (institution, int(year)))]
+    finally:
+        conn.close()
+
+
+def find_by_name(name):
+    """Records whose name equals ``name`` after whitespace/case normalization"""
+    conn = _connection()
+    try:
+        return [dict(row) for row in conn.execute(FIND_BY_NAME_SQL, (normalize(name),))]
+    finally:
+        conn.close()
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def certificate_row(record):
+    """UPSERT_SQL parameters for a record, ValueError saying what is wrong with an invalid one.
+
+    ``cert_id`` is accepted in place of ``certificate_no``.
+    """
+    cert_id = _text(record.get('certificate_no', record.get('cert_id')))
+    name = _text(record.get('name'))
+    institution = _text(record.get('institution'))
+    for field, value in (('certificate_no', cert_id), ('name', name), ('institution', institution)):
+        if not value:
+            raise ValueError(f"missing {field}")
+
+    year = _text(record.get('year'))
+    if year:
+        try:
+            year = int(float(year))
+        except (ValueError, OverflowError):
+            raise ValueError(f"invalid year {year!r}")
+        # Also keeps values SQLite can't store as an INTEGER out of the batch
+        if not 1000 <= year <= 9999:
+            raise ValueError(f"invalid year {year!r}")
+    return (cert_id, name, normalize(name), institution, _text(record.get('course')) or None, year or None,
+            _text(record.get('digital_hash')))
+
+
+def upsert_certificates(records):
+    """Insert or update registry records (dicts with the REGISTRY_COLUMNS keys), returns how many were written"""
+    rows = [certificate_row(record) for record in records]
+    conn = _connection()
+    try:
+        with conn:
+            conn.executemany(UPSERT_SQL, rows)
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def count_certificates():
+    conn = _connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM certificates").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def fetch_registry_changes(since=None):
+    """Rows written at or after the ``since`` updated_at watermark (all rows for None), oldest first.
+
+    Each row carries its ``id`` and ``updated_at`` besides the record columns.
+    """
+    conn = _connection()
+    try:
+        return [dict(row) for row in conn.execute(CHANGES_SQL, (since if since is not None else float('-inf'),))]
+    finally:
+        conn.close()
+
+
+def recent_cert_ids(since):
+    """cert_id_key of every certificate written at or after the ``since`` updated_at watermark"""
+    conn = _connection()
+    try:
+        return {cert_id_key(row['cert_id']) for row in conn.execute(RECENT_CERT_IDS_SQL, (since,))}
+    finally:
+        conn.close()
+
+
+def load_registry_frame():
+    """The whole registry as a DataFrame, the snapshot the fuzzy matching index is built from"""
+    conn = _connection()
+    try:
+        rows = conn.execute(SELECT_RECORD + "ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    return records_frame([dict(row) for row in rows])
+
+
+def records_frame(records):
+    """DataFrame of registry records with the REGISTRY_COLUMNS (other keys are dropped)"""
+    frame = pd.DataFrame(records, columns=REGISTRY_COLUMNS)
+    # Nullable integers, so a missing year doesn't turn every year into a float ("2018.0")
+    frame['year'] = frame['year'].astype('Int64')
+    return frame
+
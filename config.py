@@ -1,4 +1,17 @@
 #config.py
+import os
+
+# Characters Tesseract may emit for certificate number fields (label included, e.g. "Cert No: JH-UNI-2018-201")
+CERTIFICATE_NO_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-:"
+
+# "fields" are OCR regions (same ratio format as seal/signature roi) read with their own
+# Tesseract page segmentation mode and optional character whitelist. The field ROIs below are
+# UNCALIBRATED placeholders, not measured on real certificates: they are only used with FIELD_OCR=true,
+# set it once they have been checked against scans of each institution's certificates.
+FIELD_OCR = {
+    "enabled": os.environ.get("FIELD_OCR", "false").lower() == "true"
+}
+
 INSTITUTION_CONFIG = {
     "JHAR": {
         "seal": {
@@ -10,6 +23,18 @@ INSTITUTION_CONFIG = {
             "roi":  [0.520, 0.791, 0.695, 0.899],
             "reference_image": "assets/signatures/jhar_signature.png",  # Changed path
             "threshold": 0.3
+        },
+        "fields": {  # uncalibrated, see FIELD_OCR
+            "institution": {"roi": [0.080, 0.060, 0.700, 0.200], "psm": 7},
+            "name": {"roi": [0.150, 0.400, 0.850, 0.500], "psm": 7},
+            "year": {"roi": [0.150, 0.580, 0.850, 0.680], "psm": 7, "whitelist": "0123456789"},
+            "certificate_no": {"roi": [0.050, 0.900, 0.450, 0.970], "psm": 7, "whitelist": CERTIFICATE_NO_WHITELIST}
+        },
+        "qr": {
+            # "roi": where the QR code is printed, unset until measured on real certificates
+            # Keys for signed QR payloads (see signed_qr.py): base64url Ed25519 public key, HMAC-SHA256 secret
+            "public_key": os.environ.get("JHAR_QR_PUBLIC_KEY"),
+            "hmac_secret": os.environ.get("JHAR_QR_SECRET")
         }
     },
     "RANC": {
@@ -22,6 +47,16 @@ INSTITUTION_CONFIG = {
             "roi": [0.597, 0.759, 0.853, 0.838],
             "reference_image": "assets/signatures/ranc_signature.png",  # Changed path
             "threshold": 0.4
+        },
+        "fields": {  # uncalibrated, see FIELD_OCR
+            "institution": {"roi": [0.150, 0.250, 0.850, 0.340], "psm": 7},
+            "name": {"roi": [0.150, 0.420, 0.850, 0.520], "psm": 7},
+            "year": {"roi": [0.150, 0.600, 0.850, 0.700], "psm": 7, "whitelist": "0123456789"},
+            "certificate_no": {"roi": [0.050, 0.880, 0.450, 0.960], "psm": 7, "whitelist": CERTIFICATE_NO_WHITELIST}
+        },
+        "qr": {
+            "public_key": os.environ.get("RANC_QR_PUBLIC_KEY"),
+            "hmac_secret": os.environ.get("RANC_QR_SECRET")
         }
     },
     "JHAR_BS": {
@@ -34,6 +69,16 @@ INSTITUTION_CONFIG = {
             "roi": [0.732, 0.782, 0.889, 0.865],
             "reference_image": "assets/signatures/jhar_bs_signature.png",  # Changed path
             "threshold": 0.2
+        },
+        "fields": {  # uncalibrated, see FIELD_OCR
+            "institution": {"roi": [0.150, 0.290, 0.850, 0.380], "psm": 7},
+            "name": {"roi": [0.150, 0.450, 0.850, 0.550], "psm": 7},
+            "year": {"roi": [0.150, 0.620, 0.700, 0.720], "psm": 7, "whitelist": "0123456789"},
+            "certificate_no": {"roi": [0.050, 0.880, 0.450, 0.960], "psm": 7, "whitelist": CERTIFICATE_NO_WHITELIST}
+        },
+        "qr": {
+            "public_key": os.environ.get("JHAR_BS_QR_PUBLIC_KEY"),
+            "hmac_secret": os.environ.get("JHAR_BS_QR_SECRET")
         }
     }
 }
@@ -51,4 +96,163 @@ OCR_INSTITUTION_MAPPING = {
     "jsu": "Jharkhand State University",
     "rti": "Ranchi Tech Institute",
     "jbs": "Jharkhand Business School"
-}
\ No newline at end of file
+}
+# Seal matching: "bf" brute-forces Hamming matches with crossCheck, "flann" queries a
+# prebuilt LSH index per institution with a kNN ratio test. early_exit lets the flann
+# matcher stop once enough matches were found to clear the institution's seal threshold; the
+# reported score is then a lower bound (seal_match.early_exit in the response).
+# Unknown seal or signature modes fail the check with a ValueError.
+SEAL_MATCHER = {
+    "mode": "bf",
+    "ratio": 0.75,
+    "early_exit": True
+}
+
+# Signature matching: "direct" correlates the reference resized to the full ROI, "pyramid"
+# tries a few scales on a downsampled ROI and refines around the best hit at full resolution.
+SIGNATURE_MATCHER = {
+    "mode": "direct",
+    "scales": [0.8, 0.9, 1.0],
+    "downsample": 0.25,
+    "refine_margin": 8
+}
+
+# OCR backend: "pool" keeps long-lived in-process Tesseract workers (needs tesserocr), "pytesseract"
+# runs the tesseract CLI per call. The pool falls back to pytesseract when tesserocr is missing.
+OCR_BACKEND = {
+    "backend": os.environ.get("OCR_BACKEND", "pool"),
+    "pool_size": int(os.environ.get("OCR_POOL_SIZE", "2")),
+    "lang": "eng",
+    "health_check_interval": 30,  # seconds between worker health checks
+    "request_timeout": 60  # seconds a worker may spend on one image before it is replaced
+}
+
+# Verification pipeline: OCR, fuzzy match, seal, signature and QR stages run as a dependency
+# graph on a shared thread pool. With cancel_on_verdict a failed seal/signature/QR check
+# decides the verdict and the remaining stages are cancelled.
+PIPELINE = {
+    "max_workers": 8,
+    "cancel_on_verdict": False
+}
+
+# Verification mode for /api/verify-certificate: "full" always runs OCR and fuzzy matching,
+# "tiered" first checks the QR code (ID + hash) and skips OCR when it matches the registry
+VERIFICATION_MODE = os.environ.get("VERIFICATION_MODE", "full")
+
+# Directory the relative seal/signature paths of the institutions table are resolved against. Unset,
+# they are looked up two levels above forgery_detection.py (where app.py always looked), one level above
+# (where main.py looked) and next to it, first existing file wins
+ASSET_BASE_DIR = os.environ.get("ASSET_BASE_DIR")
+
+# Batch verification: certificates are spread over a process pool, results stream back as NDJSON
+BATCH = {
+    "workers": int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1)),
+    "max_in_flight_per_worker": 2,  # bounds how many decoded uploads are held in memory at once
+    "max_items": 10000,
+    # ZIP archives: uncompressed size limits, checked against the member headers and enforced while reading
+    "max_member_bytes": 20 << 20,
+    "max_archive_bytes": 2 << 30
+}
+
+# Asynchronous verification jobs, stored in the verification_jobs table of certificate_database.db.
+# "workers" is how many jobs one server process runs at once; unfinished jobs are requeued on restart.
+JOB_QUEUE = {
+    "workers": int(os.environ.get("JOB_WORKERS", "2")),
+    "poll_interval": 1.0,  # seconds between checks for jobs submitted by other processes
+    "recover_interval": 60,  # seconds between checks for jobs left behind by dead processes
+    "max_attempts": 3,  # a job interrupted this many times is marked failed
+    "keep_payload": False  # keep the uploaded image after the job finished
+}
+
+# Verification result cache keyed by the SHA-256 of the upload plus the registry and config
+# versions. "disk_path" enables a SQLite tier shared by all server processes.
+RESULT_CACHE = {
+    "enabled": True,
+    "max_entries": 1024,
+    "ttl": 3600,  # seconds
+    "disk_path": os.environ.get("RESULT_CACHE_DB")
+}
+
+# Near-duplicate detection: a dHash of every verified image is kept for a while. The closest earlier
+# verification within max_distance bits (of 256) is reported in the response; nothing is reused from it.
+PERCEPTUAL_HASH = {
+    "enabled": True,
+    "max_distance": 8,
+    "max_entries": 5000,
+    "ttl": 86400,  # seconds
+    # Opt-in: answer a near-duplicate whose certificate number field reads differently as SUSPECTED_FORGERY
+    # without running the pipeline. Certificates printed from one template hash only a few bits apart,
+    # so this can reject genuine certificates of other students. The number is read from the certificate_no
+    # field ROI only, so this has no effect unless FIELD_OCR is enabled (the server warns at startup).
+    "reject_mismatch": os.environ.get("NEAR_DUPLICATE_REJECT_MISMATCH", "false").lower() == "true"
+}
+
+# SQLite connections (certificate_database.db and the result cache) are pooled per process and
+# reused across requests; WAL journaling lets readers carry on while a writer commits
+SQLITE = {
+    "pool_size": 16,  # idle connections kept per database file
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # milliseconds to wait for a lock before "database is locked"
+    "cached_statements": 256
+}
+
+# Certificate registry: the certificates table of certificate_database.db. REGISTRY_CSV names a
+# legacy CSV export that is copied into the table once when the table is empty. A watcher applies
+# new and changed rows (by their updated_at watermark) to the in-memory snapshot every poll_interval.
+REGISTRY = {
+    "seed_csv": os.environ.get("REGISTRY_CSV"),
+    "poll_interval": float(os.environ.get("REGISTRY_POLL_INTERVAL", "30")),  # seconds, 0 disables the watcher
+    "watermark_lag": 5.0,  # seconds re-read behind the watermark, covers writers that commit late
+    # Bloom filter of certificate numbers answering unknown IDs without a point query. Rows written by
+    # other processes are only in it after the next poll, so a miss is confirmed against the rows written
+    # since the snapshot's watermark (one indexed query). A snapshot older than two poll intervals
+    # (refreshes failing) is bypassed and lookups go to the database.
+    "id_filter": os.environ.get("REGISTRY_ID_FILTER", "true").lower() != "false",
+    "id_filter_error_rate": 0.001,
+    "id_filter_headroom": 2.0  # filter capacity as a multiple of the registry size, rebuilt when exceeded
+}
+
+# Bulk registry imports (registry_import.py CLI and /api/registry/import)
+REGISTRY_IMPORT = {
+    "chunk_size": 5000,  # rows per executemany/transaction
+    "max_reported_rejects": 100  # rejected rows listed in the report, all of them go to --rejects-file
+}
+
+# QR decoding: codes are located on a grayscale copy whose longest side is at most detect_max_side
+# pixels and each one is decoded from a full-resolution crop around it
+QR_ENGINE = {
+    "detect_max_side": 800,
+    "crop_margin": 0.15,  # of the code's size, added on every side of the crop
+    "full_resolution_fallback": True  # search the full image when the downscaled copy shows no code
+}
+
+# /api/verify-qr-batch: raw QR payloads decoded by the client, resolved with one IN (...) query per chunk
+QR_BULK = {
+    "max_payloads": 10000,
+    "chunk_size": 500  # IDs per query, below SQLite's bound-parameter limit
+}
+
+# FastAPI services (api.py, main.py): blocking stages run on a bounded thread pool. With workers
+# busy and queue_size requests waiting, new requests get 503 with Retry-After instead of queueing.
+API_EXECUTOR = {
+    "workers": int(os.environ.get("API_WORKERS", os.cpu_count() or 1)),
+    "queue_size": int(os.environ.get("API_QUEUE_SIZE", "16")),
+    "retry_after": 2,  # minimum Retry-After seconds, raised with the backlog's expected drain time
+    "upload_chunk_size": 1 << 20,
+    "max_upload_bytes": 20 << 20
+}
+
+# Time limits of a verification request. "default" applies when the caller sends no deadline or one
+# that isn't positive (seconds, REQUEST_DEADLINE=0 for none, capped at "max"); a stage over its
+# budget is abandoned, OCR falls back to
+# a pass over a copy scaled by degraded_ocr_scale, the other stages are reported as skipped.
+DEADLINES = {
+    "default": float(os.environ.get("REQUEST_DEADLINE", "30")),
+    "max": 120,
+    "stage_budgets": {"ocr": 15, "fuzzy": 2, "seal": 5, "signature": 5, "qr": 3},
+    # Budgets of the cheaper fallbacks run once a stage's own budget is used up (degraded OCR), so OCR
+    # takes at most 15 + 5 seconds; a stage without one here is skipped instead
+    "fallback_budgets": {"ocr": 5},
+    "degraded_ocr_scale": 0.5
+}
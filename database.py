@@ -1,18 +1,94 @@
 # database.py
 import sqlite3
 import os
+import threading
 import pandas as pd
-from config import INSTITUTION_CONFIG
+from config import INSTITUTION_CONFIG, SQLITE
 
 # Define database path relative to current file
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'certificate_database.db')
 
-def get_db_connection():
-    """Get database connection with proper error handling"""
+# Hot lookups as module constants: sqlite3 keeps prepared statements per connection keyed by SQL text
+INSTITUTION_ASSETS_SQL = "SELECT seal_image_path, signature_image_path FROM institutions WHERE code = ?"
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools of the parent process after a fork. The child keeps them referenced but never uses or closes
+# those connections, closing SQLite handles inherited across fork() can break the parent's locks.
+_inherited = []
+
+
+def _reset_after_fork():
+    global _pools, _pools_lock
+    _inherited.append(_pools)
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class PooledConnection:
+    """A connection checked out of the pool by get_db_connection.
+
+    ``close()`` hands it back instead of closing it: an unfinished transaction
+    is rolled back and the next caller, on any thread, reuses the connection.
+    """
+
+    def __init__(self, conn, idle):
+        self._conn = conn
+        self._idle = idle
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        with _pools_lock:
+            if len(self._idle) < SQLITE['pool_size']:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+def open_connection(path):
+    """New connection with WAL journaling, busy timeout and a larger statement cache"""
+    # Pooled connections move between threads, but only one thread uses a connection at a time
+    conn = sqlite3.connect(path, timeout=SQLITE['busy_timeout'] / 1000,
+                           cached_statements=SQLITE['cached_statements'], check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(SQLITE['busy_timeout'])}")
+    try:
+        # WAL lets readers carry on while a writer commits; it persists in the database file
+        conn.execute(f"PRAGMA journal_mode = {SQLITE['journal_mode']}")
+        conn.execute(f"PRAGMA synchronous = {SQLITE['synchronous']}")
+    except sqlite3.Error as e:
+        print(f"Could not switch {path} to {SQLITE['journal_mode']} journaling: {e}")
+    return conn
+
+
+def get_db_connection(path=None):
+    """Get database connection with proper error handling.
+
+    Connections come from a per-process pool (certificate_database.db unless
+    ``path`` names another file); ``close()`` returns them to the pool.
+    """
+    path = path or DATABASE_PATH
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+        with _pools_lock:
+            idle = _pools.setdefault(path, [])
+            conn = idle.pop() if idle else None
+        return PooledConnection(conn or open_connection(path), idle)
     except Exception as e:
         print(f"Database connection error: {e}")
         return None
@@ -43,7 +119,7 @@ def init_database():
         create_certificates_table = """
         CREATE TABLE IF NOT EXISTS certificates (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cert_id TEXT NOT NULL UNIQUE,
+            cert_id TEXT NOT NULL UNIQUE COLLATE NOCASE,
             name TEXT NOT NULL,
             institution TEXT NOT NULL,
             course TEXT,
@@ -98,7 +174,7 @@ def get_institution_assets(institution_code):
             return get_assets_from_config(institution_code)
             
         cursor = conn.cursor()
-        cursor.execute("SELECT seal_image_path, signature_image_path FROM institutions WHERE code = ?", (institution_code,))
+        cursor.execute(INSTITUTION_ASSETS_SQL, (institution_code,))
         result = cursor.fetchone()
         conn.close()
         
@@ -0,0 +1,101 @@
+# field_ocr.py
+import re
+
+from config import FIELD_OCR, INSTITUTION_CONFIG, INSTITUTION_NAME_TO_CODE, OCR_INSTITUTION_MAPPING
+from ocr_backend import image_to_string
+
+CODE_TO_INSTITUTION_NAME = {code: name for name, code in INSTITUTION_NAME_TO_CODE.items()}
+
+
+def crop_field(img, roi_ratio):
+    """Crop a ratio ROI out of a PIL image or a NumPy array"""
+    if hasattr(img, 'crop'):
+        width, height = img.size
+        return img.crop((int(roi_ratio[0] * width), int(roi_ratio[1] * height),
+                         int(roi_ratio[2] * width), int(roi_ratio[3] * height)))
+
+    height, width = img.shape[:2]
+    return img[int(roi_ratio[1] * height):int(roi_ratio[3] * height),
+               int(roi_ratio[0] * width):int(roi_ratio[2] * width)]
+
+
+def ocr_field(img, field_config):
+    """OCR a single configured field crop"""
+    crop = crop_field(img, field_config['roi'])
+    return image_to_string(crop, psm=field_config.get('psm', 7), whitelist=field_config.get('whitelist')).strip()
+
+
+def institution_code_from_text(text):
+    """Institution code for OCR'd header text, None if no known institution name appears in it"""
+    lowered = " ".join(text.lower().split())
+    # Full names first so "jbs" inside some other word can't win over the real name
+    for alias in sorted(OCR_INSTITUTION_MAPPING, key=len, reverse=True):
+        if alias in lowered.split() or (len(alias) > 4 and alias in lowered):
+            return INSTITUTION_NAME_TO_CODE.get(OCR_INSTITUTION_MAPPING[alias])
+    return None
+
+
+def institution_fields(institution_code):
+    """The institution's field ROIs, empty while FIELD_OCR is off"""
+    if not FIELD_OCR['enabled']:
+        return {}
+    return INSTITUTION_CONFIG.get(institution_code, {}).get('fields') or {}
+
+
+def detect_institution_code(img):
+    """Find the institution by reading only the configured institution header ROIs.
+
+    Stops at the first ROI that yields any text: text naming no known
+    institution leaves it to full-page OCR instead of more header passes.
+    """
+    seen = set()
+    for institution_code in INSTITUTION_CONFIG:
+        field_config = institution_fields(institution_code).get('institution')
+        if not field_config:
+            continue
+        key = (tuple(field_config['roi']), field_config.get('psm', 7), field_config.get('whitelist'))
+        if key in seen:
+            continue
+        seen.add(key)
+        text = ocr_field(img, field_config)
+        if text:
+            return institution_code_from_text(text)
+    return None
+
+
+def extract_fields(img, institution_code):
+    """Raw OCR text of every configured field for an institution, None when it has no field ROIs"""
+    fields = institution_fields(institution_code)
+    if not fields:
+        return None
+    return {name: ocr_field(img, field_config) for name, field_config in fields.items() if name != 'institution'}
+
+
+def parse_certificate_no(text):
+    """Pull the certificate number out of OCR text, "-" if none is found"""
+    patterns = [
+        r'(JH[-_ ]?UNI[-_ ]?\d{4}[-_ ]?\d+)',
+        r'Cert(?:ificate)?\s*No[:\-\s]*([A-Z0-9\-]+)'
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            if 'JH' in pattern:
+                return re.sub(r'[\s\-_]+', '-', match.group(1)).upper()
+            return match.group(1).strip()
+    return "-"
+
+
+def parse_certificate_no_field(text):
+    """Certificate number in the OCR text of a certificate_no field crop, None if there is none"""
+    certificate_no = parse_certificate_no(text)
+    if certificate_no != "-":
+        return certificate_no
+    # Other institutions' PREFIX-YYYY-N numbers without a "Cert No" label
+    match = re.search(r'([A-Z]+(?:-[A-Z]+)*-\d{4}-\d+)', text, re.IGNORECASE)
+    if match:
+        return match.group(1).upper()
+    # A field crop holds little besides the number itself, take the last token with a digit
+    tokens = [token for token in re.split(r'[\s:]+', text) if re.search(r'\d', token)]
+    return tokens[-1].upper() if tokens else None
@@ -2,8 +2,23 @@
 import cv2
 import numpy as np
 from database import get_institution_assets  
-from config import INSTITUTION_CONFIG, INSTITUTION_NAME_TO_CODE, OCR_INSTITUTION_MAPPING
+from config import (ASSET_BASE_DIR, DEADLINES, INSTITUTION_CONFIG, INSTITUTION_NAME_TO_CODE, OCR_INSTITUTION_MAPPING, SEAL_MATCHER,
+                    SIGNATURE_MATCHER)
+from verification_pipeline import run_pipeline, stage
+import math
 import os
+import threading
+
+FLANN_INDEX_LSH = 6
+FLANN_INDEX_PARAMS = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+FLANN_SEARCH_PARAMS = dict(checks=50)
+
+# Query descriptors are matched in chunks of this size so the flann matcher can exit early
+FLANN_EARLY_EXIT_CHUNK = 64
+
+# Decoded reference images and seal ORB features per institution code, keyed by code
+_reference_cache = {}
+_reference_cache_lock = threading.Lock()
 
 
 def extract_roi(image, roi_ratio):
@@ -21,7 +36,156 @@ def get_institution_code_from_ocr(ocr_institution_name):
     return INSTITUTION_NAME_TO_CODE.get(standard_name)
 
 
-def verify_seal(extracted_seal, reference_seal):
+def asset_base_dirs():
+    if ASSET_BASE_DIR:
+        return [ASSET_BASE_DIR]
+    here = os.path.dirname(os.path.abspath(__file__))
+    return [os.path.dirname(os.path.dirname(here)), os.path.dirname(here), here]
+
+
+def resolve_asset_path(path):
+    """Absolute path of a reference image, see config.ASSET_BASE_DIR"""
+    if os.path.isabs(path):
+        return path
+    candidates = [os.path.join(base_dir, path) for base_dir in asset_base_dirs()]
+    return next((candidate for candidate in candidates if os.path.isfile(candidate)), candidates[0])
+
+
+def get_reference_paths(institution_code):
+    assets = get_institution_assets(institution_code)
+    if not assets:
+        raise ValueError(f"No assets found for institution: {institution_code}")
+
+    return resolve_asset_path(assets['seal_path']), resolve_asset_path(assets['signature_path'])
+
+
+def _asset_stats(paths):
+    """(mtime, size) of each file, None for a missing one"""
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append((stat.st_mtime, stat.st_size))
+        except OSError:
+            stats.append(None)
+    return tuple(stats)
+
+
+def load_reference_assets(institution_code):
+    """Decode the reference seal and signature to grayscale and precompute the seal's ORB features"""
+    ref_seal_path, ref_signature_path = get_reference_paths(institution_code)
+    stats = _asset_stats((ref_seal_path, ref_signature_path))
+
+    ref_seal = cv2.imread(ref_seal_path)
+    ref_signature = cv2.imread(ref_signature_path)
+
+    if ref_seal is None:
+        raise ValueError(f"Reference seal not found at: {ref_seal_path}")
+    if ref_signature is None:
+        raise ValueError(f"Reference signature not found at: {ref_signature_path}")
+
+    ref_seal = cv2.cvtColor(ref_seal, cv2.COLOR_BGR2GRAY)
+    ref_signature = cv2.cvtColor(ref_signature, cv2.COLOR_BGR2GRAY)
+    seal_keypoints, seal_descriptors = cv2.ORB_create().detectAndCompute(ref_seal, None)
+
+    return {
+        'paths': (ref_seal_path, ref_signature_path),
+        'stats': stats,
+        'seal': ref_seal,
+        'signature': ref_signature,
+        'seal_features': (seal_keypoints, seal_descriptors),
+        'seal_index': build_seal_index(seal_descriptors)
+    }
+
+
+def get_reference_assets(institution_code):
+    """Cached reference assets for an institution, reloaded when the files on disk change"""
+    assets = _reference_cache.get(institution_code)
+    if assets is None or _asset_stats(assets['paths']) != assets['stats']:
+        assets = load_reference_assets(institution_code)
+        with _reference_cache_lock:
+            _reference_cache[institution_code] = assets
+    return assets
+
+
+def clear_reference_cache(institution_code=None):
+    """Drop cached reference assets, e.g. after the institutions table points at new files"""
+    with _reference_cache_lock:
+        if institution_code is None:
+            _reference_cache.clear()
+        else:
+            _reference_cache.pop(institution_code, None)
+
+
+def reference_fingerprint():
+    """Paths and (mtime, size) of every institution's reference seal and signature, None where they don't load"""
+    fingerprint = {}
+    for institution_code in INSTITUTION_CONFIG:
+        try:
+            assets = get_reference_assets(institution_code)
+            fingerprint[institution_code] = [assets['paths'], assets['stats']]
+        except ValueError:
+            fingerprint[institution_code] = None
+    return fingerprint
+
+
+def preload_reference_assets():
+    """Fill the reference cache for every configured institution"""
+    for institution_code in INSTITUTION_CONFIG:
+        try:
+            get_reference_assets(institution_code)
+        except Exception as e:
+            print(f"Could not preload reference assets for {institution_code}: {e}")
+
+
+def build_seal_index(descriptors):
+    """FLANN LSH index over reference seal descriptors, None if there are too few to match against"""
+    if descriptors is None or len(descriptors) < 2:
+        return None
+    matcher = cv2.FlannBasedMatcher(FLANN_INDEX_PARAMS, FLANN_SEARCH_PARAMS)
+    matcher.add([descriptors])
+    matcher.train()
+    return {'matcher': matcher, 'lock': threading.Lock()}
+
+
+def count_flann_matches(des1, seal_index, ratio, needed=None):
+    """Count query descriptors passing the kNN ratio test, stopping once ``needed`` is reached.
+
+    Returns ``(count, stopped_early)``; a count that stopped early is a lower bound.
+    """
+    good = 0
+    chunk = FLANN_EARLY_EXIT_CHUNK if needed else len(des1)
+    for start in range(0, len(des1), chunk):
+        with seal_index['lock']:
+            knn_matches = seal_index['matcher'].knnMatch(des1[start:start + chunk], k=2)
+        for pair in knn_matches:
+            # LSH can return fewer than two neighbours, a lone neighbour has nothing to compare against
+            if len(pair) == 2 and pair[0].distance < ratio * pair[1].distance:
+                good += 1
+        if needed and good >= needed:
+            return good, start + chunk < len(des1)
+    return good, False
+
+
+def verify_seal(extracted_seal, reference_seal, reference_features=None, matcher=None, seal_index=None,
+                early_exit_threshold=None):
+    """Seal score alone, see match_seal"""
+    return match_seal(extracted_seal, reference_seal, reference_features, matcher, seal_index,
+                      early_exit_threshold)[0]
+
+
+def match_seal(extracted_seal, reference_seal, reference_features=None, matcher=None, seal_index=None,
+               early_exit_threshold=None):
+    """Seal score and ``{'mode', 'matches', 'early_exit'}``.
+
+    With ``early_exit_threshold`` the flann matcher stops once the score
+    clears it; ``early_exit`` then says the score is only a lower bound.
+    """
+    matcher = matcher or SEAL_MATCHER['mode']
+    if matcher not in ('bf', 'flann'):
+        raise ValueError(f"Unknown seal matcher: {matcher}")
+    details = {'mode': matcher, 'matches': 0, 'early_exit': False}
+
     if len(extracted_seal.shape) == 3:
         extracted_seal = cv2.cvtColor(extracted_seal, cv2.COLOR_BGR2GRAY)
     if len(reference_seal.shape) == 3:
@@ -29,18 +193,32 @@ def verify_seal(extracted_seal, reference_seal):
 
     orb = cv2.ORB_create()
     kp1, des1 = orb.detectAndCompute(extracted_seal, None)
-    kp2, des2 = orb.detectAndCompute(reference_seal, None)
+    if reference_features is not None:
+        kp2, des2 = reference_features
+    else:
+        kp2, des2 = orb.detectAndCompute(reference_seal, None)
 
     if des1 is None or des2 is None or len(des1) < 2 or len(des2) < 2:
-        return 0.0
+        return 0.0, details
 
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-    matches = bf.match(des1, des2)
+    if matcher == 'flann':
+        if seal_index is None:
+            seal_index = build_seal_index(des2)
+        needed = None
+        if early_exit_threshold is not None:
+            # Enough matches to clear the threshold, and the minimum of 11 every score needs
+            needed = max(11, math.ceil(early_exit_threshold * min(len(des1), len(des2))))
+        match_count, details['early_exit'] = count_flann_matches(des1, seal_index, SEAL_MATCHER.get('ratio', 0.75),
+                                                                 needed)
+    else:
+        bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        match_count = len(bf.match(des1, des2))
+    details['matches'] = match_count
 
-    if len(matches) > 10:
-        match_score = len(matches) / min(len(des1), len(des2))
-        return min(match_score, 1.0)
-    return 0.0
+    if match_count > 10:
+        match_score = match_count / min(len(des1), len(des2))
+        return min(match_score, 1.0), details
+    return 0.0, details
 
 
 def verify_signature(extracted_signature, reference_signature):
@@ -62,47 +240,122 @@ def verify_signature(extracted_signature, reference_signature):
     return max_val
 
 
-def detect_forgery(certificate_path, ocr_data, debug=False):
+def verify_signature_pyramid(extracted_signature, reference_signature, scales=None, downsample=None,
+                             refine_margin=None):
+    """Coarse-to-fine signature match.
+
+    Searches ``scales`` of the reference on a downsampled ROI, then refines
+    around the best location at full resolution. Returns the
+    TM_CCOEFF_NORMED score and the chosen scale and (x, y) offset.
+    """
+    scales = scales or SIGNATURE_MATCHER['scales']
+    downsample = downsample or SIGNATURE_MATCHER['downsample']
+    refine_margin = SIGNATURE_MATCHER['refine_margin'] if refine_margin is None else refine_margin
+
+    if len(extracted_signature.shape) == 3:
+        extracted_gray = cv2.cvtColor(extracted_signature, cv2.COLOR_BGR2GRAY)
+    else:
+        extracted_gray = extracted_signature
+
+    if len(reference_signature.shape) == 3:
+        reference_gray = cv2.cvtColor(reference_signature, cv2.COLOR_BGR2GRAY)
+    else:
+        reference_gray = reference_signature
+
+    height, width = extracted_gray.shape[:2]
+    if not height or not width:
+        return 0.0, {'scale': None, 'offset': None}
+    small = cv2.resize(extracted_gray, (max(1, round(width * downsample)), max(1, round(height * downsample))),
+                       interpolation=cv2.INTER_AREA)
+
+    # Coarse pass: best scale and location on the downsampled ROI
+    best = None
+    for scale in scales:
+        template_w = min(round(width * scale * downsample), small.shape[1])
+        template_h = min(round(height * scale * downsample), small.shape[0])
+        if template_w < 4 or template_h < 4:
+            continue
+        template = cv2.resize(reference_gray, (template_w, template_h), interpolation=cv2.INTER_AREA)
+        _, max_val, _, max_loc = cv2.minMaxLoc(cv2.matchTemplate(small, template, cv2.TM_CCOEFF_NORMED))
+        if best is None or max_val > best[0]:
+            best = (max_val, scale, max_loc)
+
+    if best is None:
+        # ROI too small for a template at any scale: nothing to compare, a tiny flat crop would otherwise
+        # correlate perfectly with its resized reference
+        return 0.0, {'scale': None, 'offset': None}
+
+    # Fine pass: only a small window around the coarse hit at full resolution
+    _, scale, (coarse_x, coarse_y) = best
+    template_w = min(round(width * scale), width)
+    template_h = min(round(height * scale), height)
+    template = cv2.resize(reference_gray, (template_w, template_h))
+
+    margin = refine_margin + math.ceil(1 / downsample)
+    x_start = max(0, round(coarse_x / downsample) - margin)
+    y_start = max(0, round(coarse_y / downsample) - margin)
+    x_end = min(width, round(coarse_x / downsample) + margin + template_w)
+    y_end = min(height, round(coarse_y / downsample) + margin + template_h)
+    window = extracted_gray[y_start:y_end, x_start:x_end]
+
+    _, max_val, _, max_loc = cv2.minMaxLoc(cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED))
+    return max_val, {'scale': scale, 'offset': [x_start + max_loc[0], y_start + max_loc[1]]}
+
+
+def detect_forgery(certificate_path, ocr_data, debug=False, seal_matcher=None, signature_matcher=None, deadline=None):
     cert_img = cv2.imread(certificate_path)
     if cert_img is None:
         raise ValueError(f"Certificate image not found at: {certificate_path}")
 
-    institution_name = ocr_data.get('institution', '')
-    institution_code = get_institution_code_from_ocr(institution_name)
+    return detect_forgery_image(cert_img, ocr_data, debug, seal_matcher, signature_matcher, deadline)
 
-    if not institution_code:
-        raise ValueError(f"Could not determine institution code from: {institution_name}")
 
+def get_institution_config(institution_code):
     config = INSTITUTION_CONFIG.get(institution_code)
     if not config:
         raise ValueError(f"No configuration found for institution: {institution_code}")
+    return config
 
-    assets = get_institution_assets(institution_code)
-    if not assets:
-        raise ValueError(f"No assets found for institution: {institution_code}")
 
-    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    ref_seal_path = os.path.join(base_dir, assets['seal_path'])
-    ref_signature_path = os.path.join(base_dir, assets['signature_path'])
+def check_seal(cert_img, institution_code, seal_matcher=None, debug=False):
+    """Seal score and match details (see match_seal) for the institution's seal ROI of a decoded certificate"""
+    config = get_institution_config(institution_code)
+    references = get_reference_assets(institution_code)
 
-    ref_seal = cv2.imread(ref_seal_path)
-    ref_signature = cv2.imread(ref_signature_path)
+    seal_region = extract_roi(cert_img, config['seal']['roi'])
+    if debug:
+        cv2.imwrite(f"extracted_seal_{institution_code}.jpg", seal_region)
 
-    if ref_seal is None:
-        raise ValueError(f"Reference seal not found at: {ref_seal_path}")
-    if ref_signature is None:
-        raise ValueError(f"Reference signature not found at: {ref_signature_path}")
+    seal_threshold = config['seal'].get('threshold', 0.25)
+    return match_seal(seal_region, references['seal'], references['seal_features'],
+                      matcher=seal_matcher or SEAL_MATCHER['mode'], seal_index=references['seal_index'],
+                      early_exit_threshold=seal_threshold if SEAL_MATCHER.get('early_exit') else None)
 
-    seal_region = extract_roi(cert_img, config['seal']['roi'])
-    signature_region = extract_roi(cert_img, config['signature']['roi'])
 
+def check_signature(cert_img, institution_code, signature_matcher=None, debug=False):
+    """Signature score and match details for the institution's signature ROI of a decoded certificate"""
+    config = get_institution_config(institution_code)
+    references = get_reference_assets(institution_code)
+
+    signature_region = extract_roi(cert_img, config['signature']['roi'])
     if debug:
-        cv2.imwrite(f"extracted_seal_{institution_code}.jpg", seal_region)
         cv2.imwrite(f"extracted_signature_{institution_code}.jpg", signature_region)
 
-    seal_score = verify_seal(seal_region, ref_seal)
-    signature_score = verify_signature(signature_region, ref_signature)
+    signature_matcher = signature_matcher or SIGNATURE_MATCHER['mode']
+    if signature_matcher not in ('direct', 'pyramid'):
+        raise ValueError(f"Unknown signature matcher: {signature_matcher}")
+    if signature_matcher == 'pyramid':
+        signature_score, signature_match = verify_signature_pyramid(signature_region, references['signature'])
+    else:
+        signature_score = verify_signature(signature_region, references['signature'])
+        signature_match = {'scale': 1.0, 'offset': [0, 0]}
+    signature_match['mode'] = signature_matcher
+    return signature_score, signature_match
+
 
+def forgery_report(institution_name, institution_code, seal_score, seal_match, signature_score, signature_match):
+    """Combine seal and signature scores into the detect_forgery result"""
+    config = get_institution_config(institution_code)
     seal_threshold = config['seal'].get('threshold', 0.25)
     signature_threshold = config['signature'].get('threshold', 0.05)
 
@@ -114,8 +367,37 @@ def detect_forgery(certificate_path, ocr_data, debug=False):
         'seal_authentic': seal_score >= seal_threshold,
         'signature_authentic': signature_score >= signature_threshold,
         'overall_authentic': seal_score >= seal_threshold and signature_score >= signature_threshold,
+        'seal_matcher': seal_match['mode'],
+        # early_exit: matching stopped once the threshold was cleared, seal_match_score is a lower bound
+        'seal_match': seal_match,
+        'signature_match': signature_match,
         'thresholds': {
             'seal': seal_threshold,
             'signature': signature_threshold
         }
-    }
\ No newline at end of file
+    }
+
+
+def detect_forgery_image(cert_img, ocr_data, debug=False, seal_matcher=None, signature_matcher=None, deadline=None):
+    """detect_forgery on an already decoded BGR image, the seal/signature ROIs are views into it.
+
+    Seal and signature run in parallel within their DEADLINES stage budgets
+    and the optional ``deadline`` (time.monotonic() value); TimeoutError
+    names the check that ran out of time.
+    """
+    institution_name = ocr_data.get('institution', '')
+    institution_code = get_institution_code_from_ocr(institution_name)
+
+    if not institution_code:
+        raise ValueError(f"Could not determine institution code from: {institution_name}")
+
+    run = run_pipeline({
+        'seal': stage(lambda inputs: check_seal(cert_img, institution_code, seal_matcher, debug)),
+        'signature': stage(lambda inputs: check_signature(cert_img, institution_code, signature_matcher, debug))
+    }, deadline=deadline, budgets=DEADLINES['stage_budgets'])
+    for name in ('seal', 'signature'):
+        if name in run['skipped']:
+            raise TimeoutError(f"{name} check skipped: {run['skipped'][name]}")
+        if name in run['errors']:
+            raise ValueError(run['errors'][name])
+    return forgery_report(institution_name, institution_code, *run['results']['seal'], *run['results']['signature'])
@@ -0,0 +1,339 @@
+# fuzzy_matching.py
+import bisect
+import difflib
+import hashlib
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+try:
+    from rapidfuzz.distance import Indel
+    from rapidfuzz.process import cdist
+except ImportError:
+    # rapidfuzz is optional, scoring falls back to fuzzywuzzy one pair at a time
+    cdist = None
+
+# cdist reproduces fuzz.ratio as computed with python-Levenshtein; fuzzywuzzy without it scores with difflib,
+# which the Indel formula doesn't match, so the vectorised path is only taken when both agree
+VECTORISED_RATIO = cdist is not None and fuzz.SequenceMatcher is not difflib.SequenceMatcher
+
+NGRAM_SIZE = 3
+
+# Weights of the per-field scores in the overall match score
+SCORE_WEIGHTS = {'cert': 0.4, 'name': 0.3, 'inst': 0.2, 'year': 0.1}
+
+
+def normalize(text):
+    """Normalize text for fuzzy matching"""
+    return re.sub(r'\s+', ' ', text).strip().upper()
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    """Set of padded character n-grams for a normalized string"""
+    padded = " " * (n - 1) + text + " " * (n - 1)
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def canonical_cert_no(text):
+    """Certificate number with case, spacing and separators stripped (JH UNI_2018-201 -> JHUNI2018201)"""
+    return re.sub(r'[^A-Z0-9]', '', normalize(text))
+
+
+def registry_version(db):
+    """Short content hash of a registry DataFrame, changes whenever any row does"""
+    row_hashes = pd.util.hash_pandas_object(db, index=False).values
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()[:16]
+
+
+def build_registry_index(db):
+    """Build the in-memory lookup structures for a registry DataFrame.
+
+    Normalizes certificate_no, name and institution once, maps canonical
+    certificate numbers to rows and builds the trigram index over
+    certificate_no and name. Postings hold row positions (as used by
+    ``db.iloc``) in ascending order, so candidates come back in the same
+    order a full scan would visit them.
+    """
+    block = normalize_block(db)
+    index = {'size': len(db), 'version': registry_version(db), 'block': block, 'cert_lookup': defaultdict(list),
+             'cert_grams': defaultdict(list), 'name_grams': defaultdict(list)}
+
+    for position, value in enumerate(block['cert']):
+        key = canonical_cert_no(value)
+        if key:
+            index['cert_lookup'][key].append(position)
+
+    for field, column in (('cert_grams', 'cert'), ('name_grams', 'name')):
+        postings = index[field]
+        for position, value in enumerate(block[column]):
+            for gram in ngrams(value):
+                postings[gram].append(position)
+
+    for field in ('cert_lookup', 'cert_grams', 'name_grams'):
+        index[field] = dict(index[field])
+
+    return index
+
+
+def _writable_posting(postings, copied, key):
+    """Posting list of ``key`` that may be modified: copied once per update so older indexes stay intact"""
+    if key not in copied:
+        postings[key] = list(postings.get(key, ()))
+        copied.add(key)
+    return postings[key]
+
+
+def update_registry_index(index, updates, appended):
+    """New index with the rows at some positions replaced and rows appended at the end.
+
+    ``updates`` maps row position -> replacement row and ``appended`` is a
+    DataFrame of new rows, both with the registry columns. The given index
+    isn't modified: only the arrays and posting lists that change are
+    copied, so requests still holding it keep a consistent view. The
+    ``version`` of the new index is left to the caller.
+    """
+    old_block = index['block']
+    new_rows = normalize_block(appended)
+    block = {field: np.concatenate([old_block[field], new_rows[field]]) for field in old_block}
+    new_index = dict(index, size=index['size'] + len(appended), block=block)
+    for field in ('cert_lookup', 'cert_grams', 'name_grams'):
+        new_index[field] = dict(index[field])
+    copied = {field: set() for field in ('cert_lookup', 'cert_grams', 'name_grams')}
+
+    def unlink(position):
+        key = canonical_cert_no(block['cert'][position])
+        if key:
+            _writable_posting(new_index['cert_lookup'], copied['cert_lookup'], key).remove(position)
+        for field, column in (('cert_grams', 'cert'), ('name_grams', 'name')):
+            for gram in ngrams(block[column][position]):
+                _writable_posting(new_index[field], copied[field], gram).remove(position)
+
+    def link(position):
+        key = canonical_cert_no(block['cert'][position])
+        if key:
+            bisect.insort(_writable_posting(new_index['cert_lookup'], copied['cert_lookup'], key), position)
+        for field, column in (('cert_grams', 'cert'), ('name_grams', 'name')):
+            for gram in ngrams(block[column][position]):
+                bisect.insort(_writable_posting(new_index[field], copied[field], gram), position)
+
+    if updates:
+        positions = sorted(updates)
+        replaced = normalize_block(pd.DataFrame([updates[position] for position in positions]))
+        for i, position in enumerate(positions):
+            unlink(position)
+            for field in block:
+                block[field][position] = replaced[field][i]
+            link(position)
+
+    for position in range(index['size'], new_index['size']):
+        link(position)
+
+    # Posting lists emptied by an update would only cost lookups
+    for field, keys in copied.items():
+        for key in keys:
+            if not new_index[field][key]:
+                del new_index[field][key]
+
+    return new_index
+
+
+def max_edits_for_ratio(length, threshold):
+    """Upper bound on indel edits between a query of ``length`` and any string scoring above threshold"""
+    # fuzz.ratio rounds 100 * 2M / (len(a) + len(b)), so a score > threshold needs r >= (threshold + 0.5) / 100.
+    # With M <= min(len(a), len(b)) the other string is at most length * (2 - r) / r long, which caps the
+    # number of insertions and deletions at 2 * length * (1 - r) / r (difflib's M never exceeds the longest common
+    # subsequence, so this holds for fuzzywuzzy without python-Levenshtein too).
+    min_ratio = (threshold + 0.5) / 100
+    if min_ratio <= 0:
+        return None
+    return math.floor(2 * length * (1 - min_ratio) / min_ratio + 1e-9)
+
+
+def _field_candidates(postings, query, threshold):
+    """Row positions that can still score above threshold for one field, or None if the field can't filter"""
+    if not query:
+        # An empty query only equals empty registry values, don't try to be clever about it
+        return None
+
+    max_edits = max_edits_for_ratio(len(query), threshold)
+    if max_edits is None:
+        return None
+
+    query_grams = ngrams(query)
+    # Every edit touches at most NGRAM_SIZE grams, the remaining ones must be shared with the row
+    min_shared = len(query_grams) - NGRAM_SIZE * max_edits
+    if min_shared <= 0:
+        return None
+
+    counts = Counter()
+    for gram in query_grams:
+        counts.update(postings.get(gram, ()))
+
+    return {position for position, shared in counts.items() if shared >= min_shared}
+
+
+def candidate_positions(index, info, threshold):
+    """Narrow the registry to rows that can pass the certificate and name thresholds.
+
+    Returns a sorted list of row positions, or None when neither field is
+    selective enough and the caller has to scan every row.
+    """
+    cert_candidates = _field_candidates(index['cert_grams'], normalize(info.get("certificate_no", "")), threshold)
+    name_candidates = _field_candidates(index['name_grams'], normalize(info.get("name", "")), threshold)
+
+    if cert_candidates is None and name_candidates is None:
+        return None
+    if cert_candidates is None:
+        return sorted(name_candidates)
+    if name_candidates is None:
+        return sorted(cert_candidates)
+    return sorted(cert_candidates & name_candidates)
+
+
+def normalize_block(rows):
+    """Normalize a block of registry rows once into arrays for the scoring engine"""
+    return {
+        'cert': np.array([normalize(value) for value in rows['certificate_no'].astype(str)], dtype=object),
+        'name': np.array([normalize(value) for value in rows['name'].astype(str)], dtype=object),
+        'inst': np.array([normalize(value) for value in rows['institution'].astype(str)], dtype=object),
+        'year': np.array(rows['year'].astype(str).tolist(), dtype=object),
+    }
+
+
+def ratio_matrix(queries, choices):
+    """fuzz.ratio of every query against every choice as a (queries, choices) int array"""
+    # Registry columns repeat a lot (institution names especially), score each distinct value once
+    unique_choices, inverse = np.unique(np.asarray(choices, dtype=str), return_inverse=True)
+    unique_choices = unique_choices.tolist()
+
+    if VECTORISED_RATIO and queries and unique_choices:
+        # Same integer formula as fuzz.ratio backed by python-Levenshtein: round(100 * (lensum - indel) / lensum)
+        distances = cdist(queries, unique_choices, scorer=Indel.distance, dtype=np.int64, workers=-1)
+        lensum = np.add.outer([len(q) for q in queries], [len(c) for c in unique_choices])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.rint(100 * (lensum - distances) / lensum)
+        scores = np.nan_to_num(scores, nan=100).astype(np.int64)
+        # fuzz.ratio short-circuits: equal strings score 100, an empty side scores 0
+        empty = np.logical_or.outer([not q for q in queries], [not c for c in unique_choices])
+        equal = np.equal.outer(np.array(queries, dtype=object), np.array(unique_choices, dtype=object))
+        scores[empty] = 0
+        scores[equal] = 100
+    else:
+        scores = np.array([[fuzz.ratio(q, c) for c in unique_choices] for q in queries], dtype=np.int64)
+        scores = scores.reshape(len(queries), len(unique_choices))
+
+    return scores[:, inverse.reshape(-1)]
+
+
+def score_block(infos, block):
+    """Score many extracted infos against a normalized block in one go.
+
+    Returns a dict of (queries, rows) arrays: the per-field scores and the
+    weighted ``overall`` score.
+    """
+    scores = {
+        'cert': ratio_matrix([normalize(info.get("certificate_no", "")) for info in infos], block['cert']),
+        'name': ratio_matrix([normalize(info.get("name", "")) for info in infos], block['name']),
+        'inst': ratio_matrix([normalize(info.get("institution", "")) for info in infos], block['inst']),
+        'year': np.where(np.equal.outer(np.array([info.get("year", "") for info in infos], dtype=object),
+                                        block['year']), 100, 0),
+    }
+    scores['overall'] = sum(scores[field] * weight for field, weight in SCORE_WEIGHTS.items())
+    return scores
+
+
+def best_matches(infos, block, threshold, first=False, chunk_size=20000):
+    """Pick the matching row for each info, ``chunk_size`` rows at a time.
+
+    A row matches when cert, name and institution all score above threshold
+    and the year agrees. By default the highest overall score wins (earliest
+    row on ties); with ``first=True`` the earliest matching row wins.
+    Returns a list of ``(position, scores)`` with position None for no match.
+    """
+    results = [(None, {}) for _ in infos]
+    total = len(block['cert'])
+
+    for start in range(0, total, chunk_size):
+        chunk = {field: values[start:start + chunk_size] for field, values in block.items()}
+        scores = score_block(infos, chunk)
+        mask = ((scores['cert'] > threshold) & (scores['name'] > threshold) &
+                (scores['inst'] > threshold) & (scores['year'] > 50))
+        ranked = np.where(mask, scores['overall'], -np.inf)
+        picks = mask.argmax(axis=1) if first else ranked.argmax(axis=1)
+
+        for q, column in enumerate(picks):
+            if not mask[q, column]:
+                continue
+            position, best = results[q]
+            if position is not None and (first or scores['overall'][q, column] <= best['overall']):
+                continue
+            best = {field: int(scores[field][q, column]) for field in ('cert', 'name', 'inst', 'year')}
+            best['overall'] = float(scores['overall'][q, column])
+            results[q] = (start + int(column), best)
+
+    return results
+
+
+def take_block(block, positions):
+    """Rows of a normalized block at the given positions"""
+    return {field: values[positions] for field, values in block.items()}
+
+
+def exact_match(index, info, threshold, first=False):
+    """O(1) lookup of rows whose certificate number is canonically equal to the query.
+
+    A canonical hit counts as a perfect certificate score, the other fields
+    still have to clear the threshold. Returns ``(position, scores)``, with
+    position None when the lookup misses.
+    """
+    best = (None, {})
+    key = canonical_cert_no(info.get("certificate_no", ""))
+
+    for position in index['cert_lookup'].get(key, ()) if key else ():
+        row = take_block(index['block'], [position])
+        matched, scores = best_matches([dict(info, certificate_no=row['cert'][0])], row, threshold)[0]
+        if matched is None:
+            continue
+        if first:
+            return position, scores
+        if best[0] is None or scores['overall'] > best[1]['overall']:
+            best = (position, scores)
+
+    return best
+
+
+def match_registry(index, infos, threshold, first=False):
+    """Match infos against an indexed registry: exact lookup first, fuzzy engine on the misses.
+
+    Returns a list of ``(position, scores)`` like ``best_matches``.
+    """
+    results = [exact_match(index, info, threshold, first=first) for info in infos]
+    misses = [q for q, (position, _) in enumerate(results) if position is None]
+    if not misses:
+        return results
+
+    # Only score rows that can still clear the cert/name thresholds for some query
+    candidates = set()
+    for q in misses:
+        positions = candidate_positions(index, infos[q], threshold)
+        if positions is None:
+            candidates = None
+            break
+        candidates.update(positions)
+
+    if candidates is None:
+        positions, block = None, index['block']
+    else:
+        positions = sorted(candidates)
+        block = take_block(index['block'], positions)
+
+    matches = best_matches([infos[q] for q in misses], block, threshold, first=first)
+    for q, (position, scores) in zip(misses, matches):
+        if position is not None:
+            results[q] = (position if positions is None else positions[position], scores)
+
+    return results
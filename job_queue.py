@@ -0,0 +1,277 @@
+# job_queue.py
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import JOB_QUEUE
+from database import get_db_connection
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_last_recovery = 0.0
+
+
+def _owner():
+    """Who claimed a job: host, pid and a token telling apart processes that reuse a pid (pid 1 in containers)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{_process_token}"
+
+
+def _reset_after_fork():
+    """A forked child is a different claimant and has no worker threads"""
+    global _process_token, _workers, _workers_lock
+    _process_token = uuid.uuid4().hex[:8]
+    _workers = []
+    _workers_lock = threading.Lock()
+
+
+_process_token = uuid.uuid4().hex[:8]
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def init_job_table():
+    """Create the verification_jobs table in certificate_database.db"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Job queue database unavailable")
+    try:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS verification_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'queued',
+            priority INTEGER NOT NULL DEFAULT 0,
+            filename TEXT,
+            institution_code TEXT,
+            mode TEXT,
+            payload BLOB,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        );
+        """)
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_verification_jobs_queue
+        ON verification_jobs (status, priority DESC, created_at);
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def submit_job(data, filename=None, priority=0, institution_code=None, mode=None):
+    """Queue a certificate image for verification and return the job id"""
+    job_id = uuid.uuid4().hex
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Job queue database unavailable")
+    try:
+        conn.execute("""
+        INSERT INTO verification_jobs (id, priority, filename, institution_code, mode, payload, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?);
+        """, (job_id, priority, filename, institution_code, mode, data, time.time()))
+        conn.commit()
+    finally:
+        conn.close()
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id, with_result=False):
+    """Status of a job as a dict (without the image), None for an unknown id"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Job queue database unavailable")
+    try:
+        row = conn.execute("""
+        SELECT id, status, priority, filename, institution_code, mode, result, error, attempts,
+               created_at, started_at, finished_at
+        FROM verification_jobs WHERE id = ?
+        """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if job['status'] == 'queued':
+            # Jobs ahead of this one: higher priority, or same priority and submitted earlier
+            job['queue_position'] = conn.execute("""
+            SELECT COUNT(*) FROM verification_jobs
+            WHERE status = 'queued' AND (priority > ? OR (priority = ? AND created_at < ?))
+            """, (job['priority'], job['priority'], job['created_at'])).fetchone()[0]
+    finally:
+        conn.close()
+
+    result = job.pop('result')
+    if with_result:
+        job['result'] = json.loads(result) if result else None
+    return job
+
+
+def claim_next_job():
+    """Atomically move the highest priority queued job to running, returns the job row or None"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can't claim the same job
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("""
+        SELECT id, filename, institution_code, mode, payload, attempts FROM verification_jobs
+        WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1
+        """).fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+        conn.execute("""
+        UPDATE verification_jobs SET status = 'running', attempts = attempts + 1, claimed_by = ?, started_at = ?
+        WHERE id = ?
+        """, (_owner(), time.time(), row['id']))
+        conn.commit()
+        return dict(row)
+    finally:
+        conn.close()
+
+
+def finish_job(job_id, result=None, error=None):
+    """Store the outcome of a job; the image is dropped unless JOB_QUEUE['keep_payload'] is set"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Job queue database unavailable")
+    try:
+        conn.execute(f"""
+        UPDATE verification_jobs SET status = ?, result = ?, error = ?, finished_at = ?
+        {'' if JOB_QUEUE['keep_payload'] else ', payload = NULL'}
+        WHERE id = ?
+        """, ('failed' if error else 'done', json.dumps(result, default=str) if result is not None else None,
+              error, time.time(), job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _owner_alive(owner):
+    """Whether the process that claimed a job is still running (only checkable on this host)"""
+    host, pid, token = ((owner or '').split(':') + ['', '', ''])[:3]
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return token == _process_token
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_jobs():
+    """Requeue jobs left running by a process that died; give up after JOB_QUEUE['max_attempts']"""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("SELECT id, attempts, claimed_by FROM verification_jobs WHERE status = 'running'").fetchall()
+        recovered = 0
+        for row in rows:
+            if _owner_alive(row['claimed_by']):
+                continue
+            if row['attempts'] >= JOB_QUEUE['max_attempts']:
+                conn.execute("""
+                UPDATE verification_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?
+                """, (f"Gave up after {row['attempts']} interrupted attempts", time.time(), row['id']))
+            else:
+                conn.execute("""
+                UPDATE verification_jobs SET status = 'queued', claimed_by = NULL, started_at = NULL WHERE id = ?
+                """, (row['id'],))
+                recovered += 1
+        conn.commit()
+        return recovered
+    finally:
+        conn.close()
+
+
+def queue_stats():
+    """Number of jobs per status"""
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    try:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM verification_jobs GROUP BY status").fetchall())
+    except sqlite3.Error as e:
+        return {'error': str(e)}
+    finally:
+        conn.close()
+    return {'workers': len(_workers), **{status: counts.get(status, 0) for status in JOB_STATUSES}}
+
+
+def _recover_periodically():
+    """Pick up jobs of processes that died while this one keeps running"""
+    global _last_recovery
+    if time.monotonic() - _last_recovery < JOB_QUEUE['recover_interval']:
+        return
+    _last_recovery = time.monotonic()
+    try:
+        recover_jobs()
+    except Exception as e:
+        print(f"Job queue recovery error: {e}")
+
+
+def _work(handler):
+    while True:
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            print(f"Job queue error while claiming a job: {e}")
+            job = None
+
+        if job is None:
+            _recover_periodically()
+            # Submissions from this process wake the workers, other processes are picked up by polling
+            _wakeup.wait(JOB_QUEUE['poll_interval'])
+            _wakeup.clear()
+            continue
+
+        try:
+            result = handler(job)
+            error = None
+        except Exception as e:
+            print(f"Verification job {job['id']} failed: {e}")
+            result, error = None, str(e)
+
+        try:
+            finish_job(job['id'], result, error)
+        except Exception as e:
+            print(f"Could not store the outcome of job {job['id']}: {e}")
+
+
+def start_job_workers(handler, workers=None):
+    """Start the job worker threads, at most ``workers`` jobs of this process run at once.
+
+    ``handler(job)`` gets the claimed job (with its ``payload`` bytes) and
+    returns the JSON-serializable result. Jobs interrupted by a previous
+    shutdown are requeued first.
+    """
+    global _last_recovery
+    with _workers_lock:
+        if _workers:
+            return _workers
+        init_job_table()
+        recovered = recover_jobs()
+        _last_recovery = time.monotonic()
+        if recovered:
+            print(f"Requeued {recovered} interrupted verification jobs")
+        for i in range(workers or JOB_QUEUE['workers']):
+            worker = threading.Thread(target=_work, args=(handler,), daemon=True, name=f'verification-job-{i}')
+            worker.start()
+            _workers.append(worker)
+    return _workers
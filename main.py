@@ -1,9 +1,10 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from .database import init_database, get_institution_assets
-from .utils import get_institution_code_from_name
-from .forgery_detection import verify_seal, verify_signature, extract_roi
+from .database import init_database
+from .certificate_repository import find_certificate, init_registry
+from .utils import get_institution_code_from_name, decode_image_bytes
+from .forgery_detection import verify_seal, verify_signature, extract_roi, get_reference_assets, preload_reference_assets
+from .bounded_executor import ExecutorOverloaded, UploadTooLarge, get_api_executor, read_upload
 import cv2
-import os
 import uvicorn
 
 # Initialize the app
@@ -14,10 +15,9 @@ app = FastAPI(title="Academic Certificate Verifier")
 @app.on_event("startup")
 def on_startup():
     init_database()
+    init_registry()
     print("Database initialized successfully!")
-
-
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Points to /backend
+    preload_reference_assets()
 
 
 @app.post("/verify")
@@ -29,37 +29,44 @@ async def verify_certificate_endpoint(
 ):
     """API endpoint to verify a certificate"""
     try:
-        # Save uploaded file temporarily
-        file_path = f"temp_{file.filename}"
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-
-        # TODO: Integrate OCR service
-        ocr_data = {
-            'institution': institution or 'Jharkhand State University',
-        }
+        contents = await read_upload(file)
+        # Decoding and seal/signature matching block, run them off the event loop
+        return await get_api_executor().run(verify_certificate_bytes, contents, institution, seal_roi, signature_roi)
+
+    except ExecutorOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Verification error: {str(e)}")
 
-        img = cv2.imread(file_path)
 
-        if seal_roi:
-            seal_region = extract_roi(img, eval(seal_roi))
-        else:
-            seal_region = img
+def verify_certificate_bytes(contents, institution=None, seal_roi=None, signature_roi=None):
+    """Decode an uploaded certificate and check its seal and signature"""
+    # Decode the upload in memory, the ROIs below are views into this array
+    img = decode_image_bytes(contents)
+    if img is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
 
-        if signature_roi:
-            signature_region = extract_roi(img, eval(signature_roi))
-        else:
-            signature_region = img
+    # TODO: Integrate OCR service
+    ocr_data = {
+        'institution': institution or 'Jharkhand State University',
+    }
 
-        # Perform verification
-        result = verify_certificate(ocr_data, seal_region, signature_region)
+    if seal_roi:
+        seal_region = extract_roi(img, eval(seal_roi))
+    else:
+        seal_region = img
 
-        os.remove(file_path)
-        return result
+    if signature_roi:
+        signature_region = extract_roi(img, eval(signature_roi))
+    else:
+        signature_region = img
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Verification error: {str(e)}")
+    # Perform verification
+    return verify_certificate(ocr_data, seal_region, signature_region)
 
 
 def verify_certificate(ocr_data, extracted_seal_image, extracted_signature_image):
@@ -78,41 +85,12 @@ def verify_certificate(ocr_data, extracted_seal_image, extracted_signature_image
             }
         }
 
-    assets = get_institution_assets(institution_code)
-    if not assets:
-        return {
-            "authentic": False,
-            "error": f"Institution assets not found for: {institution_code}",
-            "details": {
-                "institution": institution_name,
-                "institution_code": institution_code,
-                "seal_score": 0.0,
-                "signature_score": 0.0
-            }
-        }
-
-    ref_seal_path = os.path.join(BASE_DIR, assets['seal_path'])
-    ref_signature_path = os.path.join(BASE_DIR, assets['signature_path'])
-
-    ref_seal = cv2.imread(ref_seal_path, 0)
-    ref_signature = cv2.imread(ref_signature_path, 0)
-
-    if ref_seal is None:
-        return {
-            "authentic": False,
-            "error": f"Reference seal not found at: {ref_seal_path}",
-            "details": {
-                "institution": institution_name,
-                "institution_code": institution_code,
-                "seal_score": 0.0,
-                "signature_score": 0.0
-            }
-        }
-
-    if ref_signature is None:
+    try:
+        references = get_reference_assets(institution_code)
+    except ValueError as e:
         return {
             "authentic": False,
-            "error": f"Reference signature not found at: {ref_signature_path}",
+            "error": str(e),
             "details": {
                 "institution": institution_name,
                 "institution_code": institution_code,
@@ -121,8 +99,8 @@ def verify_certificate(ocr_data, extracted_seal_image, extracted_signature_image
             }
         }
 
-    seal_score = verify_seal(extracted_seal_image, ref_seal)
-    signature_score = verify_signature(extracted_signature_image, ref_signature)
+    seal_score = verify_seal(extracted_seal_image, references['seal'], references['seal_features'])
+    signature_score = verify_signature(extracted_signature_image, references['signature'])
 
     seal_authentic = seal_score >= 0.3
     signature_authentic = signature_score >= 0.05
@@ -143,6 +121,15 @@ def verify_certificate(ocr_data, extracted_seal_image, extracted_signature_image
     }
 
 
+@app.get("/certificates/{cert_id}")
+def get_certificate(cert_id: str):
+    """Registry record for a certificate number"""
+    record = find_certificate(cert_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Certificate {cert_id} not found")
+    return record
+
+
 @app.get("/")
 async def root():
     return {"message": "Academic Certificate Verification API", "status": "active"}
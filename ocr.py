@@ -1,17 +1,17 @@
-import pandas as pd
 from PIL import Image
 import pytesseract
 import re
-from fuzzywuzzy import fuzz
+from ocr_backend import image_to_string
+from field_ocr import CODE_TO_INSTITUTION_NAME, detect_institution_code, extract_fields, parse_certificate_no_field
+from fuzzy_matching import build_registry_index, normalize_block, best_matches, match_registry
+from certificate_repository import init_registry, load_registry_frame
 
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
 
-db = pd.read_csv("C:\Juhi laptop backup\JUHI\CODING RELATED (Projects and Documents)\SIH\EduCred_verify\EduCred-Verify\datasets\ocr_dataset.csv")
-
-# Normalize text for fuzzy matching
-def normalize(text):
-    return re.sub(r'\s+', ' ', text).strip().upper()
+init_registry()
+db = load_registry_frame()
+db_index = build_registry_index(db)
 
 def clean_name(name):
     # Remove common trailing phrases that are not part of name
@@ -30,9 +30,37 @@ def extract_year(text, cert_no=None):
         return match.group(0)
     return None
 
+# Extract certificate info from the institution's field ROIs only
+def extract_certificate_info_from_fields(img, institution_code):
+    fields = extract_fields(img, institution_code)
+    if not fields:
+        return None
+
+    certificate_no = parse_certificate_no_field(fields.get("certificate_no", ""))
+    if certificate_no is None:
+        return None
+
+    info = {"institution": CODE_TO_INSTITUTION_NAME.get(institution_code, ""),
+            "certificate_no": certificate_no}
+    name = clean_name(re.sub(r'\s+', ' ', fields.get("name", "")))
+    if name:
+        info["name"] = name
+    year = extract_year(fields.get("year", ""))
+    if year:
+        info["year"] = year
+    return info
+
 # Extract certificate info including year
-def extract_certificate_info(img):
-    text = pytesseract.image_to_string(img)
+def extract_certificate_info(img, institution_code=None):
+    # Full-page OCR only when the institution's field layout is unknown
+    if institution_code is None:
+        institution_code = detect_institution_code(img)
+    if institution_code:
+        info = extract_certificate_info_from_fields(img, institution_code)
+        if info:
+            return info
+
+    text = image_to_string(img)
     info = {}
 
     # Certificate ID
@@ -87,29 +115,27 @@ def extract_certificate_info(img):
     return info
 
 # Fuzzy validation
-def validate_certificate_fuzzy(info, db, threshold=90):
-    for _, row in db.iterrows():
-        score_cert = fuzz.ratio(normalize(info.get("certificate_no","")), normalize(row["certificate_no"]))
-        score_name = fuzz.ratio(normalize(info.get("name","")), normalize(row["name"]))
-        score_inst = fuzz.ratio(normalize(info.get("institution","")), normalize(row["institution"]))
-        # score_course = fuzz.ratio(normalize(info.get("course","")), normalize(row["course"]))
-        score_year = (info.get("year","") == str(row["year"]))
-
-        if score_cert > threshold and score_name > threshold and score_inst > threshold  and score_year:
-            return True, row.to_dict()
-    return False, None
+def validate_certificate_fuzzy(info, db, threshold=90, index=None):
+    if index is not None and index['size'] == len(db):
+        position, _ = match_registry(index, [info], threshold, first=True)[0]
+    else:
+        position, _ = best_matches([info], normalize_block(db), threshold, first=True)[0]
 
-# Load image
-img = Image.open("/Users/jigyasaverma/Desktop/backend/Edu_cred_verify/EduCred-Verify/datasets/certificates/RTI_014.png")
-extracted_info = extract_certificate_info(img)
-print("Extracted:", extracted_info)
+    if position is not None:
+        return True, db.iloc[position].to_dict()
+    return False, None
 
-# Validate
-valid, record = validate_certificate_fuzzy(extracted_info, db)
+if __name__ == "__main__":
+    # Load image
+    img = Image.open("/Users/jigyasaverma/Desktop/backend/Edu_cred_verify/EduCred-Verify/datasets/certificates/RTI_014.png")
+    extracted_info = extract_certificate_info(img)
+    print("Extracted:", extracted_info)
 
-if valid:
-    print("✅ Certificate is VALID")
-    print("Matched Record:", record)
-else:
-    print("❌ Certificate is INVALID")
+    # Validate
+    valid, record = validate_certificate_fuzzy(extracted_info, db, index=db_index)
 
+    if valid:
+        print("✅ Certificate is VALID")
+        print("Matched Record:", record)
+    else:
+        print("❌ Certificate is INVALID")
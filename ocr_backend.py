@@ -0,0 +1,221 @@
+# ocr_backend.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from config import OCR_BACKEND
+from verification_pipeline import time_left
+
+try:
+    import tesserocr
+except ImportError:
+    # tesserocr is optional, without it every call goes through the pytesseract CLI backend
+    tesserocr = None
+
+# Tesseract's default page segmentation mode (fully automatic), same as the CLI
+DEFAULT_PSM = 3
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """OCR worker threads don't survive fork(), a child process starts its own"""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _to_pil(img):
+    if isinstance(img, np.ndarray):
+        return Image.fromarray(img)
+    return img
+
+
+def pytesseract_image_to_string(img, psm=None, whitelist=None, timeout=0):
+    """OCR through the tesseract CLI, one process per call"""
+    options = []
+    if psm is not None:
+        options.append(f"--psm {psm}")
+    if whitelist:
+        options.append(f"-c tessedit_char_whitelist={whitelist}")
+    return pytesseract.image_to_string(img, config=" ".join(options), timeout=timeout)
+
+
+class OCRWorker(threading.Thread):
+    """Thread owning one Tesseract engine, the language model is loaded once at start"""
+
+    def __init__(self, jobs, lang):
+        super().__init__(daemon=True)
+        self.jobs = jobs
+        self.lang = lang
+        self.busy_since = None
+        self.heartbeat = time.monotonic()
+        self.retired = False
+        self.ready = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+
+        with api:
+            while not self.retired:
+                self.heartbeat = time.monotonic()
+                try:
+                    img, psm, whitelist, future = self.jobs.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                self.busy_since = time.monotonic()
+                try:
+                    api.SetPageSegMode(DEFAULT_PSM if psm is None else psm)
+                    api.SetVariable("tessedit_char_whitelist", whitelist or "")
+                    api.SetImage(_to_pil(img))
+                    future.set_result(api.GetUTF8Text())
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    api.Clear()
+                    self.busy_since = None
+
+
+class OCRWorkerPool:
+    """Pool of long-lived OCR workers fed through an in-memory queue"""
+
+    def __init__(self, size, lang="eng", request_timeout=60, health_check_interval=30):
+        self.size = size
+        self.lang = lang
+        self.request_timeout = request_timeout
+        self.health_check_interval = health_check_interval
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.restarts = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for _ in range(self.size):
+            self.workers.append(self._spawn())
+        monitor = threading.Thread(target=self._monitor, daemon=True)
+        monitor.start()
+        return self
+
+    def _spawn(self):
+        worker = OCRWorker(self.jobs, self.lang)
+        worker.start()
+        worker.ready.wait()
+        if worker.error is not None:
+            raise RuntimeError(f"OCR worker failed to load language '{self.lang}': {worker.error}")
+        return worker
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.health_check_interval)
+            try:
+                self.health_check()
+            except Exception as e:
+                print(f"OCR pool health check error: {e}")
+
+    def health_check(self):
+        """Replace dead workers and workers stuck on one image for longer than request_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            for i, worker in enumerate(self.workers):
+                stuck = worker.busy_since is not None and now - worker.busy_since > self.request_timeout
+                # An idle worker refreshes its heartbeat every second
+                silent = worker.busy_since is None and now - worker.heartbeat > self.health_check_interval
+                if worker.is_alive() and not stuck and not silent:
+                    continue
+                print(f"Replacing OCR worker {i} (alive={worker.is_alive()}, stuck={stuck}, silent={silent})")
+                worker.retired = True
+                self.workers[i] = self._spawn()
+                self.restarts += 1
+
+    def submit(self, img, psm=None, whitelist=None):
+        future = Future()
+        self.jobs.put((img, psm, whitelist, future))
+        return future
+
+    def image_to_string(self, img, psm=None, whitelist=None, timeout=None):
+        future = self.submit(img, psm, whitelist)
+        try:
+            return future.result(timeout=timeout or self.request_timeout)
+        except TimeoutError:
+            # Don't leave a job nobody waits for in the queue, a fallback submitted next would wait behind it
+            future.cancel()
+            raise
+
+    def health(self):
+        return {
+            'backend': 'pool',
+            'pool_size': self.size,
+            'alive_workers': sum(worker.is_alive() for worker in self.workers),
+            'busy_workers': sum(worker.busy_since is not None for worker in self.workers),
+            'queued_jobs': self.jobs.qsize(),
+            'restarts': self.restarts
+        }
+
+
+def get_pool():
+    """The process-wide OCR pool, started on first use; None when the pytesseract backend is used"""
+    global _pool
+    if OCR_BACKEND['backend'] != 'pool' or tesserocr is None:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    _pool = OCRWorkerPool(OCR_BACKEND['pool_size'], OCR_BACKEND['lang'],
+                                          OCR_BACKEND['request_timeout'],
+                                          OCR_BACKEND['health_check_interval']).start()
+                except Exception as e:
+                    print(f"OCR pool unavailable, falling back to pytesseract: {e}")
+                    OCR_BACKEND['backend'] = 'pytesseract'
+                    return None
+    return _pool
+
+
+def image_to_string(img, psm=None, whitelist=None, timeout=None):
+    """OCR an image with the configured backend.
+
+    ``timeout`` defaults to the time left before the calling pipeline stage's
+    deadline; TimeoutError when it runs out. The pytesseract backend kills
+    tesseract; a pool job still queued is dropped, one a worker already
+    started finishes in the background.
+    """
+    if timeout is None:
+        timeout = time_left()
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError("OCR deadline exceeded")
+    pool = get_pool()
+    if pool is not None:
+        return pool.image_to_string(img, psm, whitelist, timeout)
+    try:
+        return pytesseract_image_to_string(img, psm, whitelist, timeout or 0)
+    except RuntimeError as e:
+        if 'timeout' in str(e).lower():
+            raise TimeoutError(f"OCR exceeded {timeout:.1f}s") from e
+        raise
+
+
+def ocr_health():
+    pool = get_pool()
+    if pool is not None:
+        return pool.health()
+    return {'backend': 'pytesseract'}
@@ -0,0 +1,147 @@
+# perceptual_hash.py
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from config import PERCEPTUAL_HASH
+
+
+def dhash(image, hash_size=16):
+    """Difference hash of an image as an int of hash_size * hash_size bits.
+
+    Survives re-encoding, rescaling and mild rescanning noise, unlike a hash
+    of the file bytes.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance as the metric"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        node = [value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        """Items within max_distance of value as a list of (distance, item)"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, item))
+            # Triangle inequality: only subtrees at distance d +- max_distance can hold matches
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class NearDuplicateIndex:
+    """Recently verified images, searchable by perceptual-hash distance.
+
+    BK-trees can't delete, so evicted or expired entries are only dropped from
+    ``entries`` and the tree is rebuilt once they make up half of it.
+    """
+
+    def __init__(self, max_entries=5000, ttl=86400, max_distance=8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        self.tree = BKTree()
+        self.stats = {'lookups': 0, 'near_duplicates': 0, 'same_number': 0, 'mismatches': 0}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _rebuild(self):
+        self.tree = BKTree()
+        for entry_id, entry in self.entries.items():
+            self.tree.add(entry['hash'], entry_id)
+
+    def add(self, image_hash, record):
+        with self._lock:
+            entry_id = next(self._ids)
+            self.entries[entry_id] = dict(record, hash=image_hash, added_at=time.time())
+            self.tree.add(image_hash, entry_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if self.tree.size > 2 * len(self.entries):
+                self._rebuild()
+
+    def nearest(self, image_hash, max_distance=None):
+        """Closest live entry within max_distance as ``(distance, record)``, None if there is none"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        now = time.time()
+        with self._lock:
+            self.stats['lookups'] += 1
+            best = None
+            for distance, entry_id in self.tree.search(image_hash, max_distance):
+                entry = self.entries.get(entry_id)
+                if entry is None or now - entry['added_at'] > self.ttl:
+                    continue
+                if best is None or distance < best[0]:
+                    best = (distance, entry)
+            if best is not None:
+                self.stats['near_duplicates'] += 1
+            return best
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def health(self):
+        with self._lock:
+            return {'entries': len(self.entries), 'max_entries': self.max_entries,
+                    'max_distance': self.max_distance, **self.stats}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index():
+    """The process-wide near-duplicate index, None when PERCEPTUAL_HASH is disabled"""
+    global _index
+    if not PERCEPTUAL_HASH['enabled']:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex(PERCEPTUAL_HASH['max_entries'], PERCEPTUAL_HASH['ttl'],
+                                            PERCEPTUAL_HASH['max_distance'])
+    return _index
+
+
+def duplicate_index_health():
+    index = get_duplicate_index()
+    if index is None:
+        return {'enabled': False}
+    return {'enabled': True, **index.health()}
@@ -1,7 +1,7 @@
 from flask import Flask, request, jsonify
-import pandas as pd
+from certificate_repository import find_certificate, init_registry
 
-df = pd.read_csv("/Users/jigyasaverma/Desktop/backend/Edu_cred_verify/EduCred-Verify/datasets/ocr_dataset.csv")
+init_registry()
 
 app = Flask(__name__)
 
@@ -11,10 +11,10 @@ def verify_certificate():
 
     if not cert_id:
         return jsonify({"error": "cert_id is required"}), 400
-    record = df[df["cert_id"] == cert_id]
+    record = find_certificate(cert_id)
 
-    if not record.empty:
-        return jsonify({"status": "valid", "data": record.to_dict(orient="records")[0]})
+    if record:
+        return jsonify({"status": "valid", "data": record})
     else:
         return jsonify({"status": "invalid", "message": "Certificate not found"})
 
@@ -0,0 +1,103 @@
+# qr_engine.py
+import threading
+
+import cv2
+import numpy as np
+
+from config import INSTITUTION_CONFIG, QR_ENGINE
+from forgery_detection import extract_roi
+
+_local = threading.local()
+
+
+def get_detector():
+    """This thread's QRCodeDetector, OpenCV detectors can't be shared between threads"""
+    detector = getattr(_local, 'detector', None)
+    if detector is None:
+        detector = _local.detector = cv2.QRCodeDetector()
+    return detector
+
+
+def get_locator():
+    """This thread's detector for finding codes on the downscaled copy.
+
+    The ArUco-based detector (OpenCV 4.8+) is faster there and finds codes
+    the classic detectMulti misses; older builds use the classic one.
+    """
+    locator = getattr(_local, 'locator', None)
+    if locator is None:
+        locator = _local.locator = (cv2.QRCodeDetectorAruco() if hasattr(cv2, 'QRCodeDetectorAruco')
+                                    else get_detector())
+    return locator
+
+
+def _gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def _decode_full(gray):
+    ok, payloads, points, _ = get_detector().detectAndDecodeMulti(gray)
+    if not ok:
+        return []
+    return [{'data': data, 'points': quad.tolist()} for data, quad in zip(payloads, points) if data]
+
+
+def decode_qr_codes(image):
+    """Every QR payload in a BGR or grayscale image, as ``[{'data', 'points'}]`` in image coordinates.
+
+    Codes are located on a downscaled copy and each is decoded from a
+    full-resolution crop, so large scans don't pay for detection at full size.
+    """
+    gray = _gray(image)
+    height, width = gray.shape[:2]
+    scale = QR_ENGINE['detect_max_side'] / max(height, width)
+    if scale >= 1:
+        return _decode_full(gray)
+
+    small = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    found, quads = get_locator().detectMulti(small)
+    if not found:
+        # detectMulti can miss a lone code that detect finds
+        found, quad = get_locator().detect(small)
+        quads = [quad.reshape(4, 2)] if found and quad is not None else []
+    codes = []
+    for quad in (quads if found else []):
+        quad = quad / scale
+        x0, y0 = quad.min(axis=0)
+        x1, y1 = quad.max(axis=0)
+        margin = max(x1 - x0, y1 - y0) * QR_ENGINE['crop_margin']
+        left, top = max(int(x0 - margin), 0), max(int(y0 - margin), 0)
+        crop = gray[top:min(int(y1 + margin) + 1, height), left:min(int(x1 + margin) + 1, width)]
+        data, _, _ = get_detector().detectAndDecode(crop)
+        if data:
+            codes.append({'data': data, 'points': quad.tolist()})
+
+    if not codes and QR_ENGINE['full_resolution_fallback']:
+        # Codes too small to be found once downscaled
+        codes = _decode_full(gray)
+    return codes
+
+
+def qr_rois(institution_code=None):
+    """Distinct configured ``qr.roi`` ratios, of one institution or of all of them"""
+    codes = [institution_code] if institution_code else list(INSTITUTION_CONFIG)
+    rois = [tuple(INSTITUTION_CONFIG.get(code, {}).get('qr', {}).get('roi') or ()) for code in codes]
+    return [roi for roi in dict.fromkeys(rois) if roi]
+
+
+def decode_qr_regions(image, institution_code=None):
+    """Every QR payload in the image, without duplicates.
+
+    The whole image is always decoded; a configured ``qr.roi`` is decoded
+    on its own as well when no code was found inside it, for codes too
+    small to be located on the whole page.
+    """
+    found = decode_qr_codes(image)
+    height, width = image.shape[:2]
+    centers = [np.mean(code['points'], axis=0) for code in found]
+    for roi in qr_rois(institution_code):
+        x0, y0, x1, y1 = roi[0] * width, roi[1] * height, roi[2] * width, roi[3] * height
+        if any(x0 <= x <= x1 and y0 <= y <= y1 for x, y in centers):
+            continue
+        found.extend(decode_qr_codes(extract_roi(image, roi)))
+    return list(dict.fromkeys(code['data'] for code in found))
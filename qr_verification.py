@@ -1,7 +1,8 @@
 # backend/app/qr_verification.py
-import cv2
 import numpy as np
-from .database import get_db_connection
+from .certificate_repository import check_certificate_hash
+from .signed_qr import is_signed_payload, verify_signed_payload
+from .qr_engine import decode_qr_codes
 
 
 def extract_qr_region(image, qr_roi):
@@ -15,21 +16,10 @@ def extract_qr_region(image, qr_roi):
 
 
 def read_qr_code_opencv(qr_region):
-    """Read QR code using OpenCV's built-in QR code detector"""
-    # Convert to grayscale for better detection
-    if len(qr_region.shape) == 3:
-        gray = cv2.cvtColor(qr_region, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = qr_region
-
-    # Initialize QR code detector
-    qr_detector = cv2.QRCodeDetector()
-
-    # Detect and decode QR code
-    data, points, _ = qr_detector.detectAndDecode(gray)
-
-    if points is not None and data:
-        return data
+    """Read the first QR code in a region with OpenCV's detector"""
+    codes = decode_qr_codes(qr_region)
+    if codes:
+        return codes[0]['data']
     return None
 
 
@@ -73,18 +63,8 @@ def parse_qr_data(qr_data):
 
 def verify_qr_authenticity(cert_id, digital_hash):
     """Verify if certificate ID and hash match database records"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT * FROM certificates 
-        WHERE cert_id = ? AND digital_hash = ?
-    """, (cert_id, digital_hash))
-
-    result = cursor.fetchone()
-    conn.close()
-
-    return result is not None
+    record, _ = check_certificate_hash(cert_id, digital_hash)
+    return record is not None
 
 
 def verify_certificate_qr(certificate_image, institution_code):
@@ -106,6 +86,19 @@ def verify_certificate_qr(certificate_image, institution_code):
     # DEBUG: Print what was read from QR
     print(f"DEBUG: Raw QR data: '{qr_data}'")
 
+    # Signed payloads are verified offline against the institution's key
+    if is_signed_payload(qr_data):
+        result = verify_signed_payload(qr_data)
+        return {
+            "authentic": result['status'] == 'VERIFIED',
+            "cert_id": result.get('cert_id'),
+            "status": result['status'],
+            "record": result.get('record'),
+            "qr_data": qr_data,
+            "message": "Signed QR verification successful" if result['status'] == 'VERIFIED'
+            else result.get('reason', f"Signed QR verification failed - {result['status'].lower()}")
+        }
+
     # Parse QR data
     cert_id, digital_hash = parse_qr_data(qr_data)
 
@@ -0,0 +1,148 @@
+# registry_import.py
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+from certificate_repository import (UPSERT_SQL, certificate_row, create_registry_indexes, drop_registry_indexes,
+                                    init_registry)
+from config import REGISTRY_IMPORT
+from database import get_db_connection
+
+
+def detect_format(filename):
+    return 'jsonl' if os.path.splitext(filename or '')[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def iter_records(stream, fmt):
+    """Yield ``(line_no, record or None, error)`` from a text stream, one row at a time"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def text_stream(binary):
+    """Decode an uploaded or opened binary file lazily (UTF-8, BOM tolerated)"""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def import_records(records, chunk_size=None, defer_indexes=True, rejects_file=None, progress=None):
+    """Upsert ``(line_no, record, error)`` rows into the certificates table in batched transactions.
+
+    Rows are consumed as they come and at most ``chunk_size`` of them are held
+    at once. With ``defer_indexes`` the lookup indexes are dropped for the load
+    and rebuilt once at the end (the UNIQUE index on cert_id stays, the upsert
+    needs it). Rejected rows go to ``rejects_file`` as JSON lines; the report
+    keeps the first REGISTRY_IMPORT['max_reported_rejects'] of them.
+    """
+    chunk_size = chunk_size or REGISTRY_IMPORT['chunk_size']
+    init_registry()
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Certificate registry database unavailable")
+
+    report = {'rows_read': 0, 'imported': 0, 'rejected': 0, 'rejects': [], 'chunks': 0}
+    started = time.monotonic()
+
+    def reject(line_no, reason):
+        report['rejected'] += 1
+        if len(report['rejects']) < REGISTRY_IMPORT['max_reported_rejects']:
+            report['rejects'].append({'line': line_no, 'reason': reason})
+        if rejects_file is not None:
+            rejects_file.write(json.dumps({'line': line_no, 'reason': reason}) + "\n")
+
+    def flush(chunk):
+        with conn:
+            conn.executemany(UPSERT_SQL, chunk)
+        report['imported'] += len(chunk)
+        report['chunks'] += 1
+        if progress:
+            progress(report, time.monotonic() - started)
+
+    try:
+        if defer_indexes:
+            with conn:
+                drop_registry_indexes(conn)
+
+        chunk = []
+        for line_no, record, error in records:
+            report['rows_read'] += 1
+            if error:
+                reject(line_no, error)
+                continue
+            try:
+                chunk.append(certificate_row(record))
+            except ValueError as e:
+                reject(line_no, str(e))
+                continue
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+    finally:
+        if defer_indexes:
+            index_started = time.monotonic()
+            with conn:
+                create_registry_indexes(conn)
+            report['index_build_seconds'] = round(time.monotonic() - index_started, 3)
+        conn.close()
+
+    elapsed = time.monotonic() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows_read'] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+
+def import_file(path, fmt=None, **kwargs):
+    """Import a CSV or JSONL file into the registry, see import_records"""
+    with open(path, 'rb') as binary:
+        return import_records(iter_records(text_stream(binary), fmt or detect_format(path)), **kwargs)
+
+
+def print_progress(report, elapsed):
+    print(f"{report['imported']} imported, {report['rejected']} rejected, "
+          f"{report['rows_read'] / elapsed if elapsed else 0:.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import certificate records into the registry")
+    parser.add_argument('path', help="CSV or JSONL file with certificate_no (or cert_id), name, institution, "
+                                     "course, year, digital_hash")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="default: from the file extension")
+    parser.add_argument('--chunk-size', type=int, default=REGISTRY_IMPORT['chunk_size'])
+    parser.add_argument('--keep-indexes', action='store_true',
+                        help="keep lookup indexes during the load (for small imports into a live registry)")
+    parser.add_argument('--rejects-file', help="write every rejected row to this JSONL file")
+    args = parser.parse_args()
+
+    rejects_file = open(args.rejects_file, 'w') if args.rejects_file else None
+    try:
+        report = import_file(args.path, args.format, chunk_size=args.chunk_size,
+                             defer_indexes=not args.keep_indexes, rejects_file=rejects_file,
+                             progress=print_progress)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# registry_snapshot.py
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+
+from bloom_filter import BloomFilter
+from certificate_repository import (REGISTRY_COLUMNS, cert_id_key, check_certificate_hash, fetch_registry_changes,
+                                    find_certificates, recent_cert_ids, records_frame)
+from config import REGISTRY
+from fuzzy_matching import build_registry_index, update_registry_index
+
+_snapshot = None
+_refresh_lock = threading.Lock()
+_watcher = None
+_checked_at = None  # time.monotonic() when _snapshot was last loaded or brought up to date
+_stats = {'refreshes': 0, 'rows_applied': 0, 'last_refresh_at': None, 'last_error': None, 'filtered_lookups': 0}
+
+
+def _reset_after_fork():
+    """The watcher thread doesn't survive fork(), a child catches up on use instead (see get_registry)"""
+    global _refresh_lock, _watcher
+    _refresh_lock = threading.Lock()
+    _watcher = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def build_id_filter(cert_ids):
+    """Bloom filter of certificate numbers, None when REGISTRY['id_filter'] is off"""
+    if not REGISTRY['id_filter']:
+        return None
+    cert_ids = [cert_id_key(cert_id) for cert_id in cert_ids if cert_id is not None]
+    id_filter = BloomFilter(max(len(cert_ids) * REGISTRY['id_filter_headroom'], 1024),
+                            REGISTRY['id_filter_error_rate'])
+    id_filter.update(cert_ids)
+    return id_filter
+
+
+def row_digest(row_id, updated_at):
+    """64-bit digest of one row version; a registry's version is the XOR of the digests of its rows"""
+    return int.from_bytes(hashlib.sha256(f"{row_id}@{updated_at!r}".encode()).digest()[:8], 'big')
+
+
+def build_snapshot(rows):
+    """Registry snapshot from every row of the certificates table.
+
+    A snapshot is never modified once built: ``db`` (records DataFrame) and
+    ``index`` (fuzzy matching index) always describe the same rows.
+    """
+    db = records_frame(rows)
+    index = build_registry_index(db)
+    digest = 0
+    for row in rows:
+        digest ^= row_digest(row['id'], row['updated_at'])
+    index['version'] = f"{digest:016x}"
+    return {
+        'db': db,
+        'index': index,
+        'version': index['version'],
+        'digest': digest,
+        'id_filter': build_id_filter(db['certificate_no']),
+        # row id -> (position in db, updated_at of the loaded row)
+        'rows': {row['id']: (position, row['updated_at']) for position, row in enumerate(rows)},
+        'watermark': max((row['updated_at'] for row in rows if row['updated_at'] is not None), default=None),
+        'loaded_at': time.time()
+    }
+
+
+def changed_rows(snapshot, rows):
+    """Split fetched rows into ``({position: row}, [new rows])``, skipping rows the snapshot already has"""
+    updates, appended = {}, []
+    for row in rows:
+        loaded = snapshot['rows'].get(row['id'])
+        if loaded is None:
+            appended.append(row)
+        elif loaded[1] != row['updated_at']:
+            updates[loaded[0]] = row
+    return updates, appended
+
+
+def apply_changes(snapshot, updates, appended):
+    """New snapshot with changed rows replaced and new rows appended"""
+
+    appended_db = records_frame(appended)
+    db = pd.concat([snapshot['db'], appended_db], ignore_index=True) if appended else snapshot['db'].copy()
+    for position, row in updates.items():
+        db.iloc[position] = [row[column] for column in REGISTRY_COLUMNS]
+
+    # The version only depends on which row versions the snapshot holds, not on how polls batched them, so
+    # processes that refreshed at different times (or rebuilt from the table) agree on it
+    rows = list(updates.values()) + appended
+    digest = snapshot['digest']
+    for row in updates.values():
+        digest ^= row_digest(row['id'], snapshot['rows'][row['id']][1])
+    for row in rows:
+        digest ^= row_digest(row['id'], row['updated_at'])
+    version = f"{digest:016x}"
+    index = update_registry_index(snapshot['index'], updates, appended_db)
+    index['version'] = version
+
+    # Bloom filters only grow: add the new IDs to the shared filter (older snapshots merely get more
+    # false positives), or build a bigger one once it's full
+    id_filter = snapshot['id_filter']
+    if id_filter is not None and id_filter.count + len(rows) <= id_filter.capacity:
+        id_filter.update(cert_id_key(row['certificate_no']) for row in rows if row['certificate_no'] is not None)
+    elif id_filter is not None:
+        id_filter = build_id_filter(db['certificate_no'])
+
+    size = len(snapshot['db'])
+    loaded_rows = dict(snapshot['rows'])
+    for position, row in updates.items():
+        loaded_rows[row['id']] = (position, row['updated_at'])
+    for offset, row in enumerate(appended):
+        loaded_rows[row['id']] = (size + offset, row['updated_at'])
+
+    return {
+        'db': db,
+        'index': index,
+        'version': version,
+        'digest': digest,
+        'id_filter': id_filter,
+        'rows': loaded_rows,
+        'watermark': max([snapshot['watermark'] or float('-inf')] + [row['updated_at'] for row in rows]),
+        'loaded_at': time.time()
+    }
+
+
+def snapshot_age():
+    """Seconds since the snapshot was last loaded or brought up to date"""
+    return time.monotonic() - _checked_at if _checked_at is not None else 0.0
+
+
+def _load():
+    global _snapshot, _checked_at
+    _snapshot = build_snapshot(fetch_registry_changes())
+    _checked_at = time.monotonic()
+
+
+def get_registry():
+    """The current registry snapshot, loaded on first use.
+
+    Take it once per request and use its ``db`` and ``index`` together; a
+    refresh swaps in a new snapshot without touching the one in use.
+    Processes without a watcher (batch pool workers forked from the server)
+    refresh a snapshot older than REGISTRY['poll_interval'] here.
+    """
+    if _snapshot is None:
+        with _refresh_lock:
+            if _snapshot is None:
+                _load()
+    elif _watcher is None and snapshot_age() > REGISTRY['poll_interval'] > 0:
+        try:
+            refresh_registry(wait=False)
+        except Exception as e:
+            _stats['last_error'] = str(e)
+            print(f"Registry refresh error: {e}")
+    return _snapshot
+
+
+def reload_registry():
+    """Rebuild the snapshot from the whole table"""
+    with _refresh_lock:
+        _load()
+    return _snapshot
+
+
+def refresh_registry(wait=True):
+    """Apply rows written since the watermark to a new snapshot and swap it in, returns how many rows changed.
+
+    With ``wait=False`` returns 0 at once when another thread is already refreshing.
+    """
+    global _snapshot, _checked_at
+    if not _refresh_lock.acquire(blocking=wait):
+        return 0
+    try:
+        if _snapshot is None:
+            _load()
+            return 0
+        snapshot = _snapshot
+        since = snapshot['watermark'] - REGISTRY['watermark_lag'] if snapshot['watermark'] is not None else None
+        updates, appended = changed_rows(snapshot, fetch_registry_changes(since))
+        applied = len(updates) + len(appended)
+        if applied:
+            _snapshot = apply_changes(snapshot, updates, appended)
+        _checked_at = time.monotonic()
+        _stats['refreshes'] += 1
+        _stats['rows_applied'] += applied
+        _stats['last_refresh_at'] = time.time()
+        return applied
+    finally:
+        _refresh_lock.release()
+
+
+def id_filter_usable(snapshot):
+    """The snapshot's Bloom filter, or None when it may be missing recent IDs.
+
+    A snapshot that missed a poll (refreshes failing, or no process
+    refreshing it) would answer new IDs as unknown, so lookups go to SQLite.
+    """
+    if snapshot['id_filter'] is None or snapshot['watermark'] is None:
+        return None
+    if snapshot_age() > 2 * REGISTRY['poll_interval'] > 0:
+        return None
+    return snapshot['id_filter']
+
+
+def written_since(snapshot):
+    """Keys of certificates written since the snapshot's watermark, which its Bloom filter may not have yet"""
+    return recent_cert_ids(snapshot['watermark'] - REGISTRY['watermark_lag'])
+
+
+def check_certificate_hash_filtered(cert_id, digital_hash):
+    """check_certificate_hash behind the snapshot's Bloom filter: IDs it has never seen, and that weren't
+    written since the snapshot was loaded, are answered ``(None, False)`` without a point query"""
+    snapshot = get_registry()
+    id_filter = id_filter_usable(snapshot)
+    if id_filter is not None and cert_id and cert_id_key(cert_id) not in id_filter:
+        # Another process may have inserted it after this snapshot, only the rows since its watermark are read
+        if cert_id_key(cert_id) not in written_since(snapshot):
+            _stats['filtered_lookups'] += 1
+            return None, False
+    return check_certificate_hash(cert_id, digital_hash)
+
+
+def find_certificates_filtered(cert_ids, chunk_size=500):
+    """find_certificates for the IDs the snapshot's Bloom filter may know or that were written since the
+    snapshot was loaded, the rest are never queried"""
+    snapshot = get_registry()
+    id_filter = id_filter_usable(snapshot)
+    if id_filter is not None:
+        cert_ids = [cert_id for cert_id in cert_ids if cert_id]
+        known = [cert_id for cert_id in cert_ids if cert_id_key(cert_id) in id_filter]
+        if len(known) < len(cert_ids):
+            recent = written_since(snapshot)
+            known = [cert_id for cert_id in cert_ids
+                     if cert_id_key(cert_id) in id_filter or cert_id_key(cert_id) in recent]
+        _stats['filtered_lookups'] += len(cert_ids) - len(known)
+        cert_ids = known
+    return find_certificates(cert_ids, chunk_size)
+
+
+def _watch():
+    while True:
+        time.sleep(REGISTRY['poll_interval'])
+        try:
+            applied = refresh_registry()
+            _stats['last_error'] = None
+            if applied:
+                print(f"Registry refreshed: {applied} new or changed certificates, version {_snapshot['version']}")
+        except Exception as e:
+            _stats['last_error'] = str(e)
+            print(f"Registry refresh error: {e}")
+
+
+def start_registry_watcher():
+    """Poll the certificates table for new or changed rows every REGISTRY['poll_interval'] seconds"""
+    global _watcher
+    if _watcher is None and REGISTRY['poll_interval'] > 0:
+        _watcher = threading.Thread(target=_watch, daemon=True, name='registry-watcher')
+        _watcher.start()
+    return _watcher
+
+
+def registry_info():
+    snapshot = get_registry()
+    return {
+        'version': snapshot['version'],
+        'size': len(snapshot['db']),
+        'watermark': snapshot['watermark'],
+        'loaded_at': snapshot['loaded_at'],
+        'age': round(snapshot_age(), 3),
+        'watcher': _watcher is not None and _watcher.is_alive(),
+        'poll_interval': REGISTRY['poll_interval'],
+        'id_filter': snapshot['id_filter'].info() if snapshot['id_filter'] is not None else None,
+        **_stats
+    }
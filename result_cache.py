@@ -0,0 +1,192 @@
+# result_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from config import RESULT_CACHE
+from database import get_db_connection
+from forgery_detection import reference_fingerprint
+
+
+def config_version():
+    """Hash of every setting that changes a verification result (thresholds, ROIs, matchers, pipeline,
+    reference seal/signature files)"""
+    settings = {
+        'institutions': config.INSTITUTION_CONFIG,
+        'seal_matcher': config.SEAL_MATCHER,
+        'signature_matcher': config.SIGNATURE_MATCHER,
+        'pipeline': config.PIPELINE,
+        'mode': config.VERIFICATION_MODE,
+        'reference_assets': reference_fingerprint(),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def content_key(data, *parts):
+    """Cache key of an upload: SHA-256 of its bytes plus request options like institution code and mode"""
+    digest = hashlib.sha256(data).hexdigest()
+    return ":".join([digest] + ["" if part is None else str(part) for part in parts])
+
+
+def to_json(result):
+    # NumPy scalars left in a response are stored as plain numbers/bools
+    return json.dumps(result, default=lambda value: value.item() if hasattr(value, 'item') else str(value))
+
+
+class ResultCache:
+    """Two-tier cache of verification responses: an in-process LRU and an optional shared SQLite file.
+
+    Entries are stored per ``version`` (registry + config) and only served
+    for it. When the version moves on the memory tier is emptied; the disk
+    tier, shared with processes that may not have moved on yet, only loses
+    expired entries, the others age out.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.version = None
+        self.entries = OrderedDict()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+        self._lock = threading.Lock()
+        if disk_path:
+            self._init_disk()
+
+    def _init_disk(self):
+        self._disk_execute("""
+        CREATE TABLE IF NOT EXISTS verification_cache (
+            key TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            result TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        """, ())
+        self._disk_execute("CREATE INDEX IF NOT EXISTS idx_verification_cache_created ON verification_cache (created_at)", ())
+
+    def _check_version(self, version):
+        """Forget this process's entries of an older registry/config version"""
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            stale = self.version is not None
+            self.version = version
+            self.entries.clear()
+        if stale and self.disk_path:
+            self._disk_execute("DELETE FROM verification_cache WHERE created_at < ?", (time.time() - self.ttl,))
+
+    def _disk_execute(self, sql, params):
+        conn = get_db_connection(self.disk_path)
+        if conn is None:
+            return []
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            # The disk tier is best effort, a locked or broken cache file only costs hits
+            print(f"Result cache disk tier error: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def get(self, key, version):
+        """Cached response for a key, None on a miss"""
+        self._check_version(version)
+        now = time.time()
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if now - created_at <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return json.loads(result)
+                del self.entries[key]
+                self.stats['expired'] += 1
+
+        if self.disk_path:
+            rows = self._disk_execute("""
+            SELECT result, created_at FROM verification_cache WHERE key = ? AND version = ? AND created_at >= ?
+            """, (key, version, now - self.ttl))
+            if rows:
+                result, created_at = rows[0]
+                self._remember(key, result, created_at)
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                return json.loads(result)
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def _remember(self, key, result, created_at):
+        with self._lock:
+            self.entries[key] = (created_at, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def put(self, key, version, result):
+        self._check_version(version)
+        now = time.time()
+        result = to_json(result)
+        self._remember(key, result, now)
+        with self._lock:
+            self.stats['stores'] += 1
+        if self.disk_path:
+            self._disk_execute("""
+            INSERT OR REPLACE INTO verification_cache (key, version, result, created_at) VALUES (?, ?, ?, ?)
+            """, (key, version, result, now))
+            self._disk_execute("DELETE FROM verification_cache WHERE created_at < ?", (now - self.ttl,))
+
+    def invalidate(self):
+        """Drop every cached response from both tiers"""
+        with self._lock:
+            self.entries.clear()
+        if self.disk_path:
+            self._disk_execute("DELETE FROM verification_cache", ())
+
+    def health(self):
+        with self._lock:
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+            hits = lookups - self.stats['misses']
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk_tier': bool(self.disk_path),
+                'version': self.version,
+                'hit_rate': round(hits / lookups, 3) if lookups else None,
+                **self.stats
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """The process-wide result cache, None when RESULT_CACHE is disabled"""
+    global _cache
+    if not RESULT_CACHE['enabled']:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(RESULT_CACHE['max_entries'], RESULT_CACHE['ttl'], RESULT_CACHE['disk_path'])
+    return _cache
+
+
+def cache_health():
+    cache = get_result_cache()
+    if cache is None:
+        return {'enabled': False}
+    return {'enabled': True, **cache.health()}
@@ -0,0 +1,161 @@
+# signed_qr.py
+"""Signed QR payloads: certificate fields plus an issuer signature, verified without the registry.
+
+Format: ``ACV1.<payload>.<signature>``, both parts base64url without padding.
+The payload is compact JSON with ``iss`` (institution code), ``alg``
+(``Ed25519`` or ``HS256``), ``cid``, ``name``, ``inst``, ``course`` and
+``year``; the signature covers ``ACV1.<payload>``. Keys are the ``qr``
+``public_key`` / ``hmac_secret`` of the institution in INSTITUTION_CONFIG.
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+
+from config import INSTITUTION_CONFIG
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+except ImportError:
+    # cryptography is optional, without it only HMAC-signed payloads can be checked
+    Ed25519PublicKey = None
+
+PREFIX = "ACV1"
+ALGORITHMS = {'Ed25519': 'public_key', 'HS256': 'hmac_secret'}
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def is_signed_payload(qr_data):
+    return bool(qr_data) and qr_data.strip().startswith(PREFIX + ".")
+
+
+def _check_signature(algorithm, key, message, signature):
+    """True/False for a good/bad signature, None when it can't be checked here.
+
+    Raises ValueError for a malformed configured key.
+    """
+    if algorithm == 'HS256':
+        return hmac.compare_digest(hmac.new(key.encode(), message, hashlib.sha256).digest(), signature)
+    if Ed25519PublicKey is None:
+        return None
+    try:
+        Ed25519PublicKey.from_public_bytes(_b64decode(key)).verify(signature, message)
+        return True
+    except InvalidSignature:
+        return False
+
+
+def verify_signed_payload(qr_data):
+    """Check a signed QR payload offline.
+
+    Returns a QR result like scan_certificate_qr: status VERIFIED with the
+    signed ``record``, FORGED for a bad signature, UNVERIFIED when no key for
+    the issuer and algorithm is configured (or cryptography is missing for
+    Ed25519) and UNREADABLE for a malformed payload.
+    """
+    try:
+        prefix, payload_part, signature_part = qr_data.strip().split(".")
+        payload = json.loads(_b64decode(payload_part))
+        signature = _b64decode(signature_part)
+        code, algorithm, cert_id = payload['iss'], payload['alg'], payload['cid']
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return {'status': 'UNREADABLE', 'qr_data': qr_data, 'signed': True}
+    # Only strings can name an issuer or algorithm, anything else is as malformed as broken base64
+    if not all(isinstance(value, str) for value in (code, algorithm, cert_id)):
+        return {'status': 'UNREADABLE', 'qr_data': qr_data, 'signed': True}
+
+    # The algorithm must be one the issuer has a key for, never picked by the payload alone
+    key = INSTITUTION_CONFIG.get(code, {}).get('qr', {}).get(ALGORITHMS.get(algorithm, ''))
+    if not key:
+        return {'status': 'UNVERIFIED', 'cert_id': cert_id, 'signed': True,
+                'reason': f"No {algorithm} key configured for institution {code}"}
+
+    try:
+        valid = _check_signature(algorithm, key, f"{prefix}.{payload_part}".encode('ascii'), signature)
+    except ValueError as e:
+        print(f"Bad {algorithm} key configured for institution {code}: {e}")
+        return {'status': 'UNVERIFIED', 'cert_id': cert_id, 'signed': True,
+                'reason': f"The {algorithm} key configured for institution {code} is malformed"}
+    if valid is None:
+        return {'status': 'UNVERIFIED', 'cert_id': cert_id, 'signed': True,
+                'reason': "Ed25519 signatures need the cryptography package"}
+    if not valid:
+        return {'status': 'FORGED', 'cert_id': cert_id, 'signed': True}
+
+    record = {
+        'certificate_no': cert_id,
+        'name': payload.get('name', ''),
+        'institution': payload.get('inst', ''),
+        'course': payload.get('course', ''),
+        'year': payload.get('year', '')
+    }
+    return {'status': 'VERIFIED', 'cert_id': cert_id, 'signed': True, 'institution_code': code, 'record': record}
+
+
+def sign_payload(record, institution_code, algorithm, key):
+    """Signed QR text for a registry record; ``key`` is the HMAC secret or a base64 Ed25519 private key"""
+    payload = {
+        'iss': institution_code,
+        'alg': algorithm,
+        'cid': record['certificate_no'],
+        'name': record.get('name', ''),
+        'inst': record.get('institution', ''),
+        'course': record.get('course', ''),
+        'year': record.get('year', '')
+    }
+    message = f"{PREFIX}.{_b64encode(json.dumps(payload, separators=(',', ':'), default=str).encode())}"
+    if algorithm == 'HS256':
+        signature = hmac.new(key.encode(), message.encode('ascii'), hashlib.sha256).digest()
+    elif algorithm == 'Ed25519':
+        if Ed25519PublicKey is None:
+            raise RuntimeError("Ed25519 signing needs the cryptography package")
+        signature = Ed25519PrivateKey.from_private_bytes(_b64decode(key)).sign(message.encode('ascii'))
+    else:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+    return f"{message}.{_b64encode(signature)}"
+
+
+def generate_ed25519_keypair():
+    """(private, public) keys as base64url text, the public one goes into INSTITUTION_CONFIG"""
+    if Ed25519PublicKey is None:
+        raise RuntimeError("Ed25519 keys need the cryptography package")
+    from cryptography.hazmat.primitives import serialization
+    private_key = Ed25519PrivateKey.generate()
+    raw = serialization.Encoding.Raw
+    return (_b64encode(private_key.private_bytes(raw, serialization.PrivateFormat.Raw, serialization.NoEncryption())),
+            _b64encode(private_key.public_key().public_bytes(raw, serialization.PublicFormat.Raw)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate issuer keys or sign QR payloads for certificates")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('keygen', help="print a new Ed25519 private/public key pair")
+    sign = commands.add_parser('sign', help="print the signed QR text of one certificate")
+    sign.add_argument('--institution', required=True, help="institution code, e.g. JHAR")
+    sign.add_argument('--algorithm', choices=list(ALGORITHMS), default='Ed25519')
+    sign.add_argument('--key', required=True, help="base64 Ed25519 private key or HMAC secret")
+    for field in ('certificate_no', 'name', 'institution_name', 'course', 'year'):
+        sign.add_argument('--' + field.replace('_', '-'), default='', required=field == 'certificate_no')
+    args = parser.parse_args()
+
+    if args.command == 'keygen':
+        private_key, public_key = generate_ed25519_keypair()
+        print(f"private: {private_key}\npublic:  {public_key}")
+        return
+    record = {'certificate_no': args.certificate_no, 'name': args.name, 'institution': args.institution_name,
+              'course': args.course, 'year': args.year}
+    print(sign_payload(record, args.institution, args.algorithm, args.key))
+
+
+if __name__ == "__main__":
+    main()
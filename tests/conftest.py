@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never touch certificate_database.db: every test process gets its own database file, and no
+# background watcher or job workers race the tests
+os.environ['REGISTRY_POLL_INTERVAL'] = '0'
+os.environ['JOB_WORKERS'] = '0'
+os.environ.pop('REGISTRY_CSV', None)
+os.environ.pop('RESULT_CACHE_DB', None)
+
+import database  # noqa: E402
+
+database.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix='certificate-tests-'), 'certificates.db')
+
+import forgery_detection  # noqa: E402
+import field_ocr  # noqa: E402
+import ocr_backend  # noqa: E402
+from config import INSTITUTION_CONFIG  # noqa: E402
+
+REGISTRY_RECORDS = [
+    {'certificate_no': 'JH-UNI-2018-201', 'name': 'Akash Rana', 'institution': 'Jharkhand State University',
+     'course': 'Computer Science', 'year': 2018, 'digital_hash': 'abc123hash456def'},
+    {'certificate_no': 'JH-UNI-2018-202', 'name': 'Priya Sharma', 'institution': 'Jharkhand State University',
+     'course': 'Computer Science', 'year': 2018, 'digital_hash': 'def456hash789abc'},
+    {'certificate_no': 'RTI-2019-310', 'name': 'Amit Verma', 'institution': 'Ranchi Tech Institute',
+     'course': 'Mechanical Engineering', 'year': 2019, 'digital_hash': 'fed321hash654cba'},
+]
+
+# Tesseract isn't needed: OCR answers whatever the test put in OCR_TEXT
+OCR_TEXT = {'full': '', 'field': ''}
+OCR_CALLS = []
+
+
+def fake_image_to_string(img, psm=None, whitelist=None, timeout=None):
+    OCR_CALLS.append(psm)
+    return OCR_TEXT['full'] if psm is None else OCR_TEXT['field']
+
+
+def reference_paths(institution_code):
+    config = INSTITUTION_CONFIG[institution_code]
+    return (os.path.join(ROOT, config['seal']['reference_image']),
+            os.path.join(ROOT, config['signature']['reference_image']))
+
+
+# The real backend entry point, for the tests of ocr_backend itself
+backend_image_to_string = ocr_backend.image_to_string
+ocr_backend.image_to_string = fake_image_to_string
+field_ocr.image_to_string = fake_image_to_string
+forgery_detection.get_reference_paths = reference_paths
+
+import certificate_repository  # noqa: E402
+
+certificate_repository.init_registry()
+certificate_repository.upsert_certificates(REGISTRY_RECORDS)
+
+import app as app_module  # noqa: E402
+
+app_module.image_to_string = fake_image_to_string
+
+
+def certificate_text(name, certificate_no, institution='Jharkhand State University', year=2018):
+    return (f"THIS CERTIFICATE IS GIVEN TO\n{name}.\n{institution}\nIn the year {year}\n"
+            f"Cert No: {certificate_no}")
+
+
+def make_certificate(name, certificate_no, institution_code='JHAR', height=1400, width=2000):
+    """Synthetic certificate: the institution's reference seal and signature on one template"""
+    img = np.full((height, width, 3), 255, np.uint8)
+    config = INSTITUTION_CONFIG[institution_code]
+    for part, path in zip(('seal', 'signature'), reference_paths(institution_code)):
+        x0, y0, x1, y1 = config[part]['roi']
+        xs, ys, xe, ye = int(x0 * width), int(y0 * height), int(x1 * width), int(y1 * height)
+        img[ys:ye, xs:xe] = cv2.resize(cv2.imread(path), (xe - xs, ye - ys))
+    cv2.putText(img, name, (700, 500), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 3)
+    cv2.putText(img, certificate_no, (700, 650), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    return img
+
+
+@pytest.fixture
+def app():
+    return app_module
+
+
+@pytest.fixture
+def ocr():
+    """Set OCR_TEXT['full'] / ['field'] to what Tesseract would read, OCR_CALLS records each call"""
+    OCR_TEXT.update(full='', field='')
+    OCR_CALLS.clear()
+    return OCR_TEXT
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import bounded_executor
+from bounded_executor import BoundedExecutor
+
+
+@pytest.fixture
+def client():
+    with TestClient(api.app) as client:
+        yield client
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    """One worker and one queue slot, calls block until ``release`` is set"""
+    executor = BoundedExecutor(1, 1)
+    monkeypatch.setattr(bounded_executor, '_executor', executor)
+    release = threading.Event()
+    monkeypatch.setattr(api, 'verify_certificate_contents', lambda contents: release.wait(5) and {'success': True})
+    yield executor, release
+    release.set()
+
+
+def upload(client, data=b'certificate bytes'):
+    return client.post('/api/verify-certificate', files={'file': ('certificate.png', data, 'image/png')})
+
+
+def test_full_executor_answers_503_with_retry_after(client, executor):
+    executor, release = executor
+    responses = []
+    blocked = [threading.Thread(target=lambda: responses.append(upload(client))) for _ in range(2)]
+    for thread in blocked:
+        thread.start()
+    while executor.stats()['in_flight'] < 2:
+        time.sleep(0.01)
+
+    rejected = upload(client)
+    assert rejected.status_code == 503
+    assert int(rejected.headers['Retry-After']) >= bounded_executor.API_EXECUTOR['retry_after']
+    assert executor.stats()['rejected'] == 1
+
+    release.set()
+    for thread in blocked:
+        thread.join()
+    assert [response.status_code for response in responses] == [200, 200]
+    assert upload(client).status_code == 200
+
+
+def test_oversized_upload_answers_413(client, executor, monkeypatch):
+    executor, release = executor
+    release.set()
+    monkeypatch.setitem(bounded_executor.API_EXECUTOR, 'max_upload_bytes', 1000)
+    monkeypatch.setitem(bounded_executor.API_EXECUTOR, 'upload_chunk_size', 256)
+
+    assert upload(client, b'x' * 1001).status_code == 413
+    assert executor.stats()['completed'] == 0
+    assert upload(client, b'x' * 1000).status_code == 200
@@ -0,0 +1,62 @@
+import io
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch_verification
+from batch_verification import ArchiveTooLarge, iter_archive_items, spool_archive, stream_batch
+
+
+def archive(**members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for filename, data in members.items():
+            zf.writestr(filename, data)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setitem(batch_verification.BATCH, 'max_member_bytes', 1000)
+    monkeypatch.setitem(batch_verification.BATCH, 'max_archive_bytes', 5000)
+    monkeypatch.setitem(batch_verification.BATCH, 'workers', 1)
+
+
+def test_oversized_member_fails_alone():
+    zf, members = spool_archive(archive(**{'small.png': b'x' * 10, 'bomb.png': b'\0' * 4000}))
+    items = dict(iter_archive_items(zf, members))
+    assert items['small.png'] == b'x' * 10
+    assert isinstance(items['bomb.png'], ArchiveTooLarge)
+
+
+def test_member_lying_about_its_size_is_cut_off():
+    zf, members = spool_archive(archive(**{'bomb.png': b'\0' * 4000}))
+    members[0].file_size = 10
+    # Decompression stops at the declared size and the CRC check fails the member
+    [(filename, error)] = iter_archive_items(zf, members)
+    assert isinstance(error, zipfile.BadZipFile)
+
+
+def test_archive_over_total_cap_is_rejected():
+    with pytest.raises(ArchiveTooLarge):
+        spool_archive(archive(**{f'{n}.png': b'\0' * 900 for n in range(6)}))
+
+
+def test_stream_reports_oversized_member_without_a_worker():
+    zf, members = spool_archive(archive(**{'a.png': b'abc', 'bomb.png': b'\0' * 4000}))
+    seen = []
+
+    def worker(filename, data):
+        seen.append(filename)
+        return {'success': True, 'size': len(data)}, 0.0
+
+    with ThreadPoolExecutor(1) as executor:
+        lines = [json.loads(line) for line in stream_batch(iter_archive_items(zf, members), 2, worker, (), executor)]
+    results = {line['filename']: line['result'] for line in lines if line['type'] == 'result'}
+    assert seen == ['a.png']
+    assert results['a.png'] == {'success': True, 'size': 3}
+    assert results['bomb.png']['success'] is False and 'expands to' in results['bomb.png']['error']
+    assert lines[-1]['failed'] == 1
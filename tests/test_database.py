@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'pool.db')
+    conn = database.get_db_connection(path)
+    with conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.close()
+    return path
+
+
+def test_connections_use_wal_and_busy_timeout(path):
+    conn = database.get_db_connection(path)
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.SQLITE['busy_timeout']
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    finally:
+        conn.close()
+
+
+def test_close_returns_the_connection_to_the_pool(path):
+    conn = database.get_db_connection(path)
+    raw = conn._conn
+    conn.close()
+    conn.close()  # a second close is a no-op, the connection isn't pooled twice
+
+    again = database.get_db_connection(path)
+    assert again._conn is raw
+    assert again.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    # Another thread gets it next
+    again.close()
+    reused = []
+    thread = threading.Thread(target=lambda: reused.append(database.get_db_connection(path)))
+    thread.start()
+    thread.join()
+    assert reused[0]._conn is raw
+    reused[0].close()
+
+
+def test_unfinished_transaction_is_rolled_back_on_close(path):
+    conn = database.get_db_connection(path)
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+
+    conn = database.get_db_connection(path)
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    conn.close()
+
+
+def test_connections_beyond_pool_size_are_closed(path, monkeypatch):
+    monkeypatch.setitem(database.SQLITE, 'pool_size', 1)
+    first, second = database.get_db_connection(path), database.get_db_connection(path)
+    raw = second._conn
+    first.close()
+    second.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        raw.execute("SELECT 1")
+
+
+def test_writer_waits_for_the_lock_instead_of_failing(path):
+    holder = database.get_db_connection(path)
+    holder.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, holder.commit).start()
+
+    waiter = database.get_db_connection(path)
+    started = time.monotonic()
+    with waiter:
+        waiter.execute("INSERT INTO t VALUES (2)")
+    assert time.monotonic() - started >= 0.25
+    waiter.close()
+    holder.close()
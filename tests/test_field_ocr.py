@@ -0,0 +1,50 @@
+import pytest
+
+import field_ocr
+from conftest import OCR_CALLS, certificate_text, make_certificate
+from field_ocr import detect_institution_code, extract_fields, parse_certificate_no_field
+
+
+@pytest.fixture
+def field_ocr_enabled(monkeypatch):
+    monkeypatch.setitem(field_ocr.FIELD_OCR, 'enabled', True)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Cert No: JH-UNI-2018-201', 'JH-UNI-2018-201'),
+    ('jh uni 2018 201', 'JH-UNI-2018-201'),
+    ('RTI-2019-310', 'RTI-2019-310'),
+    ('jbs-2020-501', 'JBS-2020-501'),
+    ('No 12345', '12345'),
+    ('', None),
+])
+def test_one_parser_for_certificate_number_fields(text, expected):
+    assert parse_certificate_no_field(text) == expected
+
+
+def test_uncalibrated_fields_are_off_by_default(ocr):
+    img = make_certificate('Akash Rana', 'JH-UNI-2018-201')
+    assert extract_fields(img, 'JHAR') is None
+    assert detect_institution_code(img) is None
+    assert OCR_CALLS == []
+
+
+def test_header_detection_stops_at_first_text(ocr, field_ocr_enabled):
+    ocr['field'] = 'CERTIFICATE OF COMPLETION'
+    assert detect_institution_code(make_certificate('Akash Rana', 'JH-UNI-2018-201')) is None
+    assert OCR_CALLS == [7]
+
+    OCR_CALLS.clear()
+    ocr['field'] = 'Jharkhand State University'
+    assert detect_institution_code(make_certificate('Akash Rana', 'JH-UNI-2018-201')) == 'JHAR'
+    assert OCR_CALLS == [7]
+
+
+def test_supplied_institution_code_skips_detection(app, ocr, field_ocr_enabled, monkeypatch):
+    def detect(img):
+        raise AssertionError('header OCR ran although the institution code was given')
+    monkeypatch.setattr(app, 'detect_institution_code', detect)
+    monkeypatch.setattr(field_ocr, 'detect_institution_code', detect)
+    ocr['full'] = certificate_text('Akash Rana', 'JH-UNI-2018-201')
+    response = app.verify_certificate_image(make_certificate('Akash Rana', 'JH-UNI-2018-201'), 'JHAR', mode='full')
+    assert response['validation']['status'] == 'VERIFIED'
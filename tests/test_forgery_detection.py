@@ -0,0 +1,103 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import forgery_detection
+from conftest import make_certificate
+from forgery_detection import (build_seal_index, check_seal, check_signature, match_seal, verify_signature,
+                               verify_signature_pyramid)
+
+
+@pytest.fixture
+def seal():
+    """Textured synthetic seal, the shipped reference seals have no ORB keypoints"""
+    rng = np.random.default_rng(7)
+    reference = np.full((400, 400), 255, np.uint8)
+    for _ in range(60):
+        center = tuple(int(v) for v in rng.integers(20, 380, 2))
+        cv2.circle(reference, center, int(rng.integers(5, 40)), int(rng.integers(0, 200)), int(rng.integers(1, 4)))
+    cv2.putText(reference, 'SEAL OF JSU', (40, 210), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+    orb = cv2.ORB_create()
+    return reference, orb.detectAndCompute(reference, None)
+
+
+def test_early_exit_score_is_flagged_as_lower_bound(seal):
+    reference, features = seal
+    index = build_seal_index(features[1])
+    exact, details = match_seal(reference, reference, features, 'flann', index)
+    assert not details['early_exit'] and exact > 0.25
+
+    bound, details = match_seal(reference, reference, features, 'flann', index, early_exit_threshold=0.25)
+    assert details['early_exit'] and details['matches'] < len(features[1])
+    assert 0.25 <= bound < exact
+
+
+def test_bf_and_full_flann_scores_are_exact(seal):
+    reference, features = seal
+    assert match_seal(reference, reference, features, 'bf')[1]['early_exit'] is False
+    score, details = match_seal(reference, reference, features, 'flann', build_seal_index(features[1]),
+                                early_exit_threshold=0.99)
+    assert details['early_exit'] is False
+
+
+def test_seal_report_carries_the_match_details():
+    img = make_certificate('Akash Rana', 'JH-UNI-2018-201')
+    report = forgery_detection.forgery_report('Jharkhand State University', 'JHAR', *check_seal(img, 'JHAR', 'flann'),
+                                              *check_signature(img, 'JHAR'))
+    assert report['seal_matcher'] == 'flann'
+    assert set(report['seal_match']) == {'mode', 'matches', 'early_exit'}
+
+
+@pytest.mark.parametrize('check, mode', [(check_seal, 'orb'), (check_signature, 'fourier')])
+def test_unknown_matcher_modes_are_rejected_alike(check, mode):
+    with pytest.raises(ValueError, match='Unknown'):
+        check(np.full((1400, 2000, 3), 255, np.uint8), 'JHAR', mode)
+
+
+def test_relative_asset_paths_resolve_where_the_file_is(tmp_path, monkeypatch):
+    package_dir = os.path.dirname(os.path.abspath(forgery_detection.__file__))
+    # The shipped assets sit next to the module, not two levels up where app.py used to look
+    assert forgery_detection.resolve_asset_path('assets/seals/jhar_seal.png') == \
+        os.path.join(package_dir, 'assets/seals/jhar_seal.png')
+
+    monkeypatch.setattr(forgery_detection, 'ASSET_BASE_DIR', str(tmp_path))
+    assert forgery_detection.resolve_asset_path('assets/seals/jhar_seal.png') == \
+        str(tmp_path / 'assets/seals/jhar_seal.png')
+
+
+def test_reload_endpoint_reloads_the_reference_cache(app):
+    stale = dict(forgery_detection.get_reference_assets('JHAR'), seal=None)
+    forgery_detection._reference_cache['JHAR'] = stale
+
+    response = app.app.test_client().post('/api/reference-assets/reload', data={'institution_code': 'JHAR'})
+    assert response.status_code == 200
+    assert forgery_detection.get_reference_assets('JHAR')['seal'] is not None
+    assert response.get_json()['reference_assets']['JHAR'] is not None
+
+
+@pytest.fixture
+def signature():
+    """Random pen stroke on a 120x300 ROI"""
+    rng = np.random.default_rng(3)
+    reference = np.full((120, 300), 255, np.uint8)
+    points = np.cumsum(rng.integers(-6, 7, (40, 2)), axis=0) + [150, 60]
+    for start, end in zip(points[:-1], points[1:]):
+        cv2.line(reference, tuple(int(v) for v in start), tuple(int(v) for v in end), 0, 3)
+    return reference
+
+
+def test_pyramid_finds_a_scaled_and_shifted_signature(signature):
+    roi = np.full_like(signature, 255)
+    roi[8:116, 20:290] = cv2.resize(signature, (270, 108))
+
+    score, match = verify_signature_pyramid(roi, signature)
+    assert score > 0.95 and match == {'scale': 0.9, 'offset': [20, 8]}
+    assert verify_signature(roi, signature) < 0.7
+
+
+@pytest.mark.parametrize('shape', [(12, 12), (1, 1), (0, 0), (0, 40)])
+def test_pyramid_scores_an_roi_too_small_for_any_level_as_zero(signature, shape):
+    score, match = verify_signature_pyramid(np.full(shape, 255, np.uint8), signature)
+    assert score == 0 and match['scale'] is None
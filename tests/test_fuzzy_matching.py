@@ -0,0 +1,105 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from fuzzywuzzy import fuzz
+
+import fuzzy_matching
+from certificate_repository import REGISTRY_COLUMNS
+from fuzzy_matching import (best_matches, build_registry_index, candidate_positions, exact_match, match_registry,
+                            ratio_matrix)
+
+QUERIES = ['akash rana', 'jhuni2018201', '', 'priya sharma', 'amit verma']
+CHOICES = ['akash rana', 'akash ranaa', 'aksah rana', 'jhuni2018210', 'jharkhand state university', '',
+           'priya sharma', 'amitverma', 'a']
+
+
+def test_ratio_matrix_is_fuzz_ratio():
+    expected = np.array([[fuzz.ratio(q, c) for c in CHOICES] for q in QUERIES])
+    assert np.array_equal(ratio_matrix(QUERIES, CHOICES), expected)
+
+
+def test_vectorised_path_scores_as_levenshtein_ratio(monkeypatch):
+    rapidfuzz = pytest.importorskip('rapidfuzz')
+    monkeypatch.setattr(fuzzy_matching, 'VECTORISED_RATIO', True)
+    expected = np.array([[100 if q == c else 0 if not (q and c) else round(rapidfuzz.fuzz.ratio(q, c))
+                          for c in CHOICES] for q in QUERIES])
+    assert np.array_equal(ratio_matrix(QUERIES, CHOICES), expected)
+
+
+def synthetic_registry(rng, size=300):
+    """Registry with many near neighbours: sequential numbers, names drawn from a small pool"""
+    first = ['Akash', 'Priya', 'Amit', 'Sneha', 'Ravi', 'Pooja', 'Vikas', 'Anita', 'Suresh', 'Meena']
+    last = ['Rana', 'Sharma', 'Verma', 'Das', 'Gupta', 'Singh', 'Kumar', 'Roy']
+    institutions = [('JH-UNI', 'Jharkhand State University'), ('RTI', 'Ranchi Tech Institute'),
+                    ('JBS', 'Jharkhand Business School')]
+    records = []
+    for i in range(size):
+        prefix, institution = institutions[i % len(institutions)]
+        year = 2015 + i % 6
+        records.append({'certificate_no': f'{prefix}-{year}-{100 + i}', 'name': f'{rng.choice(first)} {rng.choice(last)}',
+                        'institution': institution, 'course': 'BSc', 'year': year, 'digital_hash': f'h{i}'})
+    return pd.DataFrame(records, columns=REGISTRY_COLUMNS)
+
+
+def corrupt(rng, text, edits):
+    """OCR-style damage: substituted, dropped and inserted characters"""
+    chars = list(text)
+    for _ in range(edits):
+        position = rng.randrange(len(chars))
+        kind = rng.choice(('substitute', 'drop', 'insert'))
+        if kind == 'substitute':
+            chars[position] = rng.choice('O0I1S5B8 -.')
+        elif kind == 'drop' and len(chars) > 1:
+            del chars[position]
+        else:
+            chars.insert(position, rng.choice('O0I1S5B8 -.'))
+    return ''.join(chars)
+
+
+# Below ~80 numbers this short can't be narrowed down and every query scans the whole registry
+@pytest.mark.parametrize('threshold', [85, 90])
+@pytest.mark.parametrize('first', [False, True])
+def test_trigram_candidates_match_a_full_scan(threshold, first):
+    rng = random.Random(threshold)
+    db = synthetic_registry(rng)
+    index = build_registry_index(db)
+
+    infos = []
+    for _ in range(80):
+        row = db.iloc[rng.randrange(len(db))]
+        infos.append({'certificate_no': corrupt(rng, row['certificate_no'], rng.randrange(1, 3)),
+                      'name': corrupt(rng, row['name'], rng.randrange(0, 3)),
+                      'institution': corrupt(rng, row['institution'], rng.randrange(0, 3)),
+                      'year': str(row['year'])})
+
+    # Canonical hits are scored differently on purpose, compare the queries left to the fuzzy engine
+    misses = [info for info in infos if exact_match(index, info, threshold, first=first)[0] is None]
+    narrowed = [info for info in misses if candidate_positions(index, info, threshold) is not None]
+    assert len(narrowed) > len(misses) // 2
+
+    expected = best_matches(narrowed, index['block'], threshold, first=first)
+    assert sum(position is not None for position, _ in expected) > len(narrowed) // 4
+    # One query at a time, so each is scored against its own candidates only
+    assert [match_registry(index, [info], threshold, first=first)[0] for info in narrowed] == expected
+
+
+def test_canonical_certificate_number_skips_the_fuzzy_engine(monkeypatch):
+    rng = random.Random(1)
+    db = pd.concat([synthetic_registry(rng), pd.DataFrame([{
+        'certificate_no': 'JH-UNI-2018-201', 'name': 'Akash Rana', 'institution': 'Jharkhand State University',
+        'course': 'BSc', 'year': 2018, 'digital_hash': 'abc'}])], ignore_index=True)
+    index = build_registry_index(db)
+    info = {'certificate_no': 'JHUNI2018201', 'name': 'Akash Rana', 'institution': 'Jharkhand State University',
+            'year': '2018'}
+
+    def no_scan(*args, **kwargs):
+        raise AssertionError('fuzzy engine used for a canonical hit')
+    monkeypatch.setattr(fuzzy_matching, 'candidate_positions', no_scan)
+
+    position, scores = exact_match(index, info, 85)
+    assert position == len(db) - 1 and scores['cert'] == 100
+    assert match_registry(index, [info], 85) == [(position, scores)]
+    # The other fields still have to clear the threshold
+    assert exact_match(index, dict(info, name='Rohit Kumar'), 85)[0] is None
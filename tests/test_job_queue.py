@@ -0,0 +1,93 @@
+import io
+import socket
+import subprocess
+import sys
+
+import pytest
+
+import database
+import job_queue
+from job_queue import claim_next_job, finish_job, get_job, recover_jobs, submit_job
+
+
+@pytest.fixture(autouse=True)
+def jobs():
+    job_queue.init_job_table()
+    conn = database.get_db_connection()
+    with conn:
+        conn.execute("DELETE FROM verification_jobs")
+    conn.close()
+
+
+def set_owner(job_id, owner, attempts=None):
+    conn = database.get_db_connection()
+    with conn:
+        conn.execute("UPDATE verification_jobs SET claimed_by = ?, attempts = COALESCE(?, attempts) WHERE id = ?",
+                     (owner, attempts, job_id))
+    conn.close()
+
+
+def dead_owner():
+    """Owner string of a process on this host that has exited"""
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    return f"{socket.gethostname()}:{child.pid}:deadbeef"
+
+
+def test_higher_priority_is_claimed_first():
+    low = submit_job(b'low', 'low.png')
+    high = submit_job(b'high', 'high.png', priority=5)
+    high_later = submit_job(b'high later', 'high-later.png', priority=5)
+    assert get_job(low)['queue_position'] == 2
+
+    assert [claim_next_job()['id'] for _ in range(3)] == [high, high_later, low]
+    assert claim_next_job() is None
+    assert get_job(high)['status'] == 'running' and get_job(high)['attempts'] == 1
+
+
+def test_jobs_of_dead_processes_are_requeued():
+    abandoned, reused_pid, alive = (submit_job(name.encode()) for name in ('abandoned', 'reused', 'alive'))
+    for _ in range(3):
+        claim_next_job()
+    set_owner(abandoned, dead_owner())
+    # This process's pid with another process's token: a container restart reusing the pid
+    set_owner(reused_pid, job_queue._owner().rsplit(':', 1)[0] + ':0ther000')
+
+    assert recover_jobs() == 2
+    assert get_job(abandoned)['status'] == 'queued' and get_job(reused_pid)['status'] == 'queued'
+    assert get_job(alive)['status'] == 'running'
+    assert claim_next_job()['attempts'] == 1
+
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setitem(job_queue.JOB_QUEUE, 'max_attempts', 2)
+    job_id = submit_job(b'crashes the worker')
+    claim_next_job()
+    set_owner(job_id, dead_owner())
+    assert recover_jobs() == 1
+
+    claim_next_job()
+    set_owner(job_id, dead_owner())
+    assert recover_jobs() == 0
+    job = get_job(job_id)
+    assert job['status'] == 'failed' and job['attempts'] == 2
+    assert 'Gave up after 2' in job['error']
+
+
+def test_result_endpoint_answers_202_until_the_job_is_done(app):
+    client = app.app.test_client()
+    submitted = client.post('/api/jobs', content_type='multipart/form-data',
+                            data={'file': (io.BytesIO(b'image bytes'), 'certificate.png')})
+    assert submitted.status_code == 202
+    result_url = submitted.get_json()['result_url']
+
+    queued = client.get(result_url)
+    assert queued.status_code == 202 and queued.get_json()['status'] == 'queued'
+    job = claim_next_job()
+    running = client.get(result_url)
+    assert running.status_code == 202 and running.get_json()['status'] == 'running'
+
+    finish_job(job['id'], {'validation': {'status': 'VERIFIED'}})
+    done = client.get(result_url)
+    assert done.status_code == 200 and done.get_json() == {'validation': {'status': 'VERIFIED'}}
+    assert client.get('/api/jobs/unknown/result').status_code == 404
@@ -0,0 +1,67 @@
+import pytest
+
+import perceptual_hash
+from conftest import OCR_CALLS, certificate_text, make_certificate
+
+
+@pytest.fixture(autouse=True)
+def duplicate_index(monkeypatch):
+    monkeypatch.setattr(perceptual_hash, '_index', None)
+    return perceptual_hash.get_duplicate_index()
+
+
+def verify(app, ocr, name, certificate_no):
+    ocr['full'] = certificate_text(name, certificate_no)
+    ocr_calls = len(OCR_CALLS)
+    response = app.verify_certificate_image(make_certificate(name, certificate_no), mode='full')
+    response['ocr_ran'] = len(OCR_CALLS) > ocr_calls
+    return response
+
+
+def test_templates_hash_as_near_duplicates(app):
+    first = perceptual_hash.dhash(make_certificate('Akash Rana', 'JH-UNI-2018-201'))
+    second = perceptual_hash.dhash(make_certificate('Priya Sharma', 'JH-UNI-2018-202'))
+    assert perceptual_hash.hamming_distance(first, second) <= app.PERCEPTUAL_HASH['max_distance']
+
+
+def test_same_number_other_name_inherits_nothing(app, ocr, monkeypatch):
+    genuine = verify(app, ocr, 'Akash Rana', 'JH-UNI-2018-201')
+    assert genuine['validation']['status'] == 'VERIFIED'
+
+    seal_checks = []
+    check_seal = app.check_seal
+    monkeypatch.setattr(app, 'check_seal', lambda *args: seal_checks.append(args) or check_seal(*args))
+    forged = verify(app, ocr, 'Rohit Kumar', 'JH-UNI-2018-201')
+
+    # The copy went through OCR and the forgery checks itself, the neighbour is only reported
+    assert forged['ocr_ran'] and seal_checks
+    assert 'Rohit Kumar' in forged['extracted_info']['raw_text']
+    assert forged['validation']['confidence_scores']['name_match'] < 100
+    assert forged['near_duplicate']['previous_certificate_no'] == 'JH-UNI-2018-201'
+    assert forged['near_duplicate']['certificate_no_mismatch'] is False
+    assert 'reused' not in forged['near_duplicate']
+
+
+def test_other_student_from_same_template_is_not_rejected(app, ocr):
+    verify(app, ocr, 'Akash Rana', 'JH-UNI-2018-201')
+    other = verify(app, ocr, 'Priya Sharma', 'JH-UNI-2018-202')
+
+    assert other['ocr_ran']
+    assert other['validation']['status'] == 'VERIFIED'
+    assert other['extracted_info']['name'] == 'Priya Sharma'
+    assert other['near_duplicate']['certificate_no_mismatch'] is True
+    assert other['pipeline']['verdict'] is None
+
+
+def test_reject_mismatch_without_field_ocr_is_flagged(app, ocr, monkeypatch):
+    monkeypatch.setitem(app.PERCEPTUAL_HASH, 'reject_mismatch', True)
+    monkeypatch.setitem(app.FIELD_OCR, 'enabled', False)
+    assert 'FIELD_OCR' in app.near_duplicate_config_warning()
+
+    # The number field isn't read, so the shortcut can't fire and the copy goes through the pipeline
+    verify(app, ocr, 'Akash Rana', 'JH-UNI-2018-201')
+    forged = verify(app, ocr, 'Rohit Kumar', 'JH-UNI-2018-201')
+    assert forged['ocr_ran'] and forged['pipeline']['verdict'] != 'NEAR_DUPLICATE_MISMATCH'
+
+    monkeypatch.setitem(app.FIELD_OCR, 'enabled', True)
+    assert app.near_duplicate_config_warning() is None
@@ -0,0 +1,115 @@
+import time
+import types
+
+import pytest
+
+import ocr_backend
+from conftest import backend_image_to_string
+from ocr_backend import OCRWorkerPool
+
+RAN = []
+
+
+class FakeTessBaseAPI:
+    """Stands in for tesserocr.PyTessBaseAPI: an image is a (text, seconds) pair, read back after that long"""
+
+    def __init__(self, lang):
+        self.image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def SetPageSegMode(self, psm):
+        pass
+
+    def SetVariable(self, name, value):
+        pass
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self):
+        text, seconds = self.image
+        RAN.append(text)
+        time.sleep(seconds)
+        return text
+
+    def Clear(self):
+        self.image = None
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ocr_backend, 'tesserocr', types.SimpleNamespace(PyTessBaseAPI=FakeTessBaseAPI))
+    RAN.clear()
+    pool = OCRWorkerPool(1, health_check_interval=0.5)
+    # Workers only, no monitor thread: tests call health_check themselves
+    pool.workers.append(pool._spawn())
+    yield pool
+    for worker in pool.workers:
+        worker.retired = True
+
+
+def test_timed_out_queued_job_is_dropped(pool):
+    pool.submit(('busy', 0.3))
+    with pytest.raises(TimeoutError):
+        pool.image_to_string(('missed', 1.0), timeout=0.1)
+
+    # The fallback only waits for the job already running, not for the one nobody wants any more
+    started = time.monotonic()
+    assert pool.image_to_string(('fallback', 0), timeout=0.6) == 'fallback'
+    assert time.monotonic() - started < 0.4
+    assert RAN == ['busy', 'fallback']
+
+
+def test_health_check_replaces_dead_and_stuck_workers(pool):
+    dead = pool.workers[0]
+    dead.retired = True
+    dead.join(2)
+    pool.health_check()
+    assert pool.restarts == 1 and pool.workers[0] is not dead and pool.workers[0].is_alive()
+    assert pool.image_to_string(('after restart', 0), timeout=1) == 'after restart'
+
+    pool.request_timeout = 0.1
+    pool.submit(('stuck', 1.0))
+    stuck = pool.workers[0]
+    while stuck.busy_since is None:
+        time.sleep(0.01)
+    pool.health_check()
+    assert pool.restarts == 1  # busy, but not for longer than request_timeout yet
+    time.sleep(0.15)
+    pool.health_check()
+    assert pool.restarts == 2 and pool.workers[0] is not stuck and stuck.retired
+    # The replacement serves new jobs while the stuck one is still busy
+    assert pool.image_to_string(('served', 0), timeout=0.5) == 'served'
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(ocr_backend, '_pool', None)
+    monkeypatch.setitem(ocr_backend.OCR_BACKEND, 'backend', 'pool')
+    calls = []
+    monkeypatch.setattr(ocr_backend, 'pytesseract_image_to_string',
+                        lambda img, psm=None, whitelist=None, timeout=0: calls.append(psm) or 'from the cli')
+    return calls
+
+
+def test_pool_backend_without_tesserocr_uses_pytesseract(backend, monkeypatch):
+    monkeypatch.setattr(ocr_backend, 'tesserocr', None)
+    assert ocr_backend.get_pool() is None
+    assert backend_image_to_string('image', psm=7, timeout=1) == 'from the cli'
+    assert backend == [7]
+    assert ocr_backend.ocr_health() == {'backend': 'pytesseract'}
+
+
+def test_pool_that_cannot_load_the_language_falls_back_to_pytesseract(backend, monkeypatch):
+    def unavailable(lang):
+        raise RuntimeError(f"Failed to init API, possibly an invalid tessdata path for {lang}")
+    monkeypatch.setattr(ocr_backend, 'tesserocr', types.SimpleNamespace(PyTessBaseAPI=unavailable))
+
+    assert ocr_backend.get_pool() is None
+    assert ocr_backend.OCR_BACKEND['backend'] == 'pytesseract'
+    assert backend_image_to_string('image', timeout=1) == 'from the cli'
@@ -0,0 +1,57 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+import qr_engine
+from qr_engine import decode_qr_regions, qr_rois
+
+ROI = [0.030, 0.740, 0.200, 0.980]
+
+
+@pytest.fixture
+def same_roi_everywhere(monkeypatch):
+    for config in qr_engine.INSTITUTION_CONFIG.values():
+        monkeypatch.setitem(config['qr'], 'roi', list(ROI))
+
+
+def test_shipped_config_has_no_uncalibrated_qr_rois():
+    assert qr_rois() == []
+
+
+def test_identical_rois_are_decoded_once(same_roi_everywhere, monkeypatch):
+    assert qr_rois() == [tuple(ROI)]
+    shapes = []
+    monkeypatch.setattr(qr_engine, 'decode_qr_codes', lambda image: shapes.append(image.shape) or [])
+    decode_qr_regions(np.full((1400, 2000, 3), 255, np.uint8))
+    assert shapes == [(1400, 2000, 3), (336, 340, 3)]
+
+
+GOOD_QR = "Certificate ID: JH-UNI-2018-201\nDigital Hash: abc123hash456def"
+FORGED_QR = "Certificate ID: JH-UNI-2018-202\nDigital Hash: not-the-registry-hash"
+
+
+def sheet(*texts, side=300):
+    """White page with the QR codes side by side along the bottom"""
+    img = np.full((1400, 2000, 3), 255, np.uint8)
+    for n, text in enumerate(texts):
+        code = cv2.resize(cv2.QRCodeEncoder.create().encode(text), (side, side), interpolation=cv2.INTER_NEAREST)
+        x = 100 + n * (side + 200)
+        img[1000:1000 + side, x:x + side] = cv2.cvtColor(code, cv2.COLOR_GRAY2BGR)
+    return img
+
+
+def test_every_code_is_decoded_even_when_a_roi_has_one(same_roi_everywhere):
+    payloads = decode_qr_regions(sheet(GOOD_QR, FORGED_QR, 'https://example.org'), 'JHAR')
+    assert sorted(payloads) == sorted([GOOD_QR, FORGED_QR, 'https://example.org'])
+
+
+def test_scan_endpoint_uses_the_pipeline_precedence(app):
+    image = cv2.imencode('.png', sheet(GOOD_QR, FORGED_QR))[1].tobytes()
+    response = app.app.test_client().post('/api/scan-qr', content_type='multipart/form-data',
+                                          data={'file': (io.BytesIO(image), 'sheet.png')})
+    body = response.get_json()
+    assert response.status_code == 400 and body['status'] == 'FORGED'
+    assert len(body['qr_codes']) == 2
+    assert app.scan_certificate_qr(sheet(GOOD_QR, FORGED_QR))['status'] == body['status']
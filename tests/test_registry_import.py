@@ -0,0 +1,86 @@
+import io
+
+import pytest
+
+import certificate_repository
+import database
+from certificate_repository import certificate_row
+
+CSV = (b"certificate_no,name,institution,course,year,digital_hash\n"
+       b"JBS-2021-601,Anita Das,Jharkhand Business School,BBA,2021,hash601\n"
+       b"JBS-2021-602,Suresh Rana,Jharkhand Business School,BBA,inf,hash602\n"
+       b"JBS-2021-603,Vikas Das,Jharkhand Business School,BBA,1e400,hash603\n")
+
+
+def lookup_indexes():
+    conn = database.get_db_connection()
+    try:
+        return sorted(row['name'] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'certificates' "
+            "AND name NOT LIKE 'sqlite_autoindex%'"))
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('year', ['inf', '-inf', 'nan', '1e400', '99999999999999999999', 'twenty'])
+def test_invalid_years_are_rejected_rows(year):
+    with pytest.raises(ValueError, match='invalid year'):
+        certificate_row({'certificate_no': 'X-1', 'name': 'A B', 'institution': 'I', 'year': year})
+
+
+def test_http_import_keeps_lookup_indexes_by_default(app, monkeypatch):
+    indexes = lookup_indexes()
+    assert indexes
+    seen = []
+    import_records = app.import_records
+    monkeypatch.setattr(app, 'import_records', lambda records, **kwargs: import_records(
+        records, progress=lambda report, elapsed: seen.append(lookup_indexes()), **kwargs))
+
+    response = app.app.test_client().post('/api/registry/import', content_type='multipart/form-data',
+                                          data={'file': (io.BytesIO(CSV), 'export.csv')})
+    report = response.get_json()
+    assert response.status_code == 200
+    assert report['imported'] == 1 and report['rejected'] == 2
+    assert seen == [indexes]
+    assert lookup_indexes() == indexes
+
+
+def test_certificate_numbers_are_unique_regardless_of_case():
+    before = certificate_repository.count_certificates()
+    certificate_repository.upsert_certificates([
+        {'certificate_no': 'JBS-2021-611', 'name': 'Anita Das', 'institution': 'Jharkhand Business School',
+         'year': 2021, 'digital_hash': 'hash611'},
+        {'certificate_no': 'jbs-2021-611', 'name': 'Anita Dass', 'institution': 'Jharkhand Business School',
+         'year': 2021, 'digital_hash': 'hash611b'},
+    ])
+    assert certificate_repository.count_certificates() == before + 1
+    assert certificate_repository.find_certificate('JBS-2021-611')['digital_hash'] == 'hash611b'
+
+
+def test_case_sensitive_table_is_migrated(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DATABASE_PATH', str(tmp_path / 'old.db'))
+    conn = database.get_db_connection()
+    with conn:
+        conn.execute("""
+        CREATE TABLE certificates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, cert_id TEXT NOT NULL UNIQUE, name TEXT NOT NULL,
+            institution TEXT NOT NULL, course TEXT, year INTEGER, digital_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+        conn.executemany("INSERT INTO certificates (cert_id, name, institution, digital_hash) VALUES (?, ?, ?, ?)",
+                         [('RTI-2019-301', 'Old Name', 'Ranchi Tech Institute', 'old'),
+                          ('RTI-2019-302', 'Meena Roy', 'Ranchi Tech Institute', 'h302'),
+                          ('rti-2019-301', 'New Name', 'Ranchi Tech Institute', 'new')])
+    conn.close()
+
+    certificate_repository.init_registry()
+    rows = certificate_repository.fetch_registry_changes()
+    assert sorted((row['certificate_no'], row['name']) for row in rows) == [
+        ('RTI-2019-302', 'Meena Roy'), ('rti-2019-301', 'New Name')]
+
+    certificate_repository.upsert_certificates([{'certificate_no': 'RTI-2019-301', 'name': 'Newer Name',
+                                                 'institution': 'Ranchi Tech Institute', 'digital_hash': 'x'}])
+    assert certificate_repository.count_certificates() == 2
+    assert certificate_repository.find_certificate('rti-2019-301')['name'] == 'Newer Name'
+    # Running it again leaves a migrated table alone
+    certificate_repository.init_registry()
+    assert certificate_repository.count_certificates() == 2
@@ -0,0 +1,119 @@
+import pytest
+
+import certificate_repository
+import registry_snapshot
+from fuzzy_matching import match_registry
+
+POSTINGS = ('cert_lookup', 'cert_grams', 'name_grams')
+
+
+def record(certificate_no, name, year=2020):
+    return {'certificate_no': certificate_no, 'name': name, 'institution': 'Jharkhand Business School',
+            'course': 'BBA', 'year': year, 'digital_hash': f'hash-{certificate_no.lower()}'}
+
+
+@pytest.fixture
+def snapshot_state(monkeypatch):
+    """Run with a fresh snapshot and the given poll interval, restoring the module state afterwards"""
+    for name in ('_snapshot', '_checked_at', '_watcher'):
+        monkeypatch.setattr(registry_snapshot, name, None)
+
+    def poll_every(seconds):
+        monkeypatch.setitem(registry_snapshot.REGISTRY, 'poll_interval', seconds)
+        return registry_snapshot.get_registry()
+    return poll_every
+
+
+def test_apply_changes_is_copy_on_write_and_matches_a_rebuild():
+    certificate_repository.upsert_certificates([record('JBS-2020-501', 'Sneha Das')])
+    rows = certificate_repository.fetch_registry_changes()
+    old = registry_snapshot.build_snapshot(rows[:-1])
+    old_db = old['db'].copy()
+    old_postings = {field: {key: list(postings) for key, postings in old['index'][field].items()}
+                    for field in POSTINGS}
+
+    changed = dict(rows[0], name='Renamed Student', updated_at=rows[0]['updated_at'] + 1)
+    updates, appended = registry_snapshot.changed_rows(old, [changed, rows[-1]])
+    new = registry_snapshot.apply_changes(old, updates, appended)
+
+    # The snapshot in use by other requests is untouched
+    assert old['db'].equals(old_db)
+    assert {field: old['index'][field] for field in POSTINGS} == old_postings
+    assert new['version'] != old['version']
+
+    rebuilt = registry_snapshot.build_snapshot([changed] + rows[1:])
+    assert new['db'].equals(rebuilt['db'])
+    assert new['rows'] == rebuilt['rows']
+    assert {field: new['index'][field] for field in POSTINGS} == {field: rebuilt['index'][field] for field in POSTINGS}
+    query = [{'certificate_no': 'JBS-2020-501', 'name': 'Sneha Das', 'institution': 'Jharkhand Business School',
+              'year': '2020'}]
+    assert match_registry(new['index'], query, 85) == match_registry(rebuilt['index'], query, 85)
+    assert certificate_repository.cert_id_key('jbs-2020-501') in new['id_filter']
+
+
+def test_process_without_watcher_refreshes_a_stale_snapshot(snapshot_state, monkeypatch):
+    snapshot = snapshot_state(30)
+    certificate_repository.upsert_certificates([record('JBS-2020-502', 'Ravi Gupta')])
+
+    # Within the poll interval the inherited snapshot is used as is
+    assert registry_snapshot.get_registry() is snapshot
+    assert 'JBS-2020-502' not in set(snapshot['db']['certificate_no'])
+
+    monkeypatch.setattr(registry_snapshot, '_checked_at', registry_snapshot._checked_at - 31)
+    refreshed = registry_snapshot.get_registry()
+    assert refreshed is not snapshot
+    assert len(refreshed['db']) == len(snapshot['db']) + 1
+    record_found, valid = registry_snapshot.check_certificate_hash_filtered('JBS-2020-502', 'hash-jbs-2020-502')
+    assert valid and record_found['name'] == 'Ravi Gupta'
+
+
+def test_bloom_filter_is_bypassed_when_refreshes_fail(snapshot_state, monkeypatch):
+    snapshot_state(30)
+    certificate_repository.upsert_certificates([record('JBS-2020-503', 'Pooja Singh')])
+
+    def unavailable(since=None):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(registry_snapshot, 'fetch_registry_changes', unavailable)
+    monkeypatch.setattr(registry_snapshot, '_checked_at', registry_snapshot._checked_at - 61)
+
+    record_found, valid = registry_snapshot.check_certificate_hash_filtered('JBS-2020-503', 'hash-jbs-2020-503')
+    assert valid and record_found['certificate_no'] == 'JBS-2020-503'
+    assert 'JBS-2020-503' in registry_snapshot.find_certificates_filtered(['JBS-2020-503'])
+
+
+def test_watcher_disabled_keeps_the_snapshot(snapshot_state):
+    snapshot = snapshot_state(0)
+    certificate_repository.upsert_certificates([record('JBS-2020-504', 'Vikas Kumar')])
+    assert registry_snapshot.get_registry() is snapshot
+
+
+def test_version_does_not_depend_on_how_changes_were_batched():
+    certificate_repository.upsert_certificates([record('JBS-2020-505', 'Neha Jha'), record('JBS-2020-506', 'Arun Sen')])
+    rows = certificate_repository.fetch_registry_changes()
+    base, new_rows = rows[:-2], rows[-2:]
+    changed = dict(base[0], name='Renamed Again', updated_at=base[0]['updated_at'] + 1)
+    start = registry_snapshot.build_snapshot(base)
+
+    one_poll = registry_snapshot.apply_changes(start, *registry_snapshot.changed_rows(start, [changed] + new_rows))
+    first = registry_snapshot.apply_changes(start, *registry_snapshot.changed_rows(start, [new_rows[0]]))
+    second = registry_snapshot.apply_changes(first, *registry_snapshot.changed_rows(first, [changed, new_rows[1]]))
+
+    assert one_poll['version'] == second['version'] != start['version']
+    # A process started later loads the same rows from the table and agrees too
+    assert registry_snapshot.build_snapshot([changed] + base[1:] + new_rows)['version'] == one_poll['version']
+
+
+def test_id_inserted_after_the_snapshot_is_not_a_filter_miss(snapshot_state):
+    snapshot = snapshot_state(30)
+    certificate_repository.upsert_certificates([record('JBS-2020-507', 'Kiran Mehta')])
+    assert registry_snapshot.get_registry() is snapshot
+    assert certificate_repository.cert_id_key('JBS-2020-507') not in snapshot['id_filter']
+
+    record_found, valid = registry_snapshot.check_certificate_hash_filtered('jbs-2020-507', 'hash-jbs-2020-507')
+    assert valid and record_found['name'] == 'Kiran Mehta'
+    assert set(registry_snapshot.find_certificates_filtered(['JBS-2020-507', 'JBS-2020-999'])) == {'JBS-2020-507'}
+
+    # IDs nobody wrote are still answered by the filter alone
+    filtered = registry_snapshot._stats['filtered_lookups']
+    assert registry_snapshot.check_certificate_hash_filtered('JBS-2020-998', 'x') == (None, False)
+    assert registry_snapshot._stats['filtered_lookups'] == filtered + 1
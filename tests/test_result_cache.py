@@ -0,0 +1,52 @@
+import os
+import shutil
+import time
+
+import forgery_detection
+from conftest import reference_paths
+from result_cache import ResultCache, config_version
+
+
+def test_config_version_follows_reference_asset_files(tmp_path, monkeypatch):
+    copies = {}
+    for code in forgery_detection.INSTITUTION_CONFIG:
+        copies[code] = tuple(shutil.copy(path, tmp_path / f'{code}-{n}.png')
+                             for n, path in enumerate(reference_paths(code)))
+    monkeypatch.setattr(forgery_detection, 'get_reference_paths', lambda code: copies[code])
+    forgery_detection.clear_reference_cache()
+    try:
+        before = config_version()
+        assert config_version() == before
+
+        seal = copies['JHAR'][0]
+        with open(seal, 'ab') as file:
+            file.write(b'\0')
+        assert config_version() != before
+
+        changed = config_version()
+        os.utime(seal, (time.time() + 60, time.time() + 60))
+        assert config_version() != changed
+    finally:
+        forgery_detection.clear_reference_cache()
+
+
+def test_version_change_keeps_other_versions_on_disk(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    old_process, new_process = ResultCache(ttl=3600, disk_path=path), ResultCache(ttl=3600, disk_path=path)
+    old_process.put('upload-a', 'v1', {'status': 'VERIFIED'})
+    new_process.get('upload-b', 'v1')
+    new_process.put('upload-b', 'v2', {'status': 'INVALID'})
+
+    # A process still on v1 keeps its disk hits while another one has moved on
+    old_process.entries.clear()
+    assert old_process.get('upload-a', 'v1') == {'status': 'VERIFIED'}
+    assert new_process.get('upload-a', 'v2') is None
+
+
+def test_version_change_drops_expired_disk_entries(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResultCache(ttl=3600, disk_path=path)
+    cache.put('old', 'v1', {'status': 'VERIFIED'})
+    cache._disk_execute("UPDATE verification_cache SET created_at = ?", (time.time() - 7200,))
+    cache.get('other', 'v2')
+    assert cache._disk_execute("SELECT key FROM verification_cache", ()) == []
@@ -0,0 +1,62 @@
+import base64
+import json
+
+import pytest
+
+import signed_qr
+from signed_qr import sign_payload, verify_signed_payload
+
+RECORD = {'certificate_no': 'JH-UNI-2018-201', 'name': 'Akash Rana', 'institution': 'Jharkhand State University',
+          'course': 'Computer Science', 'year': 2018}
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def crafted(payload):
+    return f"ACV1.{b64(json.dumps(payload).encode())}.{b64(b'not a signature')}"
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    qr = signed_qr.INSTITUTION_CONFIG['JHAR']['qr']
+    monkeypatch.setitem(qr, 'hmac_secret', 'test-secret')
+    monkeypatch.setitem(qr, 'public_key', 'not-a-key')
+    return qr
+
+
+def test_hmac_round_trip(keys):
+    result = verify_signed_payload(sign_payload(RECORD, 'JHAR', 'HS256', 'test-secret'))
+    assert result['status'] == 'VERIFIED' and result['record']['name'] == 'Akash Rana'
+    assert verify_signed_payload(sign_payload(RECORD, 'JHAR', 'HS256', 'other-secret'))['status'] == 'FORGED'
+
+
+@pytest.mark.parametrize('field', ['iss', 'alg', 'cid'])
+@pytest.mark.parametrize('value', [['JHAR'], {'code': 'JHAR'}, 7, None])
+def test_non_string_fields_are_unreadable(keys, field, value):
+    payload = {'iss': 'JHAR', 'alg': 'HS256', 'cid': 'JH-UNI-2018-201', field: value}
+    assert verify_signed_payload(crafted(payload))['status'] == 'UNREADABLE'
+
+
+def test_crafted_payload_does_not_fail_the_bulk_endpoint(app, keys):
+    client = app.app.test_client()
+    payloads = [crafted({'iss': ['JHAR'], 'alg': 'HS256', 'cid': 'X'}),
+                crafted({'iss': 'JHAR', 'alg': {'a': 1}, 'cid': 'X'}),
+                sign_payload(RECORD, 'JHAR', 'HS256', 'test-secret')]
+    response = client.post('/api/verify-qr-batch', json={'payloads': payloads})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.get_json()['results']] == ['UNREADABLE', 'UNREADABLE', 'VERIFIED']
+
+
+def test_malformed_public_key_is_unverified(keys):
+    pytest.importorskip('cryptography')
+    result = verify_signed_payload(crafted({'iss': 'JHAR', 'alg': 'Ed25519', 'cid': 'JH-UNI-2018-201'}))
+    assert result['status'] == 'UNVERIFIED' and 'malformed' in result['reason']
+
+
+@pytest.mark.parametrize('body', [["ACV1.payload.signature"], "ACV1.payload.signature", 42, None, {'payloads': []}])
+def test_bulk_endpoint_rejects_bodies_without_a_payload_list(app, body):
+    response = app.app.test_client().post('/api/verify-qr-batch', json=body)
+    assert response.status_code == 400
+    assert 'payloads must be a non-empty list' in response.get_json()['error']
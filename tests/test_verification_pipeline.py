@@ -0,0 +1,142 @@
+import io
+import threading
+import time
+
+import cv2
+import pytest
+
+import perceptual_hash
+import result_cache
+from conftest import certificate_text, make_certificate
+from verification_pipeline import run_pipeline, stage, time_left
+
+
+def sleeper(seconds, value):
+    def func(inputs):
+        time.sleep(seconds)
+        return value
+    return func
+
+
+def test_dependencies_and_parallel_stages():
+    started = time.monotonic()
+    run = run_pipeline({
+        'a': stage(sleeper(0.2, 1)),
+        'b': stage(sleeper(0.2, 2)),
+        'sum': stage(lambda inputs: inputs['a'] + inputs['b'], 'a', 'b')
+    })
+    assert run['results'] == {'a': 1, 'b': 2, 'sum': 3}
+    assert time.monotonic() - started < 0.35
+
+
+def test_failed_dependency_skips_dependents():
+    def fail(inputs):
+        raise ValueError('unreadable')
+    run = run_pipeline({'ocr': stage(fail), 'fuzzy': stage(lambda inputs: 1, 'ocr')})
+    assert run['errors'] == {'ocr': 'unreadable'}
+    assert run['skipped'] == {'fuzzy': 'dependency failed'}
+
+
+def test_verdict_cancels_running_and_pending_stages():
+    finished = threading.Event()
+
+    def slow(inputs):
+        time.sleep(0.5)
+        finished.set()
+        return 'late'
+    started = time.monotonic()
+    run = run_pipeline({
+        'qr': stage(lambda inputs: 'FORGED'),
+        'ocr': stage(slow),
+        'fuzzy': stage(lambda inputs: 1, 'ocr')
+    }, decide=lambda results: results.get('qr'))
+    assert run['verdict'] == 'FORGED'
+    assert time.monotonic() - started < 0.3 and not finished.is_set()
+    assert run['skipped']['ocr'].startswith('cancelled') and run['skipped']['fuzzy'].startswith('cancelled')
+    assert 'ocr' not in run['results']
+
+
+def test_stage_over_budget_is_skipped():
+    run = run_pipeline({'seal': stage(sleeper(0.5, 1)), 'qr': stage(lambda inputs: time_left())},
+                       budgets={'seal': 0.1, 'qr': 2})
+    assert run['timed_out'] == ['seal'] and run['skipped']['seal'] == 'exceeded its 0.1s budget'
+    assert 0 < run['results']['qr'] <= 2
+
+
+def test_fallback_gets_its_own_budget_not_a_fresh_one():
+    started = time.monotonic()
+    run = run_pipeline({'ocr': stage(sleeper(1, 'full'), fallback=sleeper(1, 'degraded'))},
+                       budgets={'ocr': 0.1}, fallback_budgets={'ocr': 0.1})
+    assert time.monotonic() - started < 0.4
+    assert run['degraded'] == {'ocr': 'exceeded its 0.1s budget'}
+    assert run['timed_out'] == ['ocr'] and run['skipped']['ocr'].startswith('fallback exceeded its 0.1s budget')
+
+    run = run_pipeline({'ocr': stage(sleeper(0.3, 'full'), fallback=sleeper(0, 'degraded'))},
+                       budgets={'ocr': 0.1}, fallback_budgets={'ocr': 0.5})
+    assert run['results'] == {'ocr': 'degraded'}
+
+    # Without a fallback budget the stage is skipped rather than given more time
+    run = run_pipeline({'ocr': stage(sleeper(0.3, 'full'), fallback=sleeper(0, 'degraded'))}, budgets={'ocr': 0.1})
+    assert run['timed_out'] == ['ocr'] and not run['degraded']
+
+
+def test_request_deadline_bounds_every_stage():
+    started = time.monotonic()
+    run = run_pipeline({'ocr': stage(sleeper(0.5, 1)), 'fuzzy': stage(lambda inputs: 1, 'ocr')},
+                       deadline=time.monotonic() + 0.1, budgets={'ocr': 10}, fallback_budgets={'ocr': 10})
+    assert time.monotonic() - started < 0.3
+    assert run['skipped']['ocr'] == 'request deadline exceeded' and not run['degraded']
+    assert 'fuzzy' in run['skipped']
+
+
+@pytest.mark.parametrize('seconds', [float('nan'), float('inf'), float('-inf')])
+def test_request_deadline_rejects_non_finite(app, seconds):
+    with pytest.raises(ValueError):
+        app.request_deadline(seconds)
+
+
+@pytest.mark.parametrize('seconds', [None, 0, -5])
+def test_request_deadline_defaults_for_non_positive(app, seconds):
+    assert app.request_deadline(seconds) - time.monotonic() == pytest.approx(app.DEADLINES['default'], abs=1)
+
+
+def test_endpoint_rejects_nan_deadline(app, ocr):
+    client = app.app.test_client()
+    image = cv2.imencode('.png', make_certificate('Akash Rana', 'JH-UNI-2018-201'))[1].tobytes()
+    response = client.post('/api/verify-certificate', content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(image), 'c.png'), 'deadline': 'nan'})
+    assert response.status_code == 400
+
+
+def test_tiered_qr_timeout_is_reported_and_not_cached(app, ocr, monkeypatch):
+    monkeypatch.setattr(result_cache, '_cache', None)
+    monkeypatch.setattr(perceptual_hash, '_index', None)
+    monkeypatch.setitem(app.DEADLINES, 'stage_budgets', {**app.DEADLINES['stage_budgets'], 'qr': 0.05})
+    monkeypatch.setattr(app, 'scan_certificate_qr', lambda *args: time.sleep(0.3) or {'status': 'NOT_FOUND'})
+    ocr['full'] = certificate_text('Akash Rana', 'JH-UNI-2018-201')
+    image = cv2.imencode('.png', make_certificate('Akash Rana', 'JH-UNI-2018-201'))[1].tobytes()
+
+    first = app.verify_certificate_bytes(image, mode='tiered')
+    assert first['validation']['status'] == 'VERIFIED'
+    assert 'qr' in first['pipeline']['timed_out_stages']
+    assert first['pipeline']['skipped_stages']['qr'] == 'exceeded its 0.05s budget'
+    assert 'cached' not in app.verify_certificate_bytes(image, mode='tiered')
+
+
+def test_header_detection_runs_once_per_request(app, ocr, monkeypatch):
+    monkeypatch.setattr(perceptual_hash, '_index', None)
+    detections = []
+    monkeypatch.setattr(app, 'detect_institution_code', lambda img: detections.append(img.shape) and None)
+    ocr['full'] = certificate_text('Akash Rana', 'JH-UNI-2018-201')
+    img = make_certificate('Akash Rana', 'JH-UNI-2018-201')
+
+    response = app.verify_certificate_image(img, mode='full')
+    assert response['validation']['status'] == 'VERIFIED'
+    assert len(detections) == 1
+
+    # Neither the OCR stage nor its degraded fallback repeat it
+    assert app.degraded_ocr(app.ocr_view(img), None)['certificate_no'] == 'JH-UNI-2018-201'
+    assert app.extract_certificate_info(img, None, detect_institution=False)['name'] == 'Akash Rana'
+    assert len(detections) == 1
+    app.extract_certificate_info(img)
+    assert len(detections) == 2
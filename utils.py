@@ -1,3 +1,6 @@
+import cv2
+import numpy as np
+
 # def get_institution_code_from_name(institution_name):
 #     """Maps a full institution name to its code."""
 #     institution_mapping = {
@@ -18,4 +21,18 @@ def get_institution_code_from_name(institution_name):
     }
     # Simple direct mapping - you might want to make this more robust
     # with fuzzy matching if OCR results are imperfect
-    return institution_mapping.get(institution_name)
\ No newline at end of file
+    return institution_mapping.get(institution_name)
+
+
+def decode_image_bytes(data, flags=cv2.IMREAD_COLOR):
+    """Decode an uploaded image straight from memory into a BGR array, None if it isn't an image"""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+
+def ocr_view(image):
+    """RGB view of a decoded BGR array for OCR, shares memory with the decoded image"""
+    if image.ndim == 3:
+        return image[:, :, ::-1]
+    return image
@@ -0,0 +1,212 @@
+# verification_pipeline.py
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from config import PIPELINE
+
+_executor = None
+_executor_lock = threading.Lock()
+_deadline = threading.local()
+
+
+def _reset_after_fork():
+    """Executor threads don't survive fork(), a child process starts its own"""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_executor():
+    """Thread pool shared by all pipeline runs in this process.
+
+    OpenCV and Tesseract release the GIL, so stages really do run in parallel.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PIPELINE['max_workers'],
+                                               thread_name_prefix='verification-stage')
+    return _executor
+
+
+def stage(func, *deps, fallback=None):
+    """A pipeline stage: ``func`` receives a dict with the results of the stages named in ``deps``.
+
+    ``fallback`` (same signature) is a cheaper version run in its place when
+    ``func`` overruns its time budget.
+    """
+    return {'func': func, 'deps': list(deps), 'fallback': fallback}
+
+
+def time_left():
+    """Seconds until the deadline of the stage or deadline_scope running on this thread, None without one"""
+    deadline = getattr(_deadline, 'at', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Make ``deadline`` (a time.monotonic() value or None) what time_left() reports on this thread"""
+    previous = getattr(_deadline, 'at', None)
+    _deadline.at = deadline
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+
+def _call(func, inputs, deadline):
+    with deadline_scope(deadline):
+        return func(inputs)
+
+
+def check_graph(stages):
+    """Reject unknown dependencies and cycles before anything is scheduled"""
+    for name, spec in stages.items():
+        for dep in spec['deps']:
+            if dep not in stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through stage '{name}'")
+        visiting.add(name)
+        for dep in stages[name]['deps']:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in stages:
+        visit(name)
+
+
+def run_pipeline(stages, decide=None, executor=None, deadline=None, budgets=None, fallback_budgets=None):
+    """Run a dependency graph of stages, independent stages in parallel.
+
+    ``decide(results)`` is called after each finished stage; once it returns a
+    verdict the stages that haven't finished are cancelled. A stage whose
+    dependency failed or was cancelled is skipped.
+
+    ``deadline`` (time.monotonic() value) bounds the whole run and
+    ``budgets`` (stage -> seconds) each stage. A stage past its limit is
+    abandoned: its thread can't be stopped, but its result is no longer
+    waited for (OCR calls inside it also give up, see time_left). It is
+    replaced by its fallback when it has one, ``fallback_budgets`` gives the
+    fallback a budget and time is left, else skipped.
+
+    Returns a dict with ``results``, ``errors`` (stage -> message),
+    ``skipped`` (stage -> reason), ``degraded`` (stage -> why its fallback
+    ran), ``timed_out`` (stages skipped for time) and the ``verdict`` if one
+    was decided early.
+    """
+    check_graph(stages)
+    executor = executor or get_executor()
+    budgets = budgets or {}
+    fallback_budgets = fallback_budgets or {}
+
+    results, errors, skipped, degraded = {}, {}, {}, {}
+    timed_out = []
+    running = {}  # future -> (stage name, its deadline)
+    verdict = None
+
+    def submit(name, func, inputs, budget):
+        limits = [limit for limit in (deadline, budget and time.monotonic() + budget) if limit]
+        limit = min(limits) if limits else None
+        running[executor.submit(_call, func, inputs, limit)] = (name, limit)
+
+    def overrun(name, now):
+        if deadline is not None and now >= deadline:
+            return 'request deadline exceeded'
+        if name in degraded:
+            return f'fallback exceeded its {fallback_budgets[name]:g}s budget'
+        return f'exceeded its {budgets[name]:g}s budget'
+
+    def ready(name):
+        return all(dep in results for dep in stages[name]['deps'])
+
+    def blocked(name):
+        """Why a stage can't run, None if its dependencies are fine"""
+        for dep in stages[name]['deps']:
+            if dep in errors:
+                return 'dependency failed'
+            if dep in skipped:
+                return f"dependency '{dep}' skipped"
+        return None
+
+    pending = set(stages)
+    while pending or running:
+        for name in sorted(pending):
+            if blocked(name):
+                pending.discard(name)
+                skipped[name] = blocked(name)
+            elif deadline is not None and time.monotonic() >= deadline:
+                pending.discard(name)
+                skipped[name] = 'request deadline exceeded'
+                timed_out.append(name)
+            elif ready(name):
+                pending.discard(name)
+                inputs = {dep: results[dep] for dep in stages[name]['deps']}
+                submit(name, stages[name]['func'], inputs, budgets.get(name))
+
+        if not running:
+            # Everything left is waiting on something that will never finish
+            for name in pending:
+                skipped[name] = 'dependency failed'
+            break
+
+        limits = [limit for _, limit in running.values() if limit is not None]
+        timeout = max(min(limits) - time.monotonic(), 0) if limits else None
+        finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in finished:
+            name, _ = running.pop(future)
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Pipeline stage '{name}' failed: {e}")
+                errors[name] = str(e)
+
+        now = time.monotonic()
+        for future, (name, limit) in list(running.items()):
+            if limit is None or now < limit:
+                continue
+            # Abandon the overrunning stage, it finishes in the background and its result is dropped
+            future.cancel()
+            del running[future]
+            reason = overrun(name, now)
+            fallback = stages[name].get('fallback')
+            if (fallback is not None and fallback_budgets.get(name) and name not in degraded
+                    and not reason.startswith('request')):
+                # The fallback gets its own, smaller budget: the stage's budget is already used up
+                print(f"Pipeline stage '{name}' {reason}, running its fallback")
+                degraded[name] = reason
+                submit(name, fallback, {dep: results[dep] for dep in stages[name]['deps']}, fallback_budgets[name])
+            else:
+                print(f"Pipeline stage '{name}' {reason}")
+                skipped[name] = reason if name not in degraded else f'{reason} (after the stage {degraded[name]})'
+                timed_out.append(name)
+
+        if decide is not None:
+            verdict = decide(results)
+            if verdict:
+                # Stages already running finish in the background, their results are dropped
+                for future, (name, _) in running.items():
+                    future.cancel()
+                    skipped[name] = f'cancelled, verdict already {verdict}'
+                for name in pending:
+                    skipped[name] = f'cancelled, verdict already {verdict}'
+                running.clear()
+                pending.clear()
+
+    return {'results': results, 'errors': errors, 'skipped': skipped, 'degraded': degraded, 'timed_out': timed_out,
+            'verdict': verdict}